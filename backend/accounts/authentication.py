@@ -0,0 +1,119 @@
+"""
+Token authentication backed by an in-process identity cache.
+
+DRF's TokenAuthentication costs a token-and-user query on every request, and
+the hospital views then load user.hospital_managed with another one.
+CachedTokenAuthentication resolves token -> user -> managed hospital in a
+single query and keeps the result in a small LRU for `TTL` seconds, so a
+warm request spends no queries on identity at all.
+
+The cache lives in each worker process. accounts.signals drops entries when a
+token, user or hospital is saved or deleted through the ORM; queryset
+update()s and changes made by other processes are only picked up once the
+entry expires, which is what bounds TTL.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+TTL = 60
+MAX_ENTRIES = 1024
+
+
+class IdentityCache:
+    """Thread-safe LRU of token key -> (user, token) with a per-entry expiry."""
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped by every invalidation so a lookup that raced one is not stored
+        self.generation = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, identity = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return identity
+
+    def set(self, key, identity, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = (time.monotonic() + self.ttl, identity)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(key, None)
+
+    def discard_user(self, user_id):
+        self._discard_where(lambda user: user.pk == user_id)
+
+    def discard_hospital(self, hospital_id):
+        self._discard_where(lambda user: getattr(managed_hospital(user), 'pk', None) == hospital_id)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def _discard_where(self, predicate):
+        with self.lock:
+            self.generation += 1
+            for key in [key for key, (expires, (user, token)) in self.entries.items() if predicate(user)]:
+                del self.entries[key]
+
+
+identities = IdentityCache()
+
+
+def managed_hospital(user):
+    # The loaded hospital (or None) without triggering a query
+    return user._state.fields_cache.get('hospital_managed')
+
+
+def detached(user):
+    """
+    A copy of a cached user for one request, so attributes a view sets on
+    request.user (or its hospital) never leak into other requests.
+    """
+    clone = copy.copy(user)
+    hospital = managed_hospital(user)
+    if hospital is not None:
+        hospital = copy.copy(hospital)
+        hospital._state.fields_cache['admin'] = clone
+        clone._state.fields_cache['hospital_managed'] = hospital
+    return clone
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        identity = identities.get(key)
+        if identity is None:
+            generation = identities.generation
+            try:
+                token = Token.objects.select_related('user__hospital_managed').get(key=key)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise AuthenticationFailed(_('User inactive or deleted.'))
+            identity = (token.user, token)
+            identities.set(key, identity, generation)
+        user, token = identity
+        return detached(user), token
@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class UserBackend(ModelBackend):
+    """
+    ModelBackend that loads the session user together with the hospital it
+    manages, so the dashboards' hospital_managed checks cost no extra query.
+    """
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related('hospital_managed').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:44
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_admin_list_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_first_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_last_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_email_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_phone_idx',
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.comparison.Collate('username', 'nocase'), name='user_username_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.comparison.Collate('first_name', 'nocase'), name='user_first_name_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.comparison.Collate('last_name', 'nocase'), name='user_last_name_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.comparison.Collate('email', 'nocase'), name='user_email_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.comparison.Collate('phone', 'nocase'), name='user_phone_nocase_idx'),
+        ),
+    ]
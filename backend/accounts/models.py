@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Collate
 
 class User(AbstractUser):
     class Role(models.TextChoices):
@@ -17,6 +18,22 @@ class User(AbstractUser):
     address = models.TextField(blank=True)
     emergency_contact = models.CharField(max_length=15, blank=True)
     blood_group = models.CharField(max_length=5, blank=True)
+    # Last change to a field shown in appointment payloads, for sync deltas
+    profile_updated_at = models.DateTimeField(null=True, blank=True, db_index=True, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Newest-first keyset order of the admin lists, overall and per role
+            models.Index(fields=['-date_joined', '-id'], name='user_joined_idx'),
+            models.Index(fields=['role', '-date_joined', '-id'], name='user_role_joined_idx'),
+            # Prefix search on the admin lists. SQLite only serves a
+            # case-insensitive LIKE 'x%' (istartswith) from NOCASE indexes.
+            models.Index(Collate('username', 'nocase'), name='user_username_nocase_idx'),
+            models.Index(Collate('first_name', 'nocase'), name='user_first_name_nocase_idx'),
+            models.Index(Collate('last_name', 'nocase'), name='user_last_name_nocase_idx'),
+            models.Index(Collate('email', 'nocase'), name='user_email_nocase_idx'),
+            models.Index(Collate('phone', 'nocase'), name='user_phone_nocase_idx'),
+        ]
     
     @property
     def age(self):
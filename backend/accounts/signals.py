@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from hospitals.models import Hospital
+
+from .authentication import identities
+from .models import User
+
+
+def _drop(func, *args):
+    # Now for this thread, and again on commit in case another request
+    # re-cached the old rows while the transaction was open
+    func(*args)
+    transaction.on_commit(lambda: func(*args))
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    _drop(identities.discard, instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    _drop(identities.discard_user, instance.pk)
+
+
+@receiver(post_save, sender=Hospital)
+@receiver(post_delete, sender=Hospital)
+def forget_hospital_admin(sender, instance, **kwargs):
+    # Covers both the new admin and whoever managed it before
+    _drop(identities.discard_user, instance.admin_id)
+    _drop(identities.discard_hospital, instance.pk)
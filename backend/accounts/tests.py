@@ -1,3 +1,93 @@
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user, get_user_model
+from django.db import connection
+from django.http import HttpRequest
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from hospitals.models import City, Hospital
+from .authentication import identities
+from .backends import UserBackend
+
+User = get_user_model()
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='pass', role=User.Role.HOSPITAL)
+        cls.hospital = Hospital.objects.create(name='City Care', city=City.objects.create(name='Pune'), address='Main Road', admin=cls.admin)
+        cls.token = Token.objects.create(user=cls.admin)
+
+    def setUp(self):
+        identities.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def queries(self, url='/api/hospital-details/'):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, len(ctx.captured_queries)
+
+    def test_warm_requests_spend_no_queries_on_identity(self):
+        # token, user and hospital in one query, then the rows
+        response, cold = self.queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cold, 2)
+        response, warm = self.queries()
+        self.assertEqual(response.data[0]['name'], 'City Care')
+        self.assertEqual(warm, 1)
+
+    def test_saves_and_deletes_invalidate(self):
+        self.queries()
+        self.admin.is_active = False
+        self.admin.save()
+        self.assertEqual(self.queries()[0].status_code, 401)
+
+        self.admin.is_active = True
+        self.admin.save()
+        self.queries()
+        self.hospital.name = 'Renamed'
+        self.hospital.save()
+        self.assertEqual(self.queries()[0].data[0]['name'], 'Renamed')
+
+        Token.objects.filter(pk=self.token.pk).delete()  # queryset delete still sends post_delete
+        self.assertEqual(self.queries()[0].status_code, 401)
+
+    def test_requests_get_their_own_user_object(self):
+        from .authentication import CachedTokenAuthentication
+        auth = CachedTokenAuthentication()
+        first, _ = auth.authenticate_credentials(self.token.key)
+        first.hospital_managed.name = 'Changed in one request'
+        second, _ = auth.authenticate_credentials(self.token.key)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.hospital_managed.name, 'City Care')
+        self.assertIs(second.hospital_managed.admin, second)
+
+
+class UserBackendTests(TestCase):
+    def test_session_user_comes_with_managed_hospital(self):
+        admin = User.objects.create_user(username='admin', password='pass', role=User.Role.HOSPITAL)
+        Hospital.objects.create(name='City Care', city=City.objects.create(name='Pune'), address='Main Road', admin=admin)
+        patient = User.objects.create_user(username='patient', password='pass')
+        with self.assertNumQueries(2):
+            self.assertEqual(UserBackend().get_user(admin.pk).hospital_managed.name, 'City Care')
+            self.assertFalse(hasattr(UserBackend().get_user(patient.pk), 'hospital_managed'))
+
+    def session_user(self, client):
+        request = HttpRequest()
+        request.session = client.session
+        return get_user(request)
+
+    def test_sessions_from_before_user_backend_stay_logged_in(self):
+        user = User.objects.create_user(username='patient', password='pass')
+        client = APIClient()
+        client.force_login(user, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.session_user(client), user)
+
+        # New logins go through UserBackend
+        client = APIClient()
+        self.assertTrue(client.login(username='patient', password='pass'))
+        self.assertEqual(client.session[BACKEND_SESSION_KEY], 'accounts.backends.UserBackend')
+        self.assertEqual(self.session_user(client), user)
@@ -15,18 +15,14 @@ def register(request):
             if 'guest_appointment_data' in request.session:
                 try:
                     data = request.session.pop('guest_appointment_data')
-                    from appointments.models import Appointment
-                    from hospitals.models import Doctor
-                    
-                    Appointment.objects.create(
-                        patient=user,
-                        doctor_id=data['doctor_id'],
-                        date=data['date'],
-                        time=data['time'],
-                        notes=data['notes'],
-                        status=Appointment.Status.PENDING
-                    )
+                    from appointments import slots
                     from django.contrib import messages
+                    
+                    try:
+                        slots.book(user, data['doctor_id'], data['date'], data['time'], data['notes'])
+                    except slots.SlotTaken:
+                        messages.warning(request, "Registration Successful! Your chosen time slot was booked meanwhile, please pick another.")
+                        return redirect('book_appointment')
                     messages.success(request, "Registration Successful! Your appointment has been booked.")
                     return redirect('patient_dashboard')
                 except Exception as e:
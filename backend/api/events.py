@@ -0,0 +1,142 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.authtoken.models import Token
+
+from hospitals.models import Hospital
+
+
+class Subscription:
+    """One connected client: a bounded queue living on the client's event loop."""
+
+    def __init__(self, hospital_id, loop, maxsize):
+        self.hospital_id = hospital_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        # Set when events had to be dropped; the client is told to resync
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Always called on self.loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        if self.overflowed:
+            self.overflowed = False
+            return {'type': 'resync'}
+        return await self.queue.get()
+
+
+class EventBroker:
+    """
+    In-process fan-out of change events to the clients of each hospital.
+
+    Model signals publish from whichever thread saved the row; subscribers
+    are async generators on the ASGI event loop, so delivery is handed over
+    with call_soon_threadsafe. Only clients connected to this process are
+    reached, which is enough for a single ASGI worker; more workers need a
+    shared pub/sub behind the same publish/subscribe calls.
+    """
+    queue_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, hospital_id, loop=None):
+        subscription = Subscription(hospital_id, loop or asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers[hospital_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.hospital_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.hospital_id]
+
+    def has_subscribers(self, hospital_id=None):
+        with self._lock:
+            if hospital_id is None:
+                return bool(self._subscribers)
+            return hospital_id in self._subscribers
+
+    def publish(self, hospital_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(hospital_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The client's loop has shut down; its generator cleans up on its own
+                pass
+
+
+broker = EventBroker()
+
+
+def format_event(event):
+    event = dict(event)
+    name = event.pop('type')
+    return f"event: {name}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+HEARTBEAT_SECONDS = 15
+
+
+async def _event_stream(hospital_id):
+    subscription = broker.subscribe(hospital_id)
+    try:
+        # Reconnecting clients cannot replay what they missed, so tell them to resync first
+        yield "retry: 5000\n\n" + format_event({'type': 'resync'})
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def _authenticate(request):
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Token '):
+        token = await Token.objects.select_related('user').filter(key=header[len('Token '):].strip()).afirst()
+        return token.user if token and token.user.is_active else None
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+async def hospital_events(request):
+    """
+    Server-Sent Events for the signed-in hospital: appointment status changes,
+    saved consultations and bed occupancy. Accepts the API token header (desktop
+    app) or the session cookie (web dashboard).
+    """
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the never-ending stream would be buffered and pin a worker forever
+        return JsonResponse({'detail': 'Event stream requires the ASGI server.'}, status=503)
+
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    hospital_id = await Hospital.objects.filter(admin=user).values_list('id', flat=True).afirst()
+    if hospital_id is None:
+        return JsonResponse({'detail': 'No hospital profile for this user.'}, status=403)
+
+    response = StreamingHttpResponse(_event_stream(hospital_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,138 @@
+"""
+Read-only fast path for the big list endpoints.
+
+Rows are read with values_list() and turned into dicts by accessors compiled
+once per Layout, then encoded with orjson when it is installed. The bytes are
+exactly what the serializer and DRF's JSONRenderer would send for the same
+rows (api.tests.FastPathTests checks this), so clients cannot tell which path
+answered. `manage.py benchmark_lists` compares the two.
+
+Each Layout mirrors one serializer by hand: when a serializer changes, its
+layout must change with it or the byte-identity test fails.
+"""
+import datetime
+import json
+from operator import itemgetter
+
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; the stdlib encoder gives the same bytes
+    orjson = None
+
+
+class Layout:
+    """
+    Output fields in serializer order as (key, source) pairs. A source is a
+    values_list() column name, a nested list of pairs for an embedded
+    object, or (function, column, ...) for a value derived from columns.
+    Keys in `omit_if_none` are left out of rows where they are None, as DRF
+    does for a read-only field whose source runs through a null relation.
+    """
+    def __init__(self, fields, omit_if_none=()):
+        self.columns = []
+        self.accessors = self._compile(fields)
+        self.omit_if_none = omit_if_none
+
+    def _getter(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+        return itemgetter(self.columns.index(column))
+
+    def _compile(self, fields):
+        accessors = []
+        for key, source in fields:
+            if isinstance(source, str):
+                accessors.append((key, self._getter(source)))
+            elif isinstance(source, list):
+                nested = self._compile(source)
+                accessors.append((key, lambda row, nested=nested: {k: get(row) for k, get in nested}))
+            else:
+                func, *columns = source
+                getters = [self._getter(column) for column in columns]
+                accessors.append((key, lambda row, func=func, getters=getters: func(*[get(row) for get in getters])))
+        return accessors
+
+    def rows(self, queryset):
+        accessors = self.accessors
+        rows = [{key: get(row) for key, get in accessors} for row in queryset.values_list(*self.columns)]
+        for key in self.omit_if_none:
+            for row in rows:
+                if row[key] is None:
+                    del row[key]
+        return rows
+
+
+def iso(value):
+    return None if value is None else value.isoformat()
+
+
+def full_name(first_name, last_name):
+    # AbstractUser.get_full_name()
+    return ("%s %s" % (first_name, last_name)).strip()
+
+
+def age(dob):
+    # User.age
+    if dob:
+        today = datetime.date.today()
+        return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+    return None
+
+
+def render(data):
+    """JSON bytes as DRF's JSONRenderer writes them with the default settings."""
+    if orjson is not None:
+        content = orjson.dumps(data)
+    else:
+        content = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+    # JSONRenderer escapes these so the output is also valid JavaScript
+    return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+def response(layout, queryset):
+    return HttpResponse(render(layout.rows(queryset)), content_type='application/json')
+
+
+# Mirrors AppointmentSerializer
+APPOINTMENT_LAYOUT = Layout([
+    ('id', 'id'),
+    ('patient', 'patient_id'),
+    ('doctor', 'doctor_id'),
+    ('patient_name', (full_name, 'patient__first_name', 'patient__last_name')),
+    ('patient_details', [
+        ('id', 'patient_id'),
+        ('username', 'patient__username'),
+        ('first_name', 'patient__first_name'),
+        ('last_name', 'patient__last_name'),
+        ('email', 'patient__email'),
+        ('phone', 'patient__phone'),
+        ('dob', (iso, 'patient__dob')),
+        ('age', (age, 'patient__dob')),
+        ('gender', 'patient__gender'),
+        ('blood_group', 'patient__blood_group'),
+        ('address', 'patient__address'),
+        ('emergency_contact', 'patient__emergency_contact'),
+    ]),
+    ('doctor_name', (full_name, 'doctor__user__first_name', 'doctor__user__last_name')),
+    ('date', (iso, 'date')),
+    ('time', (iso, 'time')),
+    ('status', 'status'),
+    ('notes', 'notes'),
+])
+
+# Mirrors DoctorSerializer
+DOCTOR_LAYOUT = Layout([
+    ('id', 'id'),
+    ('user', [
+        ('id', 'user_id'),
+        ('username', 'user__username'),
+        ('email', 'user__email'),
+        ('role', 'user__role'),
+    ]),
+    ('hospital_name', 'hospital__name'),
+    ('department_name', 'department__name'),
+    ('specialization', 'specialization'),
+    ('available', 'available'),
+], omit_if_none=('department_name',))
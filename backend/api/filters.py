@@ -0,0 +1,83 @@
+import datetime
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+def parse_date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Expected a date in YYYY-MM-DD format.'})
+
+
+def parse_bool_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return False
+    value = value.lower()
+    if value not in ('true', 'false', '1', '0'):
+        raise ValidationError({name: 'Expected true or false.'})
+    return value in ('true', '1')
+
+
+class AppointmentFilterBackend(BaseFilterBackend):
+    """
+    ?status=PENDING,CONFIRMED  one or more statuses
+    ?date_from=YYYY-MM-DD      inclusive lower bound on the appointment date
+    ?date_to=YYYY-MM-DD        inclusive upper bound on the appointment date
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        status = request.query_params.get('status')
+        if status:
+            statuses = [s.strip().upper() for s in status.split(',') if s.strip()]
+            valid = queryset.model.Status.values
+            unknown = [s for s in statuses if s not in valid]
+            if unknown:
+                raise ValidationError({'status': f"Unknown status: {', '.join(unknown)}"})
+            queryset = queryset.filter(status__in=statuses)
+
+        date_from = parse_date_param(request, 'date_from')
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+
+        date_to = parse_date_param(request, 'date_to')
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+
+        return queryset
+
+
+class ConsultationFilterBackend(BaseFilterBackend):
+    """
+    ?appointment=ID            consultations of one appointment
+    ?doctor=ID                 consultations of one doctor
+    ?date_from=YYYY-MM-DD      inclusive lower bound on the appointment date
+    ?date_to=YYYY-MM-DD        inclusive upper bound on the appointment date
+    ?completed=true|false      finished consultations, or open drafts
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        for param, field in (('appointment', 'appointment_id'), ('doctor', 'appointment__doctor_id')):
+            value = request.query_params.get(param)
+            if value:
+                if not value.isdigit():
+                    raise ValidationError({param: 'Expected a numeric id.'})
+                queryset = queryset.filter(**{field: int(value)})
+
+        date_from = parse_date_param(request, 'date_from')
+        if date_from:
+            queryset = queryset.filter(appointment__date__gte=date_from)
+
+        date_to = parse_date_param(request, 'date_to')
+        if date_to:
+            queryset = queryset.filter(appointment__date__lte=date_to)
+
+        if request.query_params.get('completed'):
+            queryset = queryset.filter(completed_at__isnull=not parse_bool_param(request, 'completed'))
+
+        return queryset
@@ -0,0 +1,46 @@
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def run_idempotent(request, work):
+    """
+    Run `work()` (which returns a Response) in a transaction, once per
+    Idempotency-Key. The stored response commits together with the work, so a
+    retry either finds the recorded outcome or finds nothing was done. Two
+    concurrent requests with one key race on the key's unique constraint; the
+    loser's work is rolled back and it replays the winner's response.
+    Requests without the header simply run the work atomically.
+    """
+    key = request.headers.get(HEADER)
+    if not key:
+        with transaction.atomic():
+            return work()
+    if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+        raise ValidationError({HEADER: 'Key is too long.'})
+
+    fingerprint = IdempotencyKey.fingerprint(request.method, request.path, request.data)
+    stored = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+    if stored is None:
+        try:
+            with transaction.atomic():
+                response = work()
+                IdempotencyKey.objects.create(
+                    user=request.user, key=key, request_hash=fingerprint,
+                    status_code=response.status_code, response=response.data,
+                )
+            return response
+        except IntegrityError:
+            stored = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if stored is None:
+                raise
+
+    if stored.request_hash != fingerprint:
+        return Response({'detail': f'{HEADER} was already used for a different request.'}, status=422)
+    response = Response(stored.response, status=stored.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
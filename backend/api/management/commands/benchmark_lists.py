@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from rest_framework.renderers import JSONRenderer
+
+from api import fastpath
+from api.serializers import AppointmentSerializer, DoctorSerializer
+from appointments.models import Appointment
+from hospitals.models import City, Doctor, Hospital
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Compare rows/sec of the serializer and fast list paths on generated data (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ids = self.generate(options['rows'])
+            appointments = Appointment.objects.filter(id__in=ids).order_by('id')
+            doctors = Doctor.objects.filter(appointments__id__in=ids).order_by('id')
+            self.compare('appointments', appointments.select_related('patient', 'doctor__user'), AppointmentSerializer, fastpath.APPOINTMENT_LAYOUT, options['repeat'])
+            self.compare('doctors', doctors.select_related('user', 'hospital', 'department'), DoctorSerializer, fastpath.DOCTOR_LAYOUT, options['repeat'])
+            transaction.set_rollback(True)
+
+    def generate(self, count):
+        city = City.objects.create(name='Benchmark City')
+        admin = User.objects.create_user(username='benchmark-admin', role=User.Role.HOSPITAL)
+        hospital = Hospital.objects.create(name='Benchmark', city=city, address='-', admin=admin)
+        users = User.objects.bulk_create(
+            [User(username=f'benchmark-patient-{i}', first_name='Pat', last_name=str(i)) for i in range(count)]
+            + [User(username=f'benchmark-doctor-{i}', first_name='Doc', role=User.Role.DOCTOR) for i in range(count)]
+        )
+        doctors = Doctor.objects.bulk_create([Doctor(user=user, hospital=hospital) for user in users[count:]])
+        rows = Appointment.objects.bulk_create([
+            Appointment(patient=patient, doctor=doctor, date='2030-01-01', time='09:00')
+            for patient, doctor in zip(users[:count], doctors)
+        ])
+        return [row.id for row in rows]
+
+    def compare(self, label, queryset, serializer_class, layout, repeat):
+        renderer = JSONRenderer()
+        slow = min(self.timed(lambda: renderer.render(serializer_class(queryset, many=True).data)) for _ in range(repeat))
+        fast = min(self.timed(lambda: fastpath.render(layout.rows(queryset))) for _ in range(repeat))
+        rows = queryset.count()
+        same = renderer.render(serializer_class(queryset, many=True).data) == fastpath.render(layout.rows(queryset))
+        self.stdout.write(
+            f"{label}: {rows} rows  serializer {rows / slow:,.0f} rows/s  fast path {rows / fast:,.0f} rows/s"
+            f"  ({slow / fast:.1f}x, {'identical' if same else 'DIFFERENT'} output)"
+        )
+
+    @staticmethod
+    def timed(func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
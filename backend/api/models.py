@@ -1,3 +1,41 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a write sent with an `Idempotency-Key` header. A retry
+    carrying the same key gets the recorded response back instead of doing
+    the work again; reusing a key for a different request is an error.
+    """
+    # How long a key is honoured; older rows are removed by purge_expired()
+    TTL = timedelta(days=1)
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key}"
+
+    @staticmethod
+    def fingerprint(method, path, data):
+        body = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(f"{method} {path}\n{body}".encode()).hexdigest()
 
-# Create your models here.
+    @classmethod
+    def purge_expired(cls):
+        return cls.objects.filter(created_at__lt=timezone.now() - cls.TTL).delete()[0]
@@ -0,0 +1,74 @@
+import base64
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from core.pagination import appointment_key, keyset_q, parse_appointment_key
+
+
+class AppointmentCursorPagination(BasePagination):
+    """
+    Keyset pagination over (date, time, id).
+
+    The cursor is the key of the last row on the previous page, so every page
+    is a single index range scan no matter how deep the client has paged.
+    Pagination is opt-in: requests without `cursor` or `page_size` keep
+    getting the plain JSON array older clients expect.
+    """
+    ordering = ('date', 'time', 'id')
+    page_size = 100
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        encoded = params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(keyset_q(self.ordering, self.decode_cursor(encoded)))
+
+        # Fetch one extra row to know whether there is a next page without a COUNT(*)
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(last))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def encode_cursor(self, obj):
+        return base64.urlsafe_b64encode(appointment_key(obj).encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, encoded):
+        try:
+            return parse_appointment_key(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
@@ -1,16 +1,109 @@
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from hospitals.models import Doctor, Hospital, Department, Staff, Bed
+from appointments import slots
 from appointments.models import Appointment
+from . import batch
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+
+def _name_list(request, param):
+    value = request.query_params.get(param, '')
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def sparse_params(request):
+    """
+    The (fields, omit) name sets of a sparse read, or None when `request` is
+    not one. Parsed once per request, so views can ask before building a
+    serializer.
+    """
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None
+    if not hasattr(request, '_sparse_params'):
+        keep, drop = _name_list(request, 'fields'), _name_list(request, 'omit')
+        request._sparse_params = (keep, drop) if keep or drop else None
+    return request._sparse_params
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets for reads: ?fields=id,date keeps only the named
+    top-level fields and ?omit=notes drops them. Unknown names are a 400 so a
+    typo does not silently return everything. `sparse` tells the view that
+    the queryset can be pruned to match (see prune_queryset()).
+    """
+    sparse = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        params = sparse_params(self.context.get('request'))
+        if params is None:
+            return
+        errors = {}
+        for param, names in zip(('fields', 'omit'), params):
+            unknown = names - set(self.fields)
+            if unknown:
+                errors[param] = f"Unknown field: {', '.join(sorted(unknown))}"
+        if errors:
+            raise serializers.ValidationError(errors)
+        keep, drop = params
+        for name in list(self.fields):
+            if (keep and name not in keep) or name in drop:
+                self.fields.pop(name)
+        self.sparse = True
+
+
+def prune_queryset(queryset, serializer, always=()):
+    """
+    Narrow `queryset` to what the serializer's remaining fields read: only()
+    the columns they use, select_related() the forward relations they walk
+    and prefetch_related() the reverse ones. Returns None when a field reads
+    something that is not a model field (a property or method on the row
+    itself), since then the needed columns cannot be known.
+    """
+    model = queryset.model
+    columns = {model._meta.pk.name, *always}
+    joins, prefetches = set(), set()
+    for field in serializer.fields.values():
+        if field.source == '*':
+            return None
+        current, path = model, []
+        for attr in field.source_attrs:
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                if not path:
+                    return None
+                break
+            if not path and model_field.concrete:
+                columns.add(attr)
+            if not model_field.is_relation:
+                break
+            if model_field.many_to_many or model_field.one_to_many:
+                prefetches.add('__'.join(path + [attr]))
+                break
+            path.append(attr)
+            current = model_field.related_model
+        # A bare foreign key renders as its id; anything read through it, or a
+        # nested serializer over it, needs the join
+        if path and (len(path) < len(field.source_attrs) or isinstance(field, serializers.BaseSerializer)):
+            joins.add('__'.join(path))
+    queryset = queryset.only(*columns)
+    if joins:
+        queryset = queryset.select_related(*joins)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'role']
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     hospital_name = serializers.CharField(source='hospital.name', read_only=True)
     department_name = serializers.CharField(source='department.name', read_only=True)
@@ -19,29 +112,29 @@ class DoctorSerializer(serializers.ModelSerializer):
         model = Doctor
         fields = ['id', 'user', 'hospital_name', 'department_name', 'specialization', 'available']
 
-class StaffSerializer(serializers.ModelSerializer):
+class StaffSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Staff
         fields = ['id', 'name', 'role', 'phone']
 
-class BedSerializer(serializers.ModelSerializer):
+class BedSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Bed
         fields = ['id', 'ward', 'number', 'is_occupied']
 
-class HospitalDetailSerializer(serializers.ModelSerializer):
+class HospitalDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     city_name = serializers.CharField(source='city.name', read_only=True)
     class Meta:
         model = Hospital
         fields = ['id', 'name', 'city', 'city_name', 'address', 'phone', 'email', 'website']
 
-class PatientProfileSerializer(serializers.ModelSerializer):
+class PatientProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     age = serializers.ReadOnlyField()
     class Meta:
         model = User
         fields = ['id', 'username', 'first_name', 'last_name', 'email', 'phone', 'dob', 'age', 'gender', 'blood_group', 'address', 'emergency_contact']
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
     patient_details = PatientProfileSerializer(source='patient', read_only=True)
     doctor_name = serializers.CharField(source='doctor.user.get_full_name', read_only=True)
@@ -50,14 +143,81 @@ class AppointmentSerializer(serializers.ModelSerializer):
         model = Appointment
         fields = ['id', 'patient', 'doctor', 'patient_name', 'patient_details', 'doctor_name', 'date', 'time', 'status', 'notes']
 
+    def validate(self, data):
+        # Same schedule rule as the booking form, whenever the slot is set or moved
+        slot = {field: data.get(field, getattr(self.instance, field, None)) for field in ('doctor', 'date', 'time')}
+        moved = self.instance is None or any(slot[field] != getattr(self.instance, field) for field in slot)
+        if moved and all(slot.values()) and not slots.in_schedule(slot['doctor'].id, slot['date'], slot['time']):
+            raise serializers.ValidationError({'time': 'Not one of the doctor\'s scheduled slots.'})
+        return data
+
+class CompactAppointmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Appointment row with bare patient/doctor ids; profiles travel once in `included`."""
+    class Meta:
+        model = Appointment
+        fields = ['id', 'patient', 'doctor', 'date', 'time', 'status', 'notes']
+
+class DoctorProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    name = serializers.CharField(source='user.get_full_name', read_only=True)
+
+    class Meta:
+        model = Doctor
+        fields = ['id', 'name', 'specialization']
+
+def side_load_profiles(appointments):
+    """
+    The `included` section for compact appointment lists: each distinct
+    patient and doctor serialized once. Expects patient and doctor__user to
+    be select_related already.
+    """
+    patients, doctors = {}, {}
+    for apt in appointments:
+        patients.setdefault(apt.patient_id, apt.patient)
+        doctors.setdefault(apt.doctor_id, apt.doctor)
+    return {
+        'patients': PatientProfileSerializer(patients.values(), many=True).data,
+        'doctors': DoctorProfileSerializer(doctors.values(), many=True).data,
+    }
+
+class BulkStatusSerializer(serializers.Serializer):
+    """Body of POST /api/appointments/bulk-status/."""
+    MAX_IDS = 500
+
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_IDS)
+    current_status = serializers.ChoiceField(choices=Appointment.Status.choices)
+    status = serializers.ChoiceField(choices=Appointment.Status.choices)
+
+    def validate(self, data):
+        if data['current_status'] == data['status']:
+            raise serializers.ValidationError({'status': 'Must differ from current_status.'})
+        if data['current_status'] == Appointment.Status.CANCELLED:
+            # Re-opening may collide with a slot booked since; do those one at a time
+            raise serializers.ValidationError({'current_status': 'Cancelled appointments cannot be re-opened in bulk.'})
+        return data
+
+class BatchItemSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'], default='GET')
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False, allow_null=True)
+    headers = serializers.DictField(child=serializers.CharField(), required=False)
+
+    def validate_path(self, value):
+        if not value.startswith(batch.PREFIX):
+            raise serializers.ValidationError(f'Must start with {batch.PREFIX}')
+        return value
+
+class BatchSerializer(serializers.Serializer):
+    """Body of POST /api/batch/."""
+    requests = BatchItemSerializer(many=True, allow_empty=False, max_length=batch.MAX_REQUESTS)
+
 from appointments.models import Consultation, Prescription
 
-class PrescriptionSerializer(serializers.ModelSerializer):
+class PrescriptionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Prescription
         fields = ['id', 'medicine_name', 'dosage', 'duration', 'instructions']
 
-class ConsultationSerializer(serializers.ModelSerializer):
+class ConsultationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     prescriptions = PrescriptionSerializer(many=True, read_only=True)
     
     class Meta:
@@ -0,0 +1,166 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.models import User
+from appointments.models import Appointment, Consultation
+from hospitals.models import Bed, City, Doctor, Hospital, Staff
+
+from . import versions
+from .events import broker
+
+
+def publish_on_commit(hospital_id, event):
+    if hospital_id is not None and broker.has_subscribers(hospital_id):
+        transaction.on_commit(lambda: broker.publish(hospital_id, event))
+
+
+# Remember the loaded values so post_save can tell whether they changed.
+# Read from __dict__ so a deferred field is not fetched just for this.
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_status(sender, instance, **kwargs):
+    instance._pushed_status = instance.__dict__.get('status')
+
+
+@receiver(post_init, sender=Bed)
+def remember_bed_occupancy(sender, instance, **kwargs):
+    instance._pushed_occupied = instance.__dict__.get('is_occupied')
+
+
+@receiver(post_save, sender=Appointment)
+def push_appointment_change(sender, instance, created, **kwargs):
+    changed = created or instance.status != instance._pushed_status
+    instance._pushed_status = instance.status
+    # Skip the doctor lookup entirely while nobody is listening
+    if changed and broker.has_subscribers():
+        publish_on_commit(instance.doctor.hospital_id, {
+            'type': 'appointment.created' if created else 'appointment.status',
+            'id': instance.id,
+            'status': instance.status,
+        })
+
+
+@receiver(post_save, sender=Consultation)
+def push_consultation_change(sender, instance, created, **kwargs):
+    if not broker.has_subscribers():
+        return
+    hospital_id = Appointment.objects.filter(pk=instance.appointment_id).values_list('doctor__hospital_id', flat=True).first()
+    publish_on_commit(hospital_id, {
+        'type': 'consultation.saved',
+        'id': instance.id,
+        'appointment': instance.appointment_id,
+        'completed': instance.completed_at is not None,
+    })
+
+
+@receiver(post_save, sender=Bed)
+def push_bed_change(sender, instance, created, **kwargs):
+    changed = created or instance.is_occupied != instance._pushed_occupied
+    instance._pushed_occupied = instance.is_occupied
+    if changed:
+        publish_on_commit(instance.hospital_id, {
+            'type': 'bed.updated',
+            'id': instance.id,
+            'ward': instance.ward,
+            'number': instance.number,
+            'is_occupied': instance.is_occupied,
+        })
+
+
+# Collection versions for the list ETags. Bumped after commit so a poll that
+# races the write cannot cache the old rows under the new version.
+
+PROFILE_FIELDS = (
+    'username', 'first_name', 'last_name', 'email', 'phone', 'dob',
+    'gender', 'blood_group', 'address', 'emergency_contact',
+)
+
+
+def bump_on_commit(collection, hospital_id=None):
+    transaction.on_commit(lambda: versions.bump(collection, hospital_id))
+
+
+def _profile(user):
+    return tuple(user.__dict__.get(field) for field in PROFILE_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_profile(sender, instance, **kwargs):
+    instance._versioned_profile = _profile(instance)
+
+
+@receiver(post_init, sender=Doctor)
+def remember_doctor_hospital(sender, instance, **kwargs):
+    instance._versioned_hospital = instance.__dict__.get('hospital_id')
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_doctor(sender, instance, **kwargs):
+    instance._versioned_doctor = instance.__dict__.get('doctor_id')
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def version_appointments(sender, instance, **kwargs):
+    old_doctor = instance._versioned_doctor
+    instance._versioned_doctor = instance.doctor_id
+    if old_doctor not in (None, instance.doctor_id):
+        # Reassigned: the old doctor's hospital lists the row no more
+        hospital_ids = Doctor.objects.filter(pk__in=[old_doctor, instance.doctor_id]).values_list('hospital_id', flat=True)
+        for hospital_id in set(hospital_ids):
+            bump_on_commit(versions.APPOINTMENTS, hospital_id)
+        return
+    if Appointment.doctor.is_cached(instance):
+        hospital_id = instance.doctor.hospital_id
+    else:
+        hospital_id = Doctor.objects.filter(pk=instance.doctor_id).values_list('hospital_id', flat=True).first()
+    bump_on_commit(versions.APPOINTMENTS, hospital_id)
+
+
+@receiver(post_save, sender=Doctor)
+def version_moved_doctor(sender, instance, created, **kwargs):
+    # The doctor's appointments now list under another hospital
+    if not created and instance.hospital_id != instance._versioned_hospital:
+        bump_on_commit(versions.APPOINTMENTS, instance._versioned_hospital)
+        bump_on_commit(versions.APPOINTMENTS, instance.hospital_id)
+    instance._versioned_hospital = instance.hospital_id
+
+
+@receiver(post_save, sender=User)
+def version_profiles(sender, instance, created, **kwargs):
+    # Logins save last_login on every user; only profile fields show in lists
+    profile = _profile(instance)
+    if not created and profile != instance._versioned_profile:
+        # A separate UPDATE so saves with update_fields are stamped too
+        instance.profile_updated_at = timezone.now()
+        User.objects.filter(pk=instance.pk).update(profile_updated_at=instance.profile_updated_at)
+        bump_on_commit(versions.PROFILES)
+    instance._versioned_profile = profile
+
+
+@receiver(post_save, sender=Bed)
+@receiver(post_delete, sender=Bed)
+def version_beds(sender, instance, **kwargs):
+    bump_on_commit(versions.BEDS, instance.hospital_id)
+
+
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+def version_staff(sender, instance, **kwargs):
+    bump_on_commit(versions.STAFF, instance.hospital_id)
+
+
+@receiver(post_save, sender=Hospital)
+@receiver(post_delete, sender=Hospital)
+def version_hospital(sender, instance, **kwargs):
+    bump_on_commit(versions.HOSPITAL, instance.pk)
+
+
+@receiver(post_save, sender=City)
+def version_city_hospitals(sender, instance, created, **kwargs):
+    # Hospital details show the city's name
+    if not created:
+        for hospital_id in Hospital.objects.filter(city=instance).values_list('id', flat=True):
+            bump_on_commit(versions.HOSPITAL, hospital_id)
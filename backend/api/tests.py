@@ -1,3 +1,802 @@
+import asyncio
+import datetime
+import json
+import os
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+
+from hospitals.models import City, Hospital, Department, Doctor, Staff, Bed
+from appointments.models import Appointment, Consultation, Prescription, Tombstone
+from accounts.authentication import identities
+from core.models import Vitals
+from .events import broker, format_event
+from .models import IdempotencyKey
+from .views import AppointmentViewSet
+
+User = get_user_model()
+
+
+def create_hospital(name='City Care'):
+    city = City.objects.create(name='Pune')
+    admin = User.objects.create_user(username=f'{name}-admin', password='pass', role=User.Role.HOSPITAL)
+    hospital = Hospital.objects.create(name=name, city=city, address='Main Road', admin=admin, is_verified=True)
+    doctor_user = User.objects.create_user(username=f'{name}-doctor', password='pass', first_name='Asha', last_name='Rao', role=User.Role.DOCTOR)
+    doctor = Doctor.objects.create(user=doctor_user, hospital=hospital)
+    return hospital, doctor
+
+
+class EventBrokerTests(TestCase):
+    def setUp(self):
+        self.hospital, self.doctor = create_hospital()
+        self.patient = User.objects.create_user(username='patient', password='pass', role=User.Role.PATIENT)
+        self.loop = asyncio.new_event_loop()
+        self.subscription = broker.subscribe(self.hospital.id, loop=self.loop)
+
+    def tearDown(self):
+        broker.unsubscribe(self.subscription)
+        self.loop.close()
+
+    def next_event(self):
+        return self.loop.run_until_complete(asyncio.wait_for(self.subscription.get(), timeout=1))
+
+    def test_appointment_status_change_is_pushed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            apt = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=datetime.date(2030, 1, 1), time=datetime.time(10, 0))
+        self.assertEqual(self.next_event(), {'type': 'appointment.created', 'id': apt.id, 'status': 'PENDING'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apt.status = Appointment.Status.CONFIRMED
+            apt.save()
+        self.assertEqual(self.next_event(), {'type': 'appointment.status', 'id': apt.id, 'status': 'CONFIRMED'})
+
+    def test_saving_without_status_change_is_silent(self):
+        apt = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=datetime.date(2030, 1, 1), time=datetime.time(10, 0))
+        apt = Appointment.objects.get(pk=apt.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            apt.notes = 'Bring reports'
+            apt.save()
+        self.assertTrue(self.subscription.queue.empty())
+
+    def test_consultation_and_bed_events(self):
+        apt = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=datetime.date(2030, 1, 1), time=datetime.time(10, 0))
+        bed = Bed.objects.create(hospital=self.hospital, ward='ICU', number='1')
+        with self.captureOnCommitCallbacks(execute=True):
+            consultation = Consultation.objects.create(appointment=apt)
+            bed.is_occupied = True
+            bed.save()
+        self.assertEqual(self.next_event()['type'], 'consultation.saved')
+        self.assertEqual(self.next_event(), {'type': 'bed.updated', 'id': bed.id, 'ward': 'ICU', 'number': '1', 'is_occupied': True})
+        self.assertEqual(consultation.appointment_id, apt.id)
+
+    def test_other_hospitals_do_not_receive_events(self):
+        other, other_doctor = create_hospital('Sunrise')
+        with self.captureOnCommitCallbacks(execute=True):
+            Bed.objects.create(hospital=other, ward='General', number='7')
+        self.assertTrue(self.subscription.queue.empty())
+
+    def test_rolled_back_changes_are_not_pushed(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            Bed.objects.create(hospital=self.hospital, ward='ICU', number='2')
+        self.assertTrue(self.subscription.queue.empty())
+
+    def test_overflow_asks_client_to_resync(self):
+        for i in range(broker.queue_size + 1):
+            self.subscription.deliver({'type': 'bed.updated', 'id': i})
+        self.assertEqual(self.next_event(), {'type': 'resync'})
+
+    def test_format_event(self):
+        self.assertEqual(format_event({'type': 'bed.updated', 'id': 3}), 'event: bed.updated\ndata: {"id":3}\n\n')
+
+
+class ConsultationApiTests(TestCase):
+    def setUp(self):
+        self.hospital, self.doctor = create_hospital()
+        patient = User.objects.create_user(username='patient', password='pass', role=User.Role.PATIENT)
+        self.apt = Appointment.objects.create(patient=patient, doctor=self.doctor, date=datetime.date(2030, 1, 1), time=datetime.time(10, 0))
+        self.client = APIClient()
+        self.client.force_authenticate(self.hospital.admin)
+
+    def test_create_and_update_share_the_service(self):
+        medicines = [{'medicine_name': 'Paracetamol', 'dosage': '1-0-1', 'duration': '3 days', 'instructions': ''}]
+        response = self.client.post('/api/consultations/', {'appointment': self.apt.id, 'bp': '120/80', 'prescriptions_data': medicines}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([p['medicine_name'] for p in response.data['prescriptions']], ['Paracetamol'])
+
+        medicines.append({'medicine_name': 'ORS', 'dosage': '1-1-1', 'duration': '2 days'})
+        response = self.client.patch(f"/api/consultations/{response.data['id']}/", {'diagnosis': 'Flu', 'prescriptions_data': medicines}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['bp'], '120/80')
+        self.assertEqual(len(response.data['prescriptions']), 2)
+
+    def test_filters(self):
+        from appointments.services import save_consultation
+        done = save_consultation(self.apt, {'diagnosis': 'Flu'}, [{'medicine_name': 'ORS'}], complete=True)
+        later = Appointment.objects.create(patient=self.apt.patient, doctor=self.doctor, date=datetime.date(2030, 2, 1), time=datetime.time(10, 0))
+        draft = save_consultation(later, {}, [])
+
+        def ids(**params):
+            response = self.client.get('/api/consultations/', params)
+            self.assertEqual(response.status_code, 200)
+            return [c['id'] for c in response.data]
+
+        self.assertEqual(ids(appointment=self.apt.id), [done.id])
+        self.assertEqual(ids(completed='false'), [draft.id])
+        self.assertEqual(ids(date_from='2030-01-15'), [draft.id])
+        self.assertEqual(sorted(ids(doctor=self.doctor.id)), sorted([done.id, draft.id]))
+        self.assertEqual(self.client.get('/api/consultations/', {'appointment': 'x'}).status_code, 400)
+
+    def test_rejects_bad_medicines_and_other_hospitals(self):
+        response = self.client.post('/api/consultations/', {'appointment': self.apt.id, 'prescriptions_data': [{'dosage': '1-0-1'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Consultation.objects.exists())
+
+        other, _ = create_hospital('Sunrise')
+        self.client.force_authenticate(other.admin)
+        response = self.client.post('/api/consultations/', {'appointment': self.apt.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CompleteConsultationTests(TestCase):
+    def setUp(self):
+        self.hospital, self.doctor = create_hospital()
+        patient = User.objects.create_user(username='patient', password='pass', role=User.Role.PATIENT)
+        self.apt = Appointment.objects.create(patient=patient, doctor=self.doctor, date=datetime.date(2030, 1, 1), time=datetime.time(10, 0), status=Appointment.Status.CONFIRMED)
+        self.url = f'/api/appointments/{self.apt.id}/consultation/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.hospital.admin)
+        self.payload = {'bp': '120/80', 'diagnosis': 'Flu', 'prescriptions_data': [{'medicine_name': 'ORS', 'dosage': '1-1-1', 'duration': '2 days'}]}
+
+    def test_get_before_and_after_completion(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data['completed_at'])
+        self.apt.refresh_from_db()
+        self.assertEqual(self.apt.status, Appointment.Status.COMPLETED)
+        self.assertEqual(self.client.get(self.url).data['diagnosis'], 'Flu')
+
+    def test_retries_with_the_same_key_are_replayed(self):
+        first = self.client.post(self.url, self.payload, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        retry = self.client.post(self.url, self.payload, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Vitals.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+        changed = dict(self.payload, diagnosis='Cold')
+        self.assertEqual(self.client.post(self.url, changed, format='json', HTTP_IDEMPOTENCY_KEY='abc').status_code, 422)
+
+    def test_failed_requests_do_not_burn_the_key(self):
+        bad = dict(self.payload, prescriptions_data=[{'dosage': '1-0-1'}])
+        self.assertEqual(self.client.post(self.url, bad, format='json', HTTP_IDEMPOTENCY_KEY='abc').status_code, 400)
+        self.assertFalse(Consultation.objects.exists())
+        self.assertEqual(self.client.post(self.url, self.payload, format='json', HTTP_IDEMPOTENCY_KEY='abc').status_code, 200)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every list endpoint costs a fixed number of queries however many rows it
+    returns. Budgets are pinned so a new N+1 in a serializer fails here.
+    """
+    BUDGETS = {
+        '/api/appointments/': 1,
+        '/api/appointments/?compact=1': 1,
+        '/api/doctors/': 1,
+        '/api/users/': 1,
+        '/api/register/': 1,
+        '/api/staff/': 1,
+        '/api/beds/': 1,
+        '/api/hospital-details/': 1,
+        # the rows, then their prescriptions
+        '/api/consultations/': 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital, _ = create_hospital()
+        cls.department = Department.objects.create(name='OPD', hospital=cls.hospital)
+
+    def grow(self, count):
+        start = Staff.objects.count()
+        users = User.objects.bulk_create(
+            [User(username=f'patient-{start + i}', first_name='Pat', role=User.Role.PATIENT) for i in range(count)]
+            + [User(username=f'doctor-{start + i}', first_name='Doc', role=User.Role.DOCTOR) for i in range(count)]
+        )
+        patients, doctor_users = users[:count], users[count:]
+        doctors = Doctor.objects.bulk_create([Doctor(user=user, hospital=self.hospital, department=self.department) for user in doctor_users])
+        appointments = Appointment.objects.bulk_create([
+            Appointment(patient=patient, doctor=doctor, date=datetime.date(2030, 1, 1), time=datetime.time(9))
+            for patient, doctor in zip(patients, doctors)
+        ])
+        consultations = Consultation.objects.bulk_create([Consultation(appointment=apt) for apt in appointments])
+        Prescription.objects.bulk_create([
+            Prescription(consultation=consultation, medicine_name=name, dosage='1-0-1', duration='5 days')
+            for consultation in consultations for name in ('ORS', 'Paracetamol')
+        ])
+        Staff.objects.bulk_create([Staff(hospital=self.hospital, name=f'Staff {start + i}', phone='1') for i in range(count)])
+        Bed.objects.bulk_create([Bed(hospital=self.hospital, ward='General', number=str(start + i)) for i in range(count)])
+
+    def list_queries(self):
+        counts = {}
+        for url in self.BUDGETS:
+            # A fresh user per request, loaded with its hospital as authentication does
+            client = APIClient()
+            client.force_authenticate(User.objects.select_related('hospital_managed').get(pk=self.hospital.admin_id))
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(ctx.captured_queries)
+        return counts
+
+    def test_list_endpoints_stay_within_budget(self):
+        self.grow(10)
+        self.assertEqual(self.list_queries(), self.BUDGETS)
+        self.grow(990)
+        self.assertEqual(self.list_queries(), self.BUDGETS)
+
+
+class AppointmentListTests(TestCase):
+    def setUp(self):
+        self.hospital, self.doctor = create_hospital()
+        other_user = User.objects.create_user(username='doctor-2', password='pass', role=User.Role.DOCTOR)
+        self.other_doctor = Doctor.objects.create(user=other_user, hospital=self.hospital)
+        patient = User.objects.create_user(username='patient', password='pass', role=User.Role.PATIENT)
+
+        def book(doctor, day, hour, status=Appointment.Status.PENDING):
+            return Appointment.objects.create(patient=patient, doctor=doctor, date=datetime.date(2030, 1, day), time=datetime.time(hour), status=status)
+
+        # Three rows share one (date, time): only the id tells them apart
+        self.rows = [
+            book(self.doctor, 2, 10), book(self.other_doctor, 2, 10),
+            book(self.doctor, 2, 10, Appointment.Status.CANCELLED),
+            book(self.doctor, 1, 9, Appointment.Status.CONFIRMED), book(self.doctor, 3, 9, Appointment.Status.COMPLETED),
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.hospital.admin)
+
+    def ordered_ids(self, rows):
+        return [apt.id for apt in sorted(rows, key=lambda a: (a.date, a.time, a.id))]
+
+    def test_cursor_pages_visit_equal_keys_once(self):
+        seen = []
+        response = self.client.get('/api/appointments/', {'page_size': 2})
+        while True:
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += [row['id'] for row in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, self.ordered_ids(self.rows))
+        self.assertEqual(self.client.get('/api/appointments/', {'cursor': 'not-a-cursor'}).status_code, 404)
+
+    def test_filters(self):
+        def ids(**params):
+            response = self.client.get('/api/appointments/', params)
+            self.assertEqual(response.status_code, 200)
+            return sorted(row['id'] for row in response.json())
+
+        statuses = {Appointment.Status.PENDING, Appointment.Status.CONFIRMED}
+        self.assertEqual(ids(status='pending,CONFIRMED'), sorted(a.id for a in self.rows if a.status in statuses))
+        self.assertEqual(ids(date_from='2030-01-02', date_to='2030-01-02'), sorted(a.id for a in self.rows if a.date.day == 2))
+        self.assertEqual(ids(date_from='2030-01-03'), [self.rows[4].id])
+        for params in ({'status': 'LOST'}, {'date_from': '01/02/2030'}, {'stream': 'maybe'}):
+            self.assertEqual(self.client.get('/api/appointments/', params).status_code, 400, params)
+
+    def test_stream_writes_the_ordered_array(self):
+        plain = self.client.get('/api/appointments/').json()
+        expected = sorted(plain, key=lambda a: (a['date'], a['time'], a['id']))
+        # Chunks smaller than the result exercise the separators between them
+        with mock.patch.object(AppointmentViewSet, 'stream_chunk_size', 2):
+            response = self.client.get('/api/appointments/', {'stream': 'true'})
+            self.assertTrue(response.streaming)
+            self.assertEqual(json.loads(b''.join(response.streaming_content)), expected)
+
+            response = self.client.get('/api/appointments/', {'stream': 1, 'status': 'COMPLETED'})
+            self.assertEqual([row['id'] for row in json.loads(b''.join(response.streaming_content))], [self.rows[4].id])
+
+            response = self.client.get('/api/appointments/', {'stream': 1, 'date_from': '2031-01-01'})
+            self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+        response = self.client.get('/api/appointments/', {'stream': 0})
+        self.assertFalse(response.streaming)
+        self.assertEqual(sorted(row['id'] for row in response.json()), sorted(a.id for a in self.rows))
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.hospital, self.doctor = create_hospital()
+        self.other, self.other_doctor = create_hospital('Sunrise')
+        self.patient = User.objects.create_user(username='patient', password='pass', role=User.Role.PATIENT)
+        self.rows = [
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=datetime.date(2030, 1, day), time=datetime.time(10))
+            for day in (1, 2, 3)
+        ]
+        self.consultation = Consultation.objects.create(appointment=self.rows[0])
+        # Settled well before any watermark the tests ask with
+        self.hour_ago = timezone.now() - datetime.timedelta(hours=1)
+        Appointment.objects.update(updated_at=self.hour_ago)
+        Consultation.objects.update(updated_at=self.hour_ago)
+        Doctor.objects.update(updated_at=self.hour_ago)
+
+    def sync(self, user, since=None, **params):
+        client = APIClient()
+        client.force_authenticate(User.objects.select_related('hospital_managed').get(pk=user.pk))
+        if since is not None:
+            params['since'] = since
+        response = client.get('/api/sync/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, rows):
+        return sorted(row['id'] for row in rows)
+
+    def test_full_then_deltas(self):
+        data = self.sync(self.hospital.admin)
+        self.assertTrue(data['full'])
+        self.assertEqual(self.ids(data['appointments']), [apt.id for apt in self.rows])
+        self.assertEqual(self.ids(data['consultations']), [self.consultation.id])
+
+        watermark = data['watermark']
+        data = self.sync(self.hospital.admin, watermark)
+        self.assertFalse(data['full'])
+        self.assertEqual((data['appointments'], data['consultations']), ([], []))
+
+        self.rows[1].status = Appointment.Status.CONFIRMED
+        self.rows[1].save()
+        data = self.sync(self.hospital.admin, watermark)
+        self.assertEqual(self.ids(data['appointments']), [self.rows[1].id])
+        self.assertEqual(data['deleted'], {'appointments': [], 'consultations': []})
+
+    def test_deletes_leave_tombstones_for_their_owners(self):
+        watermark = self.sync(self.hospital.admin)['watermark']
+        deleted_id = self.rows[0].id
+        self.rows[0].delete()
+        for user in (self.hospital.admin, self.patient, self.doctor.user):
+            data = self.sync(user, watermark)
+            self.assertEqual(data['deleted'], {'appointments': [deleted_id], 'consultations': [self.consultation.id]})
+        self.assertEqual(self.sync(self.other.admin, watermark)['deleted'], {'appointments': [], 'consultations': []})
+
+    def test_moving_an_appointment_tombstones_it_for_the_old_hospital(self):
+        watermark = self.sync(self.hospital.admin)['watermark']
+        moved = self.rows[0]
+        moved.doctor = self.other_doctor
+        moved.save()
+
+        old = self.sync(self.hospital.admin, watermark)
+        self.assertEqual(old['deleted'], {'appointments': [moved.id], 'consultations': [self.consultation.id]})
+        self.assertEqual(old['appointments'], [])
+        new = self.sync(self.other.admin, watermark)
+        self.assertEqual(self.ids(new['appointments']), [moved.id])
+        self.assertEqual(self.ids(new['consultations']), [self.consultation.id])
+        self.assertEqual(new['deleted'], {'appointments': [], 'consultations': []})
+        # The patient still has it: updated, not deleted
+        mine = self.sync(self.patient, watermark)
+        self.assertEqual((self.ids(mine['appointments']), mine['deleted']['appointments']), ([moved.id], []))
+
+        # Moving it back revives it for the first hospital
+        moved.doctor = self.doctor
+        moved.save()
+        self.assertEqual(self.sync(self.hospital.admin, watermark)['deleted']['appointments'], [])
+
+    def test_moving_a_doctor_moves_their_appointments(self):
+        watermark = self.sync(self.hospital.admin)['watermark']
+        self.doctor.hospital = self.other
+        self.doctor.save()
+        self.assertEqual(self.sync(self.hospital.admin, watermark)['deleted']['appointments'], [apt.id for apt in self.rows])
+        self.assertEqual(self.ids(self.sync(self.other.admin, watermark)['appointments']), [apt.id for apt in self.rows])
+
+    def test_profile_edits_resend_the_appointments_that_embed_them(self):
+        watermark = self.sync(self.hospital.admin)['watermark']
+        self.patient.first_name = 'Ravi'
+        self.patient.save(update_fields=['first_name'])
+
+        data = self.sync(self.hospital.admin, watermark)
+        self.assertEqual(self.ids(data['appointments']), [apt.id for apt in self.rows])
+        self.assertEqual({row['patient_details']['first_name'] for row in data['appointments']}, {'Ravi'})
+        compact = self.sync(self.hospital.admin, watermark, compact=1)
+        self.assertEqual([p['first_name'] for p in compact['included']['patients']], ['Ravi'])
+
+        # Logging in saves last_login only: nothing to re-send
+        User.objects.update(profile_updated_at=self.hour_ago)
+        self.patient.refresh_from_db()
+        watermark = data['watermark']
+        self.patient.last_login = timezone.now()
+        self.patient.save()
+        self.assertEqual(self.sync(self.hospital.admin, watermark)['appointments'], [])
+
+        self.doctor.specialization = 'Cardiologist'
+        self.doctor.save()
+        data = self.sync(self.patient, watermark, compact=1)
+        self.assertEqual(self.ids(data['appointments']), [apt.id for apt in self.rows])
+        self.assertEqual(data['included']['doctors'][0]['specialization'], 'Cardiologist')
+        self.assertEqual(self.sync(self.other.admin, watermark)['appointments'], [])
+
+    def test_overlap_bounds_late_commits(self):
+        since = timezone.now()
+        # Saved just before the watermark but committed after it: re-sent
+        Appointment.objects.filter(pk=self.rows[0].pk).update(updated_at=since - datetime.timedelta(seconds=4))
+        # Committed more than `overlap` after it was stamped: outside the guarantee
+        Appointment.objects.filter(pk=self.rows[1].pk).update(updated_at=since - datetime.timedelta(seconds=6))
+        data = self.sync(self.hospital.admin, since.isoformat())
+        self.assertEqual(self.ids(data['appointments']), [self.rows[0].id])
+
+    def test_stale_watermarks_get_a_full_snapshot(self):
+        self.rows[2].delete()
+        Tombstone.objects.update(deleted_at=timezone.now() - Tombstone.RETENTION - datetime.timedelta(days=1))
+        stale = (timezone.now() - Tombstone.RETENTION - datetime.timedelta(hours=1)).isoformat()
+        data = self.sync(self.hospital.admin, stale)
+        self.assertTrue(data['full'])
+        self.assertEqual(self.ids(data['appointments']), [self.rows[0].id, self.rows[1].id])
+
+        call_command('purge_tombstones', stdout=open(os.devnull, 'w'))
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_rejects_bad_parameters(self):
+        client = APIClient()
+        client.force_authenticate(self.hospital.admin)
+        for params in ({'since': 'yesterday'}, {'resources': 'beds'}, {'compact': 'maybe'}):
+            self.assertEqual(client.get('/api/sync/', params).status_code, 400, params)
+
+
+class CompactAppointmentTests(TestCase):
+    def setUp(self):
+        self.hospital, self.doctor = create_hospital()
+        self.patient = User.objects.create_user(username='patient', password='pass', first_name='Ravi', role=User.Role.PATIENT)
+        for day in range(1, 4):
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=datetime.date(2030, 1, day), time=datetime.time(10, 0))
+        self.client = APIClient()
+        self.client.force_authenticate(self.hospital.admin)
+
+    def test_profiles_are_sent_once(self):
+        data = self.client.get('/api/appointments/', {'compact': 1}).data
+        self.assertEqual(len(data['results']), 3)
+        self.assertNotIn('patient_details', data['results'][0])
+        self.assertEqual([p['first_name'] for p in data['included']['patients']], ['Ravi'])
+        self.assertEqual(data['included']['doctors'], [{'id': self.doctor.id, 'name': 'Asha Rao', 'specialization': self.doctor.specialization}])
+
+    def test_paginated_and_sync_compact(self):
+        data = self.client.get('/api/appointments/', {'compact': 1, 'page_size': 2}).data
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+        self.assertEqual(len(data['included']['patients']), 1)
+
+        data = self.client.get('/api/sync/', {'resources': 'appointments', 'compact': 1}).data
+        self.assertEqual(len(data['appointments']), 3)
+        self.assertEqual(data['included']['patients'][0]['id'], self.patient.id)
+        self.assertEqual(self.client.get('/api/appointments/', {'compact': 1, 'stream': 1}).status_code, 400)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.hospital, self.doctor = create_hospital()
+        patient = User.objects.create_user(username='patient', password='pass', first_name='Ravi', role=User.Role.PATIENT)
+        for day in range(1, 4):
+            Appointment.objects.create(patient=patient, doctor=self.doctor, date=datetime.date(2030, 1, day), time=datetime.time(10, 0), notes='Private')
+        self.client = APIClient()
+        self.client.force_authenticate(self.hospital.admin)
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, [q['sql'] for q in ctx.captured_queries]
+
+    def test_fields_trim_payload_and_sql(self):
+        data, queries = self.get('/api/appointments/', fields='id,date')
+        self.assertEqual(set(data[0]), {'id', 'date'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN "accounts_user"', queries[0])
+        self.assertNotIn('"notes"', queries[0])
+
+        data, queries = self.get('/api/appointments/', fields='id,patient_name,doctor_name')
+        self.assertEqual(data[0]['patient_name'], 'Ravi')
+        self.assertEqual(data[0]['doctor_name'], 'Asha Rao')
+        self.assertEqual(len(queries), 1)
+
+    def test_omit_and_other_serializers(self):
+        data, _ = self.get('/api/appointments/', omit='patient_details,notes')
+        self.assertNotIn('patient_details', data[0])
+        self.assertIn('patient_name', data[0])
+
+        data, queries = self.get('/api/doctors/', fields='id,specialization')
+        self.assertEqual(set(data[0]), {'id', 'specialization'})
+        self.assertNotIn('JOIN', queries[0])
+
+        data, _ = self.get('/api/appointments/', fields='id,status', compact=1, page_size=2)
+        self.assertEqual(set(data['results'][0]), {'id', 'status'})
+        self.assertIsNotNone(data['next'])
+        self.assertEqual(len(data['included']['patients']), 1)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/appointments/', {'fields': 'id,nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields'})
+        response = self.client.get('/api/appointments/', {'omit': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'omit'})
+
+    def test_full_reads_build_no_serializer_to_check_for_sparse_params(self):
+        with mock.patch.object(AppointmentViewSet, 'get_serializer', side_effect=AssertionError) as get_serializer:
+            self.assertEqual(self.client.get('/api/appointments/').status_code, 200)
+        get_serializer.assert_not_called()
+
+
+class FastPathTests(TestCase):
+    """The fast list path must send exactly the bytes the serializers would."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital, cls.doctor = create_hospital('Sañjīvanī   Care')
+        cls.doctor.department = Department.objects.create(name='OPD', hospital=cls.hospital)
+        cls.doctor.save()
+        cls.undepartmented = Doctor.objects.create(
+            user=User.objects.create_user(username='no-dept', password='pass', role=User.Role.DOCTOR), hospital=cls.hospital,
+        )
+        patients = [
+            User.objects.create_user(username='ravi', password='pass', first_name='Ravi', dob=datetime.date(1990, 12, 31)),
+            User.objects.create_user(username='मीरा', password='pass', last_name='"Quoted"\\ ', dob=None, address='Line 1\nLine 2\t\x01'),
+        ]
+        for i, patient in enumerate(patients):
+            Appointment.objects.create(patient=patient, doctor=cls.doctor, date=datetime.date(2030, 1, 1), time=datetime.time(9, i), notes='😀 emoji \u2028\u2029')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.hospital.admin)
+
+    def expected(self, serializer_class, queryset):
+        from rest_framework.renderers import JSONRenderer
+        return JSONRenderer().render(serializer_class(queryset, many=True).data)
+
+    def test_lists_match_serializer_bytes(self):
+        from .serializers import AppointmentSerializer, DoctorSerializer
+        response = self.client.get('/api/appointments/')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content, self.expected(AppointmentSerializer, Appointment.objects.all()))
+        self.assertIn(b'\\u2029', response.content)
+        self.assertEqual(self.client.get('/api/doctors/').content, self.expected(DoctorSerializer, Doctor.objects.all()))
+
+    def test_stdlib_encoder_matches_too(self):
+        from unittest import mock
+        from . import fastpath
+        rows = fastpath.APPOINTMENT_LAYOUT.rows(Appointment.objects.all())
+        with mock.patch.object(fastpath, 'orjson', None):
+            self.assertEqual(fastpath.render(rows), self.client.get('/api/appointments/').content)
+
+    def test_pages_and_sparse_reads_use_serializers(self):
+        self.assertEqual(len(self.client.get('/api/appointments/', {'page_size': 1}).data['results']), 1)
+        self.assertEqual(set(self.client.get('/api/appointments/', {'fields': 'id'}).data[0]), {'id'})
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital, cls.doctor = create_hospital()
+        cls.patient = User.objects.create_user(username='patient', password='pass', first_name='Ravi')
+        cls.bed = Bed.objects.create(hospital=cls.hospital, ward='General', number='1')
+        Appointment.objects.create(patient=cls.patient, doctor=cls.doctor, date=datetime.date(2030, 1, 1), time=datetime.time(9))
+
+    def setUp(self):
+        self.client = APIClient()
+        # Loaded with its hospital, as token and session authentication do
+        self.client.force_authenticate(User.objects.select_related('hospital_managed').get(pk=self.hospital.admin_id))
+
+    def revalidate(self, url, etag, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_poll_is_304_without_queries(self):
+        for url in ('/api/appointments/', '/api/beds/', '/api/staff/', '/api/hospital-details/'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200, url)
+            self.assertIn('no-cache', first['Cache-Control'])
+            with self.assertNumQueries(0):
+                response = self.revalidate(url, first['ETag'])
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response['ETag'], first['ETag'])
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get('/api/beds/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bed.is_occupied = True
+            self.bed.save()
+        response = self.revalidate('/api/beds/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()[0]['is_occupied'])
+
+        etag = self.client.get('/api/appointments/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.last_login = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+            self.patient.save()
+        self.assertEqual(self.revalidate('/api/appointments/', etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.first_name = 'Ravindra'
+            self.patient.save()
+        self.assertEqual(self.revalidate('/api/appointments/', etag).status_code, 200)
+
+    def test_reassigning_an_appointment_changes_the_old_hospitals_etag(self):
+        _, other_doctor = create_hospital('Elsewhere')
+        etag = self.client.get('/api/appointments/')['ETag']
+        apt = Appointment.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            apt.doctor = other_doctor
+            apt.save()
+        response = self.revalidate('/api/appointments/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    def test_etag_depends_on_query_and_role(self):
+        etag = self.client.get('/api/appointments/')['ETag']
+        self.assertEqual(self.revalidate('/api/appointments/', etag, fields='id').status_code, 200)
+        patient = APIClient()
+        patient.force_authenticate(self.patient)
+        self.assertFalse(patient.get('/api/appointments/').has_header('ETag'))
+
+
+class BulkStatusTests(TestCase):
+    url = '/api/appointments/bulk-status/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital, cls.doctor = create_hospital()
+        _, cls.other_doctor = create_hospital('Elsewhere')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.select_related('hospital_managed').get(pk=self.hospital.admin_id))
+
+    def book(self, count, doctor=None, status=Appointment.Status.PENDING):
+        start = Appointment.objects.count()
+        return [
+            Appointment.objects.create(patient=self.patient, doctor=doctor or self.doctor, date=datetime.date(2030, 1, 1), time=datetime.time(8 + (start + i) // 60, (start + i) % 60), status=status).id
+            for i in range(count)
+        ]
+
+    def confirm(self, ids, **extra):
+        return self.client.post(self.url, {'ids': ids, 'current_status': 'PENDING', 'status': 'CONFIRMED'}, format='json', **extra)
+
+    def test_moves_pending_rows_and_reports_the_rest(self):
+        pending = self.book(3)
+        cancelled = self.book(1, status=Appointment.Status.CANCELLED)
+        foreign = self.book(1, doctor=self.other_doctor)
+        before = Appointment.objects.get(pk=pending[0]).updated_at
+        response = self.confirm(pending + cancelled + foreign + [999999])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], pending)
+        self.assertEqual(response.data['conflicts'], [{'id': cancelled[0], 'status': 'CANCELLED'}])
+        self.assertEqual(response.data['missing'], sorted(foreign + [999999]))
+        self.assertEqual(set(Appointment.objects.filter(pk__in=pending).values_list('status', flat=True)), {'CONFIRMED'})
+        self.assertGreater(Appointment.objects.get(pk=pending[0]).updated_at, before)
+        self.assertEqual(Appointment.objects.get(pk=foreign[0]).status, 'PENDING')
+
+        # Applying it again finds every row already moved
+        self.assertEqual(self.confirm(pending).data['conflicts'], [{'id': pk, 'status': 'CONFIRMED'} for pk in pending])
+
+    def test_query_count_does_not_grow_with_ids(self):
+        for count in (2, 60):
+            ids = self.book(count)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(len(self.confirm(ids).data['updated']), count)
+            # locked read and update, inside the request and service savepoints
+            self.assertEqual(len(ctx.captured_queries), 6)
+
+    def test_rows_moved_elsewhere_are_conflicts_whatever_their_timestamp(self):
+        pending = self.book(1)
+        confirmed = self.book(1, status=Appointment.Status.CONFIRMED)
+        stamp = timezone.now()
+        Appointment.objects.filter(pk__in=confirmed).update(updated_at=stamp)
+        with mock.patch('django.utils.timezone.now', return_value=stamp):
+            response = self.confirm(pending + confirmed)
+        self.assertEqual(response.data['updated'], pending)
+        self.assertEqual(response.data['conflicts'], [{'id': confirmed[0], 'status': 'CONFIRMED'}])
+
+    def test_row_changed_between_read_and_update_is_a_conflict(self):
+        pending = self.book(3)
+        raced = pending[1]
+        update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            # Another writer cancels one row after set_status has read it
+            if queryset.model is Appointment and not getattr(racing_update, 'done', False):
+                racing_update.done = True
+                with connection.cursor() as cursor:
+                    cursor.execute('UPDATE appointments_appointment SET status = %s WHERE id = %s', ['CANCELLED', raced])
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            response = self.confirm(pending)
+        self.assertEqual(response.data['updated'], [pending[0], pending[2]])
+        self.assertEqual(response.data['conflicts'], [{'id': raced, 'status': 'CANCELLED'}])
+        self.assertEqual(Appointment.objects.get(pk=raced).status, 'CANCELLED')
+
+    def test_publishes_events_and_changes_the_etag(self):
+        ids = self.book(2)
+        etag = self.client.get('/api/appointments/')['ETag']
+        loop = asyncio.new_event_loop()
+        subscription = broker.subscribe(self.hospital.id, loop=loop)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.confirm(ids)
+            events = [loop.run_until_complete(asyncio.wait_for(subscription.get(), timeout=1)) for _ in ids]
+        finally:
+            broker.unsubscribe(subscription)
+            loop.close()
+        self.assertEqual(events, [{'type': 'appointment.status', 'id': pk, 'status': 'CONFIRMED'} for pk in ids])
+        self.assertEqual(self.client.get('/api/appointments/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_idempotent_retry_replays_the_outcome(self):
+        ids = self.book(2)
+        first = self.confirm(ids, HTTP_IDEMPOTENCY_KEY='morning-batch')
+        retry = self.confirm(ids, HTTP_IDEMPOTENCY_KEY='morning-batch')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_rejects_bad_requests(self):
+        ids = self.book(1)
+        body = {'ids': ids, 'current_status': 'PENDING', 'status': 'PENDING'}
+        self.assertEqual(self.client.post(self.url, body, format='json').status_code, 400)
+        body.update(current_status='CANCELLED')
+        self.assertEqual(self.client.post(self.url, body, format='json').status_code, 400)
+        patient = APIClient()
+        patient.force_authenticate(self.patient)
+        self.assertEqual(patient.post(self.url, {'ids': ids, 'current_status': 'PENDING', 'status': 'CONFIRMED'}, format='json').status_code, 403)
+
+
+class BatchTests(TestCase):
+    url = '/api/batch/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital, cls.doctor = create_hospital()
+        Bed.objects.create(hospital=cls.hospital, ward='General', number='1')
+        Staff.objects.create(hospital=cls.hospital, name='Nurse Joy', phone='1')
+        cls.token = Token.objects.create(user=cls.hospital.admin)
+
+    def setUp(self):
+        identities.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def post(self, *requests):
+        return self.client.post(self.url, {'requests': list(requests)}, format='json')
+
+    def test_cold_load_in_one_round_trip(self):
+        paths = ['/api/hospital-details/', '/api/staff-roles/', '/api/staff/', '/api/beds/', '/api/sync/?resources=appointments&compact=1']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post(*[{'path': path} for path in paths])
+        self.assertEqual(response.status_code, 200)
+        results = response.data['responses']
+        self.assertEqual([result['status'] for result in results], [200] * len(paths))
+        self.assertEqual(results[0]['body'][0]['name'], 'City Care')
+        self.assertEqual(results[2]['body'][0]['name'], 'Nurse Joy')
+        self.assertIn('ETag', results[3]['headers'])
+        self.assertEqual(results[4]['body']['appointments'], [])
+        # The token is looked up once for the whole batch
+        self.assertEqual(sum('authtoken_token' in query['sql'] for query in ctx.captured_queries), 1)
+
+    def test_sub_requests_write_and_revalidate(self):
+        first = self.post({'path': '/api/beds/'})
+        etag = first.data['responses'][0]['headers']['ETag']
+        results = self.post(
+            {'path': '/api/beds/', 'headers': {'If-None-Match': etag}},
+            {'method': 'POST', 'path': '/api/beds/', 'body': {'ward': 'ICU', 'number': '2'}},
+            {'method': 'POST', 'path': '/api/beds/', 'body': {'ward': 'ICU'}},
+        ).data['responses']
+        self.assertEqual([result['status'] for result in results], [304, 201, 400])
+        self.assertIsNone(results[0]['body'])
+        self.assertEqual(results[2]['body'], {'number': ['This field is required.']})
+        self.assertTrue(Bed.objects.filter(ward='ICU', number='2').exists())
 
-# Create your tests here.
+    def test_paths_are_checked(self):
+        self.assertEqual(self.post({'path': '/admin/'}).status_code, 400)
+        results = self.post({'path': '/api/nowhere/'}, {'path': '/api/batch/'}, {'path': '/api/events/'}).data['responses']
+        self.assertEqual([result['status'] for result in results], [404, 400, 400])
+        self.assertEqual(APIClient().post(self.url, {'requests': [{'path': '/api/beds/'}]}, format='json').status_code, 401)
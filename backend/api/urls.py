@@ -1,9 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken import views as auth_views
+from .events import hospital_events
 from .views import (
     UserViewSet, DoctorViewSet, AppointmentViewSet, RegisterViewSet, 
-    StaffViewSet, BedViewSet, HospitalDataViewSet, StaffRoleView, ConsultationViewSet
+    StaffViewSet, BedViewSet, HospitalDataViewSet, StaffRoleView, ConsultationViewSet, SyncView, BatchView
 )
 
 router = DefaultRouter()
@@ -19,5 +20,8 @@ router.register(r'register', RegisterViewSet, basename='register')
 urlpatterns = [
     path('api-token-auth/', auth_views.obtain_auth_token),
     path('staff-roles/', StaffRoleView.as_view(), name='staff-roles'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('events/', hospital_events, name='events'),
     path('', include(router.urls)),
 ]
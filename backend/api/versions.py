@@ -0,0 +1,54 @@
+"""
+Per-hospital change versions behind the API's collection ETags.
+
+Each hospital has one version per collection in the Django cache. api.signals
+bump it after commit whenever a row of that collection is saved or deleted,
+and ConditionalListMixin turns it into the list's ETag, so an unchanged poll
+is answered with 304 from the cache alone instead of hashing a serialized
+body. Appointment rows embed patient and doctor profiles, which belong to no
+single hospital; those bump one global PROFILES version instead.
+
+Writes that bypass signals (queryset update() or bulk_create()) must call
+bump() themselves. Like the booking directory, multi-process deployments need
+a shared cache backend for a bump to reach every worker.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+APPOINTMENTS = 'appointments'
+BEDS = 'beds'
+STAFF = 'staff'
+HOSPITAL = 'hospital'
+PROFILES = 'profiles'
+
+
+def _key(collection, hospital_id=None):
+    return f'api:version:{collection}' if hospital_id is None else f'api:version:{collection}:{hospital_id}'
+
+
+def current(collection, hospital_id=None):
+    key = _key(collection, hospital_id)
+    version = cache.get(key)
+    if version is None:
+        # Seeded from the clock so an evicted key never returns to an old value
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump(collection, hospital_id=None):
+    try:
+        cache.incr(_key(collection, hospital_id))
+    except ValueError:
+        current(collection, hospital_id)
+
+
+def etag(parts, variant=''):
+    """
+    Weak ETag from the versions (and anything else the body depends on) plus
+    the request variant (query string, renderer) it was computed for.
+    """
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:12]
+    return 'W/"%s-%s"' % ('.'.join(str(part) for part in parts), digest)
@@ -1,24 +1,162 @@
 
+import json
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from django.utils.dateparse import parse_datetime
 from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
 from hospitals.models import Doctor, Staff, Bed, Hospital
-from appointments.models import Appointment
-from .serializers import UserSerializer, DoctorSerializer, AppointmentSerializer, StaffSerializer, BedSerializer, HospitalDetailSerializer
+from appointments import slots
+from appointments.models import Appointment, Consultation, Tombstone
+from .serializers import (
+    UserSerializer, DoctorSerializer, AppointmentSerializer, CompactAppointmentSerializer,
+    StaffSerializer, BedSerializer, HospitalDetailSerializer, BulkStatusSerializer, BatchSerializer, prune_queryset, side_load_profiles, sparse_params,
+)
+from .filters import AppointmentFilterBackend, ConsultationFilterBackend, parse_bool_param, parse_date_param
+from .idempotency import run_idempotent
+from .pagination import AppointmentCursorPagination
+from .signals import bump_on_commit, publish_on_commit
+from . import batch, fastpath, versions
 
 User = get_user_model()
 
+def visible_appointments(user):
+    if user.role == User.Role.PATIENT:
+        return Appointment.objects.filter(patient=user)
+    elif user.role == User.Role.DOCTOR:
+         # Assuming doctor profile exists
+         return Appointment.objects.filter(doctor__user=user)
+    elif user.role == User.Role.HOSPITAL:
+         return Appointment.objects.filter(doctor__hospital__admin=user)
+    return Appointment.objects.none()
+
+class EagerLoadingMixin:
+    """
+    Eager-loading profile for a viewset: the relations its serializer reads,
+    joined (`select_related_fields`) or batch-loaded (`prefetch_related_fields`)
+    so a list costs the same number of queries at 10 rows as at 10,000.
+    Applied in filter_queryset() so it covers list, retrieve, custom actions
+    and whatever get_queryset() a viewset defines. Sparse reads replace the
+    profile with exactly what the trimmed serializer needs.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    # Columns a sparse (?fields=/?omit=) read must still load, e.g. for cursors
+    sparse_required_fields = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if sparse_params(self.request) is not None:
+            serializer = self.get_serializer()
+            if getattr(serializer, 'sparse', False):
+                pruned = prune_queryset(queryset, serializer, always=self.get_sparse_required_fields())
+                if pruned is not None:
+                    return pruned
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        return queryset
+
+    def get_sparse_required_fields(self):
+        return self.sparse_required_fields
+
+class FastListMixin:
+    """
+    Serves plain JSON lists through api.fastpath (`fast_layout`) instead of
+    the serializer. Paginated pages, sparse fieldsets and the browsable API
+    still go through the serializer, which stays the reference output.
+    """
+    fast_layout = None
+
+    def list(self, request, *args, **kwargs):
+        if (self.fast_layout is None or request.accepted_renderer.format != 'json'
+                or sparse_params(request) is not None):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return fastpath.response(self.fast_layout, queryset)
+
+class ConditionalListMixin:
+    """
+    Conditional GET for a hospital's collection. The list's ETag is built
+    from the api.versions of `version_collections`, so a poll whose
+    If-None-Match still matches gets 304 without touching the main tables.
+    Viewsets with their own list logic override list_response(). Only
+    hospital users get ETags; other roles see rows from many hospitals.
+    """
+    version_collections = ()
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_list_etag()
+        if etag is not None and etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = self.list_response(request, *args, **kwargs)
+        if etag is not None and response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list_response(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def get_list_etag(self):
+        user = self.request.user
+        if not self.version_collections or user.role != User.Role.HOSPITAL:
+            return None
+        hospital = getattr(user, 'hospital_managed', None)
+        if hospital is None:
+            return None
+        variant = f"{self.request.accepted_renderer.format}?{self.request.META.get('QUERY_STRING', '')}"
+        return versions.etag(self.get_version_parts(hospital.pk), variant)
+
+    def get_version_parts(self, hospital_id):
+        return [versions.current(collection, hospital_id) for collection in self.version_collections]
+
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class DoctorViewSet(viewsets.ModelViewSet):
+class DoctorViewSet(EagerLoadingMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Doctor.objects.all()
     serializer_class = DoctorSerializer
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = ('user', 'hospital', 'department')
+    fast_layout = fastpath.DOCTOR_LAYOUT
+
+    @action(detail=True)
+    def slots(self, request, pk=None):
+        """
+        Free slots per day: ?date_from=&date_to= (defaults to the next 7 days).
+        Days are null when the doctor has no schedule, so any free time is open.
+        """
+        doctor = self.get_object()
+        start = parse_date_param(request, 'date_from') or timezone.localdate()
+        end = parse_date_param(request, 'date_to') or start + timedelta(days=6)
+        if end < start or (end - start).days >= slots.MAX_RANGE_DAYS:
+            raise ValidationError({'date_to': f'Must be within {slots.MAX_RANGE_DAYS} days after date_from.'})
+        free = slots.free_slots(doctor.id, start, end)
+        # null for a date means the doctor has no schedule and takes any free time
+        return Response({
+            date.isoformat(): None if times is None else [time.strftime('%H:%M') for time in times]
+            for date, times in free.items()
+        })
 
 class RegisterViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -36,23 +174,174 @@ class RegisterViewSet(viewsets.ModelViewSet):
             "message": "User Created Successfully.  Now perform Login to get your token",
         })
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(ConditionalListMixin, EagerLoadingMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = ('patient', 'doctor__user')
+    fast_layout = fastpath.APPOINTMENT_LAYOUT
+    version_collections = (versions.APPOINTMENTS,)
+    sparse_required_fields = AppointmentCursorPagination.ordering
+    pagination_class = AppointmentCursorPagination
+    filter_backends = [AppointmentFilterBackend]
+
+    # Rows pulled from the DB per round trip when streaming (?stream=1)
+    stream_chunk_size = 500
     
     def get_queryset(self):
-        user = self.request.user
-        if user.role == User.Role.PATIENT:
-            return Appointment.objects.filter(patient=user)
-        elif user.role == User.Role.DOCTOR:
-             # Assuming doctor profile exists
-             return Appointment.objects.filter(doctor__user=user)
-        elif user.role == User.Role.HOSPITAL:
-             return Appointment.objects.filter(doctor__hospital__admin=user)
-class StaffViewSet(viewsets.ModelViewSet):
+        return visible_appointments(self.request.user)
+
+    def perform_create(self, serializer):
+        self.save_slot(serializer)
+
+    def perform_update(self, serializer):
+        self.save_slot(serializer)
+
+    def save_slot(self, serializer):
+        # The serializer's unique check can lose a race; the constraint cannot
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({'non_field_errors': ['This time slot is already booked.']})
+
+    @action(detail=True, methods=['get', 'post'])
+    def consultation(self, request, pk=None):
+        """
+        GET returns the appointment's consultation (404 until one exists).
+        POST saves it, replaces its prescriptions (`prescriptions_data`),
+        records vitals and marks the appointment COMPLETED in one transaction.
+        Send an Idempotency-Key header so a retried POST is never applied twice.
+        """
+        appointment = self.get_object()
+        hospital = getattr(request.user, 'hospital_managed', None)
+        if hospital is None:
+            raise PermissionDenied('Only the hospital can record consultations.')
+
+        def current():
+            return Consultation.objects.filter(appointment=appointment).prefetch_related('prescriptions').first()
+
+        if request.method == 'GET':
+            existing = current()
+            if existing is None:
+                raise NotFound('No consultation for this appointment yet.')
+            return Response(ConsultationSerializer(existing).data)
+
+        def complete():
+            existing = current()
+            serializer = ConsultationSerializer(existing, data=request.data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            consultation = save_consultation(
+                appointment, serializer.validated_data, validated_prescriptions(request.data),
+                hospital=hospital, complete=True, consultation=existing,
+            )
+            return Response(ConsultationSerializer(consultation).data)
+
+        return run_idempotent(request, complete)
+
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        """
+        Move many appointments from `current_status` to `status` with one
+        locked read and one UPDATE. Rows that had already left current_status are
+        untouched and listed under `conflicts` with their status now; ids the
+        hospital cannot see come back as `missing`. Send an Idempotency-Key
+        header so a retry reports the original outcome.
+        """
+        hospital = getattr(request.user, 'hospital_managed', None)
+        if hospital is None:
+            raise PermissionDenied('Only the hospital can change appointments in bulk.')
+        serializer = BulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids, new_status = serializer.validated_data['ids'], serializer.validated_data['status']
+
+        def transition():
+            from appointments.services import set_status
+            updated, conflicts = set_status(
+                Appointment.objects.filter(doctor__hospital=hospital), ids,
+                serializer.validated_data['current_status'], new_status,
+            )
+            # update() sent no post_save, so do what the signal handlers would
+            if updated:
+                bump_on_commit(versions.APPOINTMENTS, hospital.id)
+            for pk in updated:
+                publish_on_commit(hospital.id, {'type': 'appointment.status', 'id': pk, 'status': new_status})
+            return Response({
+                'status': new_status,
+                'updated': sorted(updated),
+                'conflicts': [{'id': pk, 'status': conflicts[pk]} for pk in sorted(conflicts)],
+                'missing': sorted(set(ids) - set(updated) - set(conflicts)),
+            })
+
+        return run_idempotent(request, transition)
+
+    def is_compact(self):
+        return self.action == 'list' and parse_bool_param(self.request, 'compact')
+
+    def get_serializer_class(self):
+        if self.is_compact():
+            return CompactAppointmentSerializer
+        return super().get_serializer_class()
+
+    def get_sparse_required_fields(self):
+        # The `included` section is built from the rows' patient and doctor
+        if self.is_compact():
+            return (*self.sparse_required_fields, 'patient', 'doctor')
+        return self.sparse_required_fields
+
+    def get_version_parts(self, hospital_id):
+        # Rows embed profiles shared across hospitals, and ages that change on birthdays
+        return [*super().get_version_parts(hospital_id), versions.current(versions.PROFILES), timezone.localdate().isoformat()]
+
+    def list_response(self, request, *args, **kwargs):
+        stream = parse_bool_param(request, 'stream')
+        if self.is_compact():
+            if stream:
+                raise ValidationError({'compact': 'Cannot be combined with stream.'})
+            return self.compact_list()
+        if stream:
+            queryset = self.filter_queryset(self.get_queryset())
+            queryset = queryset.order_by(*AppointmentCursorPagination.ordering)
+            return StreamingHttpResponse(self.stream_rows(queryset), content_type='application/json')
+        return super().list_response(request, *args, **kwargs)
+
+    def compact_list(self):
+        # ?compact=1: rows carry ids only and each profile is sent once under `included`
+        queryset = self.filter_queryset(self.get_queryset()).select_related('patient', 'doctor__user')
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        results = self.get_serializer(rows, many=True).data
+        if page is None:
+            response = Response({'results': results})
+        else:
+            response = self.get_paginated_response(results)
+        response.data['included'] = side_load_profiles(rows)
+        return response
+
+    def stream_rows(self, queryset):
+        # Write the JSON array as we go so memory stays flat however long the history is
+        yield '['
+        separator = ''
+        chunk = []
+        for obj in queryset.iterator(chunk_size=self.stream_chunk_size):
+            chunk.append(obj)
+            if len(chunk) == self.stream_chunk_size:
+                yield separator + self.encode_chunk(chunk)
+                separator = ','
+                chunk = []
+        if chunk:
+            yield separator + self.encode_chunk(chunk)
+        yield ']'
+
+    def encode_chunk(self, rows):
+        # One serializer per chunk; the array's brackets come from stream_rows()
+        data = self.get_serializer(rows, many=True).data
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))[1:-1]
+
+class StaffViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     serializer_class = StaffSerializer
     permission_classes = [permissions.IsAuthenticated]
+    version_collections = (versions.STAFF,)
 
     def get_queryset(self):
         user = self.request.user
@@ -64,9 +353,10 @@ class StaffViewSet(viewsets.ModelViewSet):
         if self.request.user.role == User.Role.HOSPITAL:
             serializer.save(hospital=self.request.user.hospital_managed)
 
-class BedViewSet(viewsets.ModelViewSet):
+class BedViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     serializer_class = BedSerializer
     permission_classes = [permissions.IsAuthenticated]
+    version_collections = (versions.BEDS,)
 
     def get_queryset(self):
         user = self.request.user
@@ -78,15 +368,37 @@ class BedViewSet(viewsets.ModelViewSet):
         if self.request.user.role == User.Role.HOSPITAL:
             serializer.save(hospital=self.request.user.hospital_managed)
 
-class HospitalDataViewSet(viewsets.ModelViewSet):
+class HospitalDataViewSet(ConditionalListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = HospitalDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
+    version_collections = (versions.HOSPITAL,)
+    select_related_fields = ('city',)
 
     def get_queryset(self):
          if hasattr(self.request.user, 'hospital_managed'):
              return Hospital.objects.filter(admin=self.request.user)
          return Hospital.objects.none()
 
+class BatchView(APIView):
+    """
+    POST /api/batch/ with {"requests": [{"method", "path", "body", "headers"}]}
+    runs each sub-request against the API in-process under this request's
+    authentication and returns {"responses": [{"status", "headers", "body"}]}
+    in the same order. Sub-requests may send If-None-Match and
+    Idempotency-Key; each runs on its own (see api.batch).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    # A batch inside a batch would only hide how many requests were made
+    batchable = False
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'responses': [
+            batch.dispatch(request, item['method'], item['path'], item.get('body'), item.get('headers'))
+            for item in serializer.validated_data['requests']
+        ]})
+
 class StaffRoleView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -95,13 +407,25 @@ class StaffRoleView(APIView):
         roles = [choice[0] for choice in Staff.Role.choices]
         return Response(roles)
 
-from appointments.models import Consultation, Prescription
-from .serializers import ConsultationSerializer
+from appointments.models import Consultation
+from appointments.services import save_consultation
+from .serializers import ConsultationSerializer, PrescriptionSerializer
+
+def validated_prescriptions(data):
+    """The request's `prescriptions_data` list, validated; None when the key is absent."""
+    if 'prescriptions_data' not in data:
+        return None
+    items = PrescriptionSerializer(data=data.get('prescriptions_data') or [], many=True)
+    items.is_valid(raise_exception=True)
+    return items.validated_data
 
-class ConsultationViewSet(viewsets.ModelViewSet):
+class ConsultationViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Consultation.objects.all()
     serializer_class = ConsultationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    prefetch_related_fields = ('prescriptions',)
+
+    filter_backends = [ConsultationFilterBackend]
 
     def get_queryset(self):
         # Only show consultations for hospital's doctors
@@ -111,59 +435,137 @@ class ConsultationViewSet(viewsets.ModelViewSet):
         return Consultation.objects.none()
 
     def create(self, request, *args, **kwargs):
-        # Custom create to handle vitals sync and prescriptions
-        data = request.data
-        serializer = self.get_serializer(data=data)
+        serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        consultation = serializer.save()
-
-        # Handle Prescriptions
-        prescriptions_data = data.get('prescriptions_data', [])
-        for pres_item in prescriptions_data:
-            Prescription.objects.create(consultation=consultation, **pres_item)
-            
-        # Handle Vitals Sync (Same logic as web view)
-        self._sync_vitals(consultation, request.user)
-        
+        appointment = serializer.validated_data['appointment']
+        hospital = getattr(request.user, 'hospital_managed', None)
+        if hospital is None or appointment.doctor.hospital_id != hospital.id:
+            raise ValidationError({'appointment': 'Not an appointment of your hospital.'})
+        serializer.instance = self.save_consultation(serializer, appointment)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
-    
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        consultation = serializer.save()
+        serializer.instance = self.save_consultation(serializer, instance.appointment, consultation=instance)
+        return Response(serializer.data)
 
-        # Handle Prescriptions (Rewrite logic)
-        if 'prescriptions_data' in request.data:
-            consultation.prescriptions.all().delete()
-            prescriptions_data = request.data.get('prescriptions_data', [])
-            for pres_item in prescriptions_data:
-                Prescription.objects.create(consultation=consultation, **pres_item)
+    def save_consultation(self, serializer, appointment, consultation=None):
+        # Same transactional path as the web form: one save, vitals history, prescription diff
+        return save_consultation(
+            appointment, serializer.validated_data, validated_prescriptions(self.request.data),
+            hospital=getattr(self.request.user, 'hospital_managed', None), consultation=consultation,
+        )
 
-        return Response(serializer.data)
 
-    def _sync_vitals(self, consultation, user):
-        # Sync logic here
-        from core.models import Vitals as VitalsHistory
-        # Basic parsing
-        try:
-             bp_val = consultation.bp
-             sys, dia = 0, 0
-             if bp_val and '/' in bp_val:
-                 sys, dia = map(int, bp_val.split('/'))
-             
-             if consultation.weight or consultation.bp:
-                 VitalsHistory.objects.create(
-                     patient=consultation.appointment.patient,
-                     height=0,
-                     weight=float(consultation.weight) if consultation.weight else 0,
-                     bp_systolic=sys,
-                     bp_diastolic=dia,
-                     heart_rate=int(consultation.pulse) if consultation.pulse else 0,
-                     temperature=float(consultation.temperature) if consultation.temperature else 0,
-                     hospital=user.hospital_managed if hasattr(user, 'hospital_managed') else None
-                 )
-        except Exception as e:
-            print(f"Error syncing vitals: {e}")
+class SyncView(APIView):
+    """
+    Delta sync for appointments and consultations.
+
+    GET /api/sync/?since=<watermark> returns the rows created or updated after
+    the watermark, the ids deleted (or moved away) after it, and a new
+    watermark to send next time. Without `since`, or with one older than
+    Tombstone.RETENTION, it returns a full snapshot (`full: true`).
+    `?resources=appointments` limits the payload to one collection, and
+    `?compact=1` sends appointments with bare ids plus an `included` section
+    of patient and doctor profiles. An appointment also counts as updated
+    when its patient's or doctor's profile changed after the watermark, so
+    deltas carry the new `patient_details` and `included` entries.
+
+    Watermarks are server clock readings compared with updated_at, which is
+    stamped when a row is saved, not when its transaction commits. A delta
+    therefore re-sends everything touched within `overlap` before the
+    watermark. The guarantee is bounded: a write whose transaction commits
+    more than `overlap` after it was saved can be missed by clients that
+    synced in between, until their next full snapshot. Every write path here
+    commits within milliseconds; keep long-running batch jobs from holding
+    appointment or consultation rows across that window.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    resources = ('appointments', 'consultations')
+
+    # Clients upsert by id, so the overlap only costs a few duplicate rows
+    overlap = timedelta(seconds=5)
+
+    def get(self, request):
+        since = self.parse_since(request)
+        if since is not None and since < timezone.now() - Tombstone.RETENTION:
+            # Deletes that old may have been purged: start the client over
+            since = None
+        wanted = self.parse_resources(request)
+        watermark = timezone.now()
+        user = request.user
+
+        appointments = visible_appointments(user)
+        floor = since - self.overlap if since else None
+        data = {'watermark': watermark.isoformat(), 'full': since is None}
+        deleted = {}
+
+        if 'appointments' in wanted:
+            rows = appointments.select_related('patient', 'doctor__user')
+            if floor:
+                # Rows embed their patient and doctor, so a profile edit re-sends them
+                edited = User.objects.filter(profile_updated_at__gt=floor).values('id')
+                rows = rows.filter(
+                    Q(updated_at__gt=floor) | Q(doctor__updated_at__gt=floor)
+                    | Q(patient__in=edited) | Q(doctor__user__in=edited)
+                )
+            if parse_bool_param(request, 'compact'):
+                rows = list(rows)
+                data['appointments'] = CompactAppointmentSerializer(rows, many=True).data
+                data['included'] = side_load_profiles(rows)
+            else:
+                data['appointments'] = AppointmentSerializer(rows, many=True).data
+            deleted['appointments'] = []
+
+        if 'consultations' in wanted:
+            rows = Consultation.objects.filter(appointment__in=appointments.values('id')).prefetch_related('prescriptions')
+            if floor:
+                rows = rows.filter(updated_at__gt=floor)
+            data['consultations'] = ConsultationSerializer(rows, many=True).data
+            deleted['consultations'] = []
+
+        if floor:
+            tombstones = self.visible_tombstones(user).filter(deleted_at__gt=floor)
+            for kind, object_id in tombstones.values_list('kind', 'object_id'):
+                key = f"{kind}s"
+                if key in deleted:
+                    deleted[key].append(object_id)
+            # A row that moved away and back is live again: send it, not its tombstone
+            for key in deleted:
+                present = {row['id'] for row in data[key]}
+                deleted[key] = sorted(set(deleted[key]) - present)
+        data['deleted'] = deleted
+        return Response(data)
+
+    def parse_since(self, request):
+        value = request.query_params.get('since')
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            raise ValidationError({'since': 'Expected an ISO 8601 timestamp.'})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def parse_resources(self, request):
+        value = request.query_params.get('resources')
+        if not value:
+            return set(self.resources)
+        wanted = {r.strip() for r in value.split(',') if r.strip()}
+        unknown = wanted - set(self.resources)
+        if unknown:
+            raise ValidationError({'resources': f"Unknown resource: {', '.join(sorted(unknown))}"})
+        return wanted
+
+    def visible_tombstones(self, user):
+        if user.role == User.Role.PATIENT:
+            return Tombstone.objects.filter(patient_id=user.id)
+        elif user.role == User.Role.DOCTOR and hasattr(user, 'doctor_profile'):
+            return Tombstone.objects.filter(doctor_id=user.doctor_profile.id)
+        elif user.role == User.Role.HOSPITAL and hasattr(user, 'hospital_managed'):
+            return Tombstone.objects.filter(hospital_id=user.hospital_managed.id)
+        return Tombstone.objects.none()
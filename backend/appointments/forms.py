@@ -1,15 +1,18 @@
 from django import forms
 from .models import Appointment
+from . import slots
 from hospitals.models import Doctor
 
 class AppointmentForm(forms.ModelForm):
-    doctor = forms.ModelChoiceField(queryset=Doctor.objects.all(), empty_label="Select Doctor")
+    # Picked by id: the booking page's JS cascade fills the options from
+    # /ajax/doctors/, so none are loaded here
+    doctor = forms.IntegerField(widget=forms.Select(choices=[('', "Select Doctor")]))
     date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
     time = forms.TimeField(widget=forms.TimeInput(attrs={'type': 'time'}))
 
     class Meta:
         model = Appointment
-        fields = ['doctor', 'date', 'time', 'notes']
+        fields = ['date', 'time', 'notes']
         widgets = {
             'notes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
@@ -19,6 +22,14 @@ class AppointmentForm(forms.ModelForm):
         self.fields['date'].widget.attrs.update({'class': 'form-control'})
         self.fields['time'].widget.attrs.update({'class': 'form-control'})
 
+    def clean_doctor(self):
+        # One lookup, limited to doctors of verified hospitals. Slot clashes
+        # are checked in clean() and, under races, by the database constraint.
+        doctor = Doctor.objects.filter(pk=self.cleaned_data['doctor'], hospital__is_verified=True).first()
+        if doctor is None:
+            raise forms.ValidationError("Select a valid doctor.")
+        return doctor
+
     def clean(self):
         cleaned_data = super().clean()
         date = cleaned_data.get('date')
@@ -36,5 +47,9 @@ class AppointmentForm(forms.ModelForm):
             
             if apt_datetime < now:
                 raise forms.ValidationError("Appointment cannot be in the past.")
+
+            doctor = cleaned_data.get('doctor')
+            if doctor and not slots.is_open(doctor.id, date, time):
+                raise forms.ValidationError("This time slot is not available. Please pick another.")
         
         return cleaned_data
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from appointments.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = "Delete sync tombstones older than Tombstone.RETENTION"
+
+    def handle(self, *args, **options):
+        deleted = Tombstone.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired tombstone(s)."))
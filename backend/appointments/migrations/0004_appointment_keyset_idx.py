@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_consultation_height'),
+        ('hospitals', '0007_alter_doctor_specialization'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['date', 'time', 'id'], name='appointment_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Which booking of a double-booked slot survives: the furthest along, then the oldest
+PROGRESS = {'COMPLETED': 0, 'CONFIRMED': 1, 'PENDING': 2}
+
+
+def cancel_double_bookings(apps, schema_editor):
+    """
+    Keep one live booking per slot so the constraint can be added: the most
+    progressed (COMPLETED > CONFIRMED > PENDING), then the lowest id. The
+    other PENDING/CONFIRMED rows are cancelled. A slot holding two COMPLETED
+    appointments has clinical records on both, so the migration stops and
+    lists them for an operator instead of cancelling either.
+    """
+    Appointment = apps.get_model('appointments', 'Appointment')
+    live = Appointment.objects.exclude(status='CANCELLED').order_by('doctor_id', 'date', 'time', 'id')
+    slots = {}
+    for pk, status, *slot in live.values_list('id', 'status', 'doctor_id', 'date', 'time').iterator():
+        slots.setdefault(tuple(slot), []).append((PROGRESS.get(status, len(PROGRESS)), pk, status))
+
+    duplicates, completed = [], []
+    for bookings in slots.values():
+        if len(bookings) < 2:
+            continue
+        bookings.sort()
+        for _, pk, status in bookings[1:]:
+            if status == 'COMPLETED':
+                completed.append([pk for _, pk, status in bookings if status == 'COMPLETED'])
+                break
+            duplicates.append(pk)
+    if completed:
+        raise RuntimeError(
+            "These appointments are completed bookings of the same doctor slot; move or cancel all but one "
+            "of each group by hand, then migrate again: " + '; '.join(', '.join(map(str, ids)) for ids in completed)
+        )
+    Appointment.objects.filter(pk__in=duplicates).update(status='CANCELLED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_updated_at_tombstone'),
+        ('hospitals', '0009_doctorschedule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'CANCELLED'), _negated=True), fields=('doctor', 'date', 'time'), name='appointment_unique_active_slot', violation_error_message='This time slot is already booked.'),
+        ),
+    ]
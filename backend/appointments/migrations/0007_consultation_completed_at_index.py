@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_appointment_unique_active_slot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='consultation',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
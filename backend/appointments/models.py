@@ -1,5 +1,8 @@
+from datetime import timedelta
+
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from hospitals.models import Doctor
 
 class Appointment(models.Model):
@@ -16,6 +19,23 @@ class Appointment(models.Model):
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset order used by the API cursor pagination
+            models.Index(fields=['date', 'time', 'id'], name='appointment_keyset_idx'),
+        ]
+        constraints = [
+            # One live booking per doctor slot; cancelling frees it again.
+            # Also serves the slot engine's (doctor, date range) lookup.
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time'],
+                condition=~models.Q(status='CANCELLED'),
+                name='appointment_unique_active_slot',
+                violation_error_message='This time slot is already booked.',
+            ),
+        ]
 
     def __str__(self):
         return f"Appointment: {self.patient} with {self.doctor} on {self.date}"
@@ -39,7 +59,8 @@ class Consultation(models.Model):
     diagnosis = models.TextField(blank=True)
     advice = models.TextField(blank=True)
     
-    completed_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Consultation for {self.appointment}"
@@ -53,3 +74,38 @@ class Prescription(models.Model):
     
     def __str__(self):
         return self.medicine_name
+
+class Tombstone(models.Model):
+    """
+    Marker left behind when an appointment or consultation is deleted, or
+    moves away from a hospital, doctor or patient, so clients syncing with a
+    watermark can drop their local copy. The owners that lost the row are
+    kept as plain ids because the rows they point at may be gone by the time
+    a client asks.
+    """
+    # How long markers are kept; a client whose watermark is older gets a
+    # full snapshot instead of a delta. Older rows go in purge_expired().
+    RETENTION = timedelta(days=30)
+
+    class Kind(models.TextChoices):
+        APPOINTMENT = 'appointment', 'Appointment'
+        CONSULTATION = 'consultation', 'Consultation'
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    hospital_id = models.BigIntegerField(null=True)
+    doctor_id = models.BigIntegerField(null=True)
+    patient_id = models.BigIntegerField(null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hospital_id', 'deleted_at'], name='tombstone_hospital_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.kind} #{self.object_id}"
+
+    @classmethod
+    def purge_expired(cls):
+        return cls.objects.filter(deleted_at__lt=timezone.now() - cls.RETENTION).delete()[0]
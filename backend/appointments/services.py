@@ -0,0 +1,161 @@
+"""
+Write paths shared by the hospital web view and the API: consultations and
+bulk appointment status changes.
+
+Everything a consultation save touches (the consultation row, the patient's
+vitals history, the prescriptions and, on completion, the appointment) is
+written in one transaction with a fixed number of queries, whatever the
+number of medicines.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Vitals
+from .models import Appointment, Consultation, Prescription
+
+CONSULTATION_FIELDS = (
+    'nurse_name', 'bp', 'pulse', 'temperature', 'weight', 'height',
+    'symptoms', 'diagnosis', 'advice', 'completed_at',
+)
+VITAL_FIELDS = ('bp', 'pulse', 'temperature', 'weight')
+PRESCRIPTION_FIELDS = ('medicine_name', 'dosage', 'duration', 'instructions')
+
+
+def _number(value, cast):
+    try:
+        return cast(value) if value else cast(0)
+    except (TypeError, ValueError):
+        return cast(0)
+
+
+def vitals_for(consultation, hospital):
+    """Unsaved Vitals history row for the consultation, or None if nothing was measured."""
+    if not any(getattr(consultation, field) for field in VITAL_FIELDS):
+        return None
+    systolic = diastolic = 0
+    if consultation.bp and '/' in consultation.bp:
+        parts = consultation.bp.split('/')
+        systolic, diastolic = _number(parts[0], int), _number(parts[1], int)
+    return Vitals(
+        patient_id=consultation.appointment.patient_id,
+        height=0,  # Consultation height is in feet and optional; history keeps cm
+        weight=_number(consultation.weight, float),
+        bp_systolic=systolic,
+        bp_diastolic=diastolic,
+        heart_rate=_number(consultation.pulse, int),
+        temperature=_number(consultation.temperature, float),
+        hospital=hospital,
+    )
+
+
+def sync_prescriptions(consultation, items, existing=None):
+    """
+    Make the consultation's prescriptions match `items` (dicts of
+    PRESCRIPTION_FIELDS). Unchanged medicines keep their rows; the rest are
+    rewritten in place, deleted or bulk-created, at most one query each.
+    """
+    if existing is None:
+        existing = list(consultation.prescriptions.order_by('id'))
+    wanted = [tuple((item.get(field) or '') for field in PRESCRIPTION_FIELDS) for item in items]
+    wanted = [values for values in wanted if values[0]]
+
+    unmatched = []
+    remaining = list(wanted)
+    for row in existing:
+        values = tuple(getattr(row, field) for field in PRESCRIPTION_FIELDS)
+        if values in remaining:
+            remaining.remove(values)
+        else:
+            unmatched.append(row)
+
+    changed = []
+    for row, values in zip(unmatched, remaining):
+        for field, value in zip(PRESCRIPTION_FIELDS, values):
+            setattr(row, field, value)
+        changed.append(row)
+    if changed:
+        Prescription.objects.bulk_update(changed, PRESCRIPTION_FIELDS)
+
+    stale = unmatched[len(changed):]
+    if stale:
+        Prescription.objects.filter(pk__in=[row.pk for row in stale]).delete()
+
+    added = remaining[len(changed):]
+    if added:
+        Prescription.objects.bulk_create([
+            Prescription(consultation=consultation, **dict(zip(PRESCRIPTION_FIELDS, values)))
+            for values in added
+        ])
+
+
+@transaction.atomic
+def save_consultation(appointment, data, prescriptions=None, hospital=None, complete=False, consultation=None):
+    """
+    Create or update the appointment's consultation from `data` (any of
+    CONSULTATION_FIELDS; missing keys are left alone).
+
+    `prescriptions`, when given, replaces the medicine list. A vitals history
+    row is recorded when the measured vitals changed, so saving a draft twice
+    does not duplicate it. `complete` stamps completed_at and marks the
+    appointment COMPLETED.
+    """
+    if consultation is None:
+        consultation = Consultation.objects.filter(appointment=appointment).first()
+    created = consultation is None
+    if created:
+        consultation = Consultation(appointment=appointment)
+    consultation.appointment = appointment
+
+    before = tuple(getattr(consultation, field) for field in VITAL_FIELDS)
+    for field in CONSULTATION_FIELDS:
+        if field in data:
+            setattr(consultation, field, data[field])
+    if complete:
+        consultation.completed_at = timezone.now()
+    consultation.save()
+
+    if created or tuple(getattr(consultation, field) for field in VITAL_FIELDS) != before:
+        vitals = vitals_for(consultation, hospital)
+        if vitals is not None:
+            vitals.save()
+
+    if prescriptions is not None:
+        sync_prescriptions(consultation, prescriptions, existing=[] if created else None)
+        # A caller that prefetched the old list must not serialize it
+        getattr(consultation, '_prefetched_objects_cache', {}).pop('prescriptions', None)
+
+    if complete and appointment.status != Appointment.Status.COMPLETED:
+        appointment.status = Appointment.Status.COMPLETED
+        appointment.save(update_fields=['status', 'updated_at'])
+    return consultation
+
+
+@transaction.atomic
+def set_status(appointments, ids, current_status, status):
+    """
+    Move the rows of `appointments` listed in `ids` from `current_status` to
+    `status`. The rows are locked and read first, then the ones found in
+    current_status are moved by a conditional UPDATE. Returns the ids that
+    moved and a {id: status} map of the rows that had already left
+    current_status; ids outside `appointments` appear in neither.
+
+    update() skips save() and its signals, so callers publish whatever
+    events and cache bumps a status change needs.
+    """
+    # of=('self',) keeps the lock off the joined doctor and hospital rows
+    found = appointments.filter(pk__in=ids).select_for_update(of=('self',)).values_list('id', 'status')
+    updated, conflicts = [], {}
+    for pk, row_status in found:
+        if row_status == current_status:
+            updated.append(pk)
+        else:
+            conflicts[pk] = row_status
+    if updated:
+        # The lock is a no-op on SQLite, so re-check the status in the UPDATE;
+        # rows changed since the read are re-read and reported as conflicts
+        moved = Appointment.objects.filter(pk__in=updated, status=current_status).update(status=status, updated_at=timezone.now())
+        if moved < len(updated):
+            missed = dict(Appointment.objects.filter(pk__in=updated).exclude(status=status).values_list('id', 'status'))
+            conflicts.update(missed)
+            updated = [pk for pk in updated if pk not in missed]
+    return updated, conflicts
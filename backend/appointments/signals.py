@@ -0,0 +1,95 @@
+from django.db.models.signals import post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from hospitals.models import Doctor
+from .models import Appointment, Consultation, Tombstone
+
+
+def _appointment_owners(appointment_id):
+    return Appointment.objects.filter(pk=appointment_id).values(
+        'patient_id', 'doctor_id', 'doctor__hospital_id'
+    ).first() or {}
+
+
+# pre_delete rather than post_delete: when an appointment is deleted its
+# consultation goes first, and by post_delete time the appointment row we need
+# for scoping is already gone. Both run inside the delete's transaction, so a
+# failed delete rolls the tombstone back too.
+
+@receiver(pre_delete, sender=Appointment)
+def appointment_tombstone(sender, instance, **kwargs):
+    owners = _appointment_owners(instance.pk)
+    Tombstone.objects.create(
+        kind=Tombstone.Kind.APPOINTMENT,
+        object_id=instance.pk,
+        hospital_id=owners.get('doctor__hospital_id'),
+        doctor_id=instance.doctor_id,
+        patient_id=instance.patient_id,
+    )
+
+
+@receiver(pre_delete, sender=Consultation)
+def consultation_tombstone(sender, instance, **kwargs):
+    owners = _appointment_owners(instance.appointment_id)
+    Tombstone.objects.create(
+        kind=Tombstone.Kind.CONSULTATION,
+        object_id=instance.pk,
+        hospital_id=owners.get('doctor__hospital_id'),
+        doctor_id=owners.get('doctor_id'),
+        patient_id=owners.get('patient_id'),
+    )
+
+
+# Moving a row to another owner is a delete as far as the old owner's client
+# is concerned, and news to the new owner's client, which only asks for rows
+# touched since its watermark. Remember the loaded owners so post_save can tell.
+
+def _moved_away(appointment_ids, **old_owners):
+    """Tombstones for `old_owners`, and a fresh updated_at, on the appointments and their consultations."""
+    consultations = Consultation.objects.filter(appointment_id__in=appointment_ids)
+    Tombstone.objects.bulk_create(
+        [Tombstone(kind=Tombstone.Kind.APPOINTMENT, object_id=pk, **old_owners) for pk in appointment_ids]
+        + [Tombstone(kind=Tombstone.Kind.CONSULTATION, object_id=pk, **old_owners) for pk in consultations.values_list('id', flat=True)]
+    )
+    now = timezone.now()
+    Appointment.objects.filter(pk__in=appointment_ids).update(updated_at=now)
+    consultations.update(updated_at=now)
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_owners(sender, instance, **kwargs):
+    instance._synced_owners = (instance.__dict__.get('doctor_id'), instance.__dict__.get('patient_id'))
+
+
+@receiver(post_save, sender=Appointment)
+def reassigned_appointment_tombstone(sender, instance, created, **kwargs):
+    old_doctor, old_patient = instance._synced_owners
+    instance._synced_owners = (instance.doctor_id, instance.patient_id)
+    if created or (old_doctor, old_patient) == (instance.doctor_id, instance.patient_id):
+        return
+    old_hospital = new_hospital = None
+    if old_doctor != instance.doctor_id:
+        hospitals = dict(Doctor.objects.filter(pk__in=[old_doctor, instance.doctor_id]).values_list('id', 'hospital_id'))
+        old_hospital, new_hospital = hospitals.get(old_doctor), hospitals.get(instance.doctor_id)
+    _moved_away(
+        [instance.pk],
+        hospital_id=old_hospital if old_hospital != new_hospital else None,
+        doctor_id=old_doctor if old_doctor != instance.doctor_id else None,
+        patient_id=old_patient if old_patient != instance.patient_id else None,
+    )
+
+
+@receiver(post_init, sender=Doctor)
+def remember_doctor_hospital(sender, instance, **kwargs):
+    instance._synced_hospital = instance.__dict__.get('hospital_id')
+
+
+@receiver(post_save, sender=Doctor)
+def moved_doctor_tombstones(sender, instance, created, **kwargs):
+    # All of the doctor's appointments now list under the new hospital
+    old_hospital = instance._synced_hospital
+    instance._synced_hospital = instance.hospital_id
+    if created or old_hospital == instance.hospital_id:
+        return
+    _moved_away(list(Appointment.objects.filter(doctor=instance).values_list('id', flat=True)), hospital_id=old_hospital)
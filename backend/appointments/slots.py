@@ -0,0 +1,118 @@
+"""
+Slot availability and conflict-free booking.
+
+Free slots for a doctor over a date range come from the doctor's weekly
+DoctorSchedule rules minus the live bookings, which are fetched with a single
+(doctor, date range) query and bucketed in memory. Double booking is prevented
+by the appointment_unique_active_slot constraint rather than by locking, so
+two racing requests for the same slot cannot both commit.
+"""
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from hospitals.models import DoctorSchedule
+from .models import Appointment
+
+# Longest date range a single availability request may ask for
+MAX_RANGE_DAYS = 31
+
+
+class SlotTaken(Exception):
+    pass
+
+
+def rule_slots(rule):
+    """Start times of the slots one schedule rule produces on its weekday."""
+    step = datetime.timedelta(minutes=rule.slot_minutes or 15)
+    day = datetime.date.min
+    current = datetime.datetime.combine(day, rule.start_time)
+    end = datetime.datetime.combine(day, rule.end_time)
+    times = []
+    while current + step <= end:
+        slot_end = current + step
+        in_break = (
+            rule.break_start and rule.break_end
+            and current.time() < rule.break_end and slot_end.time() > rule.break_start
+        )
+        if not in_break:
+            times.append(current.time())
+        current = slot_end
+    return times
+
+
+def weekly_slots(doctor_id):
+    """{weekday: sorted start times} for a doctor; empty when no rules are set."""
+    week = {}
+    for rule in DoctorSchedule.objects.filter(doctor_id=doctor_id):
+        week.setdefault(rule.weekday, set()).update(rule_slots(rule))
+    return {weekday: sorted(times) for weekday, times in week.items()}
+
+
+def booked_slots(doctor_id, start, end):
+    """{date: set of booked times} from one range query over live appointments."""
+    booked = {}
+    rows = (
+        Appointment.objects
+        .filter(doctor_id=doctor_id, date__range=(start, end))
+        .exclude(status=Appointment.Status.CANCELLED)
+        .values_list('date', 'time')
+    )
+    for date, time in rows:
+        booked.setdefault(date, set()).add(time)
+    return booked
+
+
+def free_slots(doctor_id, start, end, now=None):
+    """
+    {date: [free start times]} for every date in start..end (inclusive).
+    Every date maps to None for a doctor without schedule rules: there are no
+    slots to offer, and any free time can be booked (see is_open).
+    """
+    now = timezone.localtime(now)
+    week = weekly_slots(doctor_id)
+    free = {}
+    date = start
+    if not week:
+        while date <= end:
+            free[date] = None
+            date += datetime.timedelta(days=1)
+        return free
+    booked = booked_slots(doctor_id, start, end)
+    while date <= end:
+        taken = booked.get(date, ())
+        free[date] = [
+            time for time in week.get(date.weekday(), ())
+            if time not in taken and (date, time) > (now.date(), now.time())
+        ]
+        date += datetime.timedelta(days=1)
+    return free
+
+
+def in_schedule(doctor_id, date, time):
+    """
+    Whether `time` starts one of the doctor's slots on `date`. Doctors without
+    schedule rules accept any time, as before the engine existed.
+    """
+    week = weekly_slots(doctor_id)
+    return not week or time in week.get(date.weekday(), ())
+
+
+def is_open(doctor_id, date, time):
+    """Whether a slot can be booked right now: in the schedule and still free."""
+    if not in_schedule(doctor_id, date, time):
+        return False
+    return time not in booked_slots(doctor_id, date, date).get(date, ())
+
+
+def book(patient, doctor_id, date, time, notes=''):
+    """Create a pending appointment, raising SlotTaken if someone got there first."""
+    try:
+        with transaction.atomic():
+            return Appointment.objects.create(
+                patient=patient, doctor_id=doctor_id, date=date, time=time,
+                notes=notes, status=Appointment.Status.PENDING,
+            )
+    except IntegrityError:
+        raise SlotTaken(f"Slot {date} {time} is no longer available")
@@ -1,3 +1,256 @@
-from django.test import TestCase
+import datetime
+import threading
+import time as clock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from hospitals.models import City, Doctor, DoctorSchedule, Hospital
+from . import slots
+from .forms import AppointmentForm
+from .models import Appointment, Prescription
+from .services import save_consultation
+from core.models import Vitals
+
+User = get_user_model()
+
+
+class AppointmentFormTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(name='Pune')
+        cls.verified = cls.make_doctor(city, 'verified', True)
+        cls.unverified = cls.make_doctor(city, 'unverified', False)
+
+    @staticmethod
+    def make_doctor(city, name, is_verified):
+        admin = User.objects.create_user(username=f'{name}-admin', password='pass', role=User.Role.HOSPITAL)
+        hospital = Hospital.objects.create(name=name, city=city, address='Main Road', admin=admin, is_verified=is_verified)
+        user = User.objects.create_user(username=f'{name}-doctor', password='pass', role=User.Role.DOCTOR)
+        return Doctor.objects.create(user=user, hospital=hospital)
+
+    def form(self, doctor):
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        return AppointmentForm({'doctor': doctor.id, 'date': tomorrow, 'time': '10:00'})
+
+    def test_renders_without_loading_doctors(self):
+        with self.assertNumQueries(0):
+            html = str(AppointmentForm()['doctor'])
+        self.assertEqual(html.count('<option'), 1)
+
+    def test_validates_doctor_in_one_query(self):
+        form = AppointmentForm({'doctor': self.verified.id})
+        with self.assertNumQueries(1):
+            form.full_clean()
+        self.assertEqual(form.cleaned_data['doctor'], self.verified)
+        self.assertTrue(self.form(self.verified).is_valid())
+
+    def test_rejects_doctor_of_unverified_hospital(self):
+        form = self.form(self.unverified)
+        self.assertFalse(form.is_valid())
+        self.assertIn('doctor', form.errors)
+
+
+def make_doctor(name='slots'):
+    city = City.objects.create(name='Pune')
+    admin = User.objects.create_user(username=f'{name}-admin', password='pass', role=User.Role.HOSPITAL)
+    hospital = Hospital.objects.create(name=name, city=city, address='Main Road', admin=admin, is_verified=True)
+    user = User.objects.create_user(username=f'{name}-doctor', password='pass', role=User.Role.DOCTOR)
+    return Doctor.objects.create(user=user, hospital=hospital)
+
+
+class SlotEngineTests(TestCase):
+    # A Monday far enough ahead that "now" never trims it
+    monday = datetime.date(2030, 1, 7)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor()
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        DoctorSchedule.objects.create(
+            doctor=cls.doctor, weekday=DoctorSchedule.Weekday.MONDAY,
+            start_time=datetime.time(9), end_time=datetime.time(11), slot_minutes=30,
+            break_start=datetime.time(10), break_end=datetime.time(10, 30),
+        )
+
+    def test_free_slots_skip_breaks_bookings_and_days_off(self):
+        slots.book(self.patient, self.doctor.id, self.monday, datetime.time(9, 30))
+        cancelled = slots.book(self.patient, self.doctor.id, self.monday, datetime.time(9))
+        cancelled.status = Appointment.Status.CANCELLED
+        cancelled.save()
+        with self.assertNumQueries(2):
+            free = slots.free_slots(self.doctor.id, self.monday, self.monday + datetime.timedelta(days=1))
+        self.assertEqual(free, {
+            self.monday: [datetime.time(9), datetime.time(10, 30)],
+            self.monday + datetime.timedelta(days=1): [],
+        })
+
+    def test_form_rejects_taken_and_off_schedule_slots(self):
+        slots.book(self.patient, self.doctor.id, self.monday, datetime.time(9))
+        for time in ('09:00', '09:15', '10:00'):
+            form = AppointmentForm({'doctor': self.doctor.id, 'date': self.monday, 'time': time})
+            self.assertFalse(form.is_valid(), time)
+        self.assertTrue(AppointmentForm({'doctor': self.doctor.id, 'date': self.monday, 'time': '09:30'}).is_valid())
+
+    def test_second_booking_of_a_slot_fails(self):
+        slots.book(self.patient, self.doctor.id, self.monday, datetime.time(9))
+        with self.assertRaises(slots.SlotTaken):
+            slots.book(self.patient, self.doctor.id, self.monday, datetime.time(9))
+
+    def test_unscheduled_doctor_takes_any_free_time(self):
+        doctor = make_doctor('unscheduled')
+        free = slots.free_slots(doctor.id, self.monday, self.monday + datetime.timedelta(days=1))
+        self.assertEqual(free, {self.monday: None, self.monday + datetime.timedelta(days=1): None})
+        self.assertEqual(self.client.get('/ajax/slots/', {'doctor': doctor.id, 'date': self.monday}).json(), None)
+        self.assertEqual(self.client.get('/ajax/slots/', {'doctor': self.doctor.id, 'date': self.monday}).json(), ['09:00', '09:30', '10:30'])
+        self.assertTrue(AppointmentForm({'doctor': doctor.id, 'date': self.monday, 'time': '09:10'}).is_valid())
+
+    def test_api_create_follows_the_schedule(self):
+        client = APIClient()
+        client.force_authenticate(self.patient)
+        body = {'patient': self.patient.id, 'doctor': self.doctor.id, 'date': self.monday.isoformat(), 'time': '10:00'}
+        response = client.post('/api/appointments/', body, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('time', response.data)
+        response = client.post('/api/appointments/', {**body, 'time': '10:30'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_schedule_hours_and_break_are_checked(self):
+        nine, ten, eleven = datetime.time(9), datetime.time(10), datetime.time(11)
+        bad = [
+            {'start_time': eleven, 'end_time': nine},
+            {'start_time': nine, 'end_time': ten, 'break_start': datetime.time(9, 30), 'break_end': eleven},
+            {'start_time': nine, 'end_time': eleven, 'break_start': ten},
+            {'start_time': ten, 'end_time': eleven, 'break_start': nine, 'break_end': datetime.time(10, 30)},
+        ]
+        for fields in bad:
+            rule = DoctorSchedule(doctor=self.doctor, weekday=DoctorSchedule.Weekday.TUESDAY, **fields)
+            with self.assertRaises(ValidationError, msg=fields):
+                rule.full_clean()
+            with self.assertRaises(IntegrityError, msg=fields), transaction.atomic():
+                rule.save()
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    def test_parallel_bookings_of_one_slot_yield_one_appointment(self):
+        doctor = make_doctor()
+        patients = [User.objects.create_user(username=f'racer-{i}', password='pass') for i in range(8)]
+        date, time = datetime.date(2030, 1, 7), datetime.time(9)
+        barrier = threading.Barrier(len(patients))
+        results = []
+
+        def attempt(patient):
+            barrier.wait()
+            try:
+                # SQLite's shared in-memory test database reports a busy table
+                # at once instead of waiting, so back off and try again
+                for _ in range(200):
+                    try:
+                        slots.book(patient, doctor.id, date, time)
+                        results.append('booked')
+                    except slots.SlotTaken:
+                        results.append('taken')
+                    except OperationalError:
+                        clock.sleep(0.01)
+                        continue
+                    break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(patient,)) for patient in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), ['booked'] + ['taken'] * (len(patients) - 1))
+        self.assertEqual(Appointment.objects.filter(doctor=doctor, date=date, time=time).count(), 1)
+
+
+class DoubleBookingMigrationTests(TransactionTestCase):
+    before = [('appointments', '0005_updated_at_tombstone')]
+    after = [('appointments', '0006_appointment_unique_active_slot')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.before)
+        self.addCleanup(self.migrate_to_latest)
+        apps = self.executor.loader.project_state(self.before).apps
+        self.Appointment = apps.get_model('appointments', 'Appointment')
+        doctor = make_doctor()
+        self.patient = User.objects.create_user(username='patient', password='pass')
+        self.slot = {'doctor_id': doctor.id, 'date': datetime.date(2030, 1, 7), 'time': datetime.time(9)}
+
+    def book(self, status):
+        return self.Appointment.objects.create(patient_id=self.patient.id, status=status, **self.slot).id
+
+    def migrate(self, targets=None):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets or self.after)
+
+    def migrate_to_latest(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_keeps_the_most_progressed_booking(self):
+        pending, confirmed, completed = self.book('PENDING'), self.book('CONFIRMED'), self.book('COMPLETED')
+        self.migrate()
+        statuses = dict(Appointment.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {pending: 'CANCELLED', confirmed: 'CANCELLED', completed: 'COMPLETED'})
+
+    def test_refuses_to_cancel_completed_bookings(self):
+        first, second, pending = self.book('COMPLETED'), self.book('COMPLETED'), self.book('PENDING')
+        with self.assertRaisesMessage(RuntimeError, f'{first}, {second}'):
+            self.migrate()
+        self.assertEqual(self.Appointment.objects.get(pk=pending).status, 'PENDING')
+        # Resolved by hand, the migration goes through
+        self.Appointment.objects.filter(pk=second).update(status='CANCELLED')
+        self.migrate()
+        self.assertEqual(Appointment.objects.get(pk=pending).status, 'CANCELLED')
+
+
+class ConsultationServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor()
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+
+    def setUp(self):
+        self.apt = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=datetime.date(2030, 1, 7), time=datetime.time(9))
+
+    def medicines(self, count, dosage='1-0-1'):
+        return [{'medicine_name': f'Med {i}', 'dosage': dosage, 'duration': '5 days', 'instructions': ''} for i in range(count)]
+
+    def test_query_count_does_not_grow_with_medicines(self):
+        for count in (1, 20):
+            apt = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=datetime.date(2030, 1, 8), time=datetime.time(10, count))
+            # savepoint, consultation lookup, insert, vitals, prescriptions, appointment, release
+            with self.assertNumQueries(7):
+                save_consultation(apt, {'bp': '120/80'}, self.medicines(count), complete=True)
+        self.assertEqual(Prescription.objects.count(), 21)
+
+    def test_prescriptions_are_diffed(self):
+        consultation = save_consultation(self.apt, {}, self.medicines(3))
+        kept = dict(consultation.prescriptions.values_list('medicine_name', 'id'))
+        items = self.medicines(2) + [{'medicine_name': 'New', 'dosage': '0-0-1', 'duration': '3 days', 'instructions': ''}]
+        save_consultation(self.apt, {}, items, consultation=consultation)
+        after = dict(consultation.prescriptions.values_list('medicine_name', 'id'))
+        self.assertEqual(after['Med 0'], kept['Med 0'])
+        self.assertEqual(after['Med 1'], kept['Med 1'])
+        self.assertEqual(after['New'], kept['Med 2'])  # rewritten in place
+        save_consultation(self.apt, {}, [], consultation=consultation)
+        self.assertFalse(consultation.prescriptions.exists())
+
+    def test_vitals_are_recorded_when_they_change(self):
+        consultation = save_consultation(self.apt, {'bp': '120/80', 'pulse': '72'}, [])
+        save_consultation(self.apt, {'bp': '120/80', 'pulse': '72', 'advice': 'Rest'}, [], consultation=consultation)
+        self.assertEqual(Vitals.objects.filter(patient=self.patient).count(), 1)
+        save_consultation(self.apt, {'bp': '130/85', 'pulse': 'fast'}, [], consultation=consultation, complete=True)
+        latest = Vitals.objects.filter(patient=self.patient).latest('id')
+        self.assertEqual((latest.bp_systolic, latest.bp_diastolic, latest.heart_rate), (130, 85, 0))
+        self.apt.refresh_from_db()
+        self.assertEqual(self.apt.status, Appointment.Status.COMPLETED)
+        self.assertIsNotNone(consultation.completed_at)
@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from .forms import AppointmentForm
+from . import slots
 from django.contrib import messages
 from accounts.models import User
 
@@ -13,11 +14,13 @@ def book_appointment(request):
         form = AppointmentForm(request.POST)
         if form.is_valid():
             if request.user.is_authenticated:
-                apt = form.save(commit=False)
-                apt.patient = request.user
-                apt.save()
-                messages.success(request, "Appointment Booked Successfully")
-                return redirect('patient_dashboard')
+                try:
+                    slots.book(request.user, form.cleaned_data['doctor'].id, form.cleaned_data['date'], form.cleaned_data['time'], form.cleaned_data['notes'])
+                except slots.SlotTaken:
+                    form.add_error(None, "This time slot was just booked by someone else. Please pick another.")
+                else:
+                    messages.success(request, "Appointment Booked Successfully")
+                    return redirect('patient_dashboard')
             else:
                 # Guest Flow: Store details in session and redirect to register
                 booking_data = {
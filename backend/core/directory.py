@@ -0,0 +1,79 @@
+"""
+Cached state -> city -> hospital -> doctor directory behind the booking cascade.
+
+Every entry is stored as ready-to-send JSON bytes plus its ETag under a key
+that includes a global directory version. Saving or deleting a City, Hospital
+or Doctor (or renaming a doctor's user) bumps the version, which orphans every
+old entry at once instead of tracking which lists a change touched.
+
+The version lives in the Django cache, so multi-process deployments need a
+shared backend (Redis/Memcached) for invalidation to reach every worker.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Case, Value, When
+from django.db.models.functions import Concat
+
+from hospitals.models import City, Doctor, Hospital
+
+VERSION_KEY = 'directory:version'
+ENTRY_TIMEOUT = 60 * 60
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock rather than 1 so a key lost to eviction can
+        # never come back at a version whose old entries are still cached
+        cache.add(VERSION_KEY, int(time.time()), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        current_version()
+
+
+def _cities(state):
+    return list(City.objects.filter(state=state).values('id', 'name'))
+
+
+def _hospitals(city_id):
+    return list(Hospital.objects.filter(city_id=city_id, is_verified=True).values('id', 'name'))
+
+
+def _doctors(hospital_id):
+    doctors = Doctor.objects.filter(hospital_id=hospital_id).annotate(
+        name=Case(
+            When(user__first_name='', then=Concat(Value('Dr. '), 'user__username')),
+            default=Concat(Value('Dr. '), 'user__first_name', Value(' '), 'user__last_name'),
+        ),
+    )
+    return list(doctors.values('id', 'name', 'specialization'))
+
+
+BUILDERS = {
+    'cities': _cities,
+    'hospitals': _hospitals,
+    'doctors': _doctors,
+}
+
+
+def lookup(kind, param):
+    """Return (etag, json_bytes) for one dropdown list, building it on a miss."""
+    # Hash the parameter so arbitrary query strings stay valid memcached keys
+    digest = hashlib.md5(param.encode()).hexdigest()
+    key = f'directory:{current_version()}:{kind}:{digest}'
+    entry = cache.get(key)
+    if entry is None:
+        body = json.dumps(BUILDERS[kind](param), cls=DjangoJSONEncoder).encode()
+        entry = (f'"{hashlib.md5(body).hexdigest()}"', body)
+        cache.set(key, entry, ENTRY_TIMEOUT)
+    return entry
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.models import PlatformCounter
+
+
+class Command(BaseCommand):
+    help = "Recount the admin dashboard totals and fix any drift in PlatformCounter"
+
+    def handle(self, *args, **options):
+        drift = PlatformCounter.reconcile()
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("All counters were accurate."))
+            return
+        for name, (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f"{name}: {stored} -> {actual}")
+        self.stdout.write(self.style.WARNING(f"Fixed {len(drift)} counter(s)."))
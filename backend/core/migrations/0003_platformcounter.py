@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:29
+
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Hospital = apps.get_model('hospitals', 'Hospital')
+    PlatformCounter = apps.get_model('core', 'PlatformCounter')
+    counts = {
+        'hospitals': Hospital.objects.count(),
+        'unverified_hospitals': Hospital.objects.filter(is_verified=False).count(),
+        'doctors': User.objects.filter(role='DOCTOR').count(),
+        'patients': User.objects.filter(role='PATIENT').count(),
+        'orphaned_hospital_users': User.objects.filter(role='HOSPITAL', hospital_managed__isnull=True).count(),
+    }
+    PlatformCounter.objects.bulk_create([PlatformCounter(name=name, value=value) for name, value in counts.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_vitals_hospital'),
+        ('accounts', '0002_user_address_user_blood_group_user_dob_and_more'),
+        ('hospitals', '0007_alter_doctor_specialization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
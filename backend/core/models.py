@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.conf import settings
 
 class Vitals(models.Model):
@@ -17,3 +18,55 @@ class Vitals(models.Model):
 
     def __str__(self):
         return f"Vitals for {self.patient} on {self.date.date()}"
+
+class PlatformCounter(models.Model):
+    """
+    Running platform totals for the admin dashboard. Signals in core/signals.py
+    keep them current inside the same transaction as the change; bulk writes
+    that skip signals are corrected by `manage.py reconcile_counters`.
+    """
+    HOSPITALS = 'hospitals'
+    UNVERIFIED_HOSPITALS = 'unverified_hospitals'
+    DOCTORS = 'doctors'
+    PATIENTS = 'patients'
+    ORPHANED_HOSPITAL_USERS = 'orphaned_hospital_users'
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+    @classmethod
+    def actual_counts(cls):
+        from accounts.models import User
+        from hospitals.models import Hospital
+        return {
+            cls.HOSPITALS: Hospital.objects.count(),
+            cls.UNVERIFIED_HOSPITALS: Hospital.objects.filter(is_verified=False).count(),
+            cls.DOCTORS: User.objects.filter(role=User.Role.DOCTOR).count(),
+            cls.PATIENTS: User.objects.filter(role=User.Role.PATIENT).count(),
+            cls.ORPHANED_HOSPITAL_USERS: User.objects.filter(role=User.Role.HOSPITAL, hospital_managed__isnull=True).count(),
+        }
+
+    @classmethod
+    def bump(cls, name, delta=1):
+        if not cls.objects.filter(name=name).update(value=F('value') + delta):
+            # First use: seed from the tables, which already include this change
+            cls.objects.update_or_create(name=name, defaults={'value': cls.actual_counts()[name]})
+
+    @classmethod
+    def snapshot(cls):
+        values = dict(cls.objects.values_list('name', 'value'))
+        return {name: values.get(name, 0) for name in (cls.HOSPITALS, cls.UNVERIFIED_HOSPITALS, cls.DOCTORS, cls.PATIENTS, cls.ORPHANED_HOSPITAL_USERS)}
+
+    @classmethod
+    def reconcile(cls):
+        """Overwrite every counter with a fresh count. Returns {name: (stored, actual)} for those that drifted."""
+        stored = cls.snapshot()
+        drift = {}
+        for name, actual in cls.actual_counts().items():
+            if stored[name] != actual:
+                drift[name] = (stored[name], actual)
+            cls.objects.update_or_create(name=name, defaults={'value': actual})
+        return drift
@@ -0,0 +1,62 @@
+import datetime
+
+from django.db.models import Q
+
+
+def keyset_q(fields, values):
+    """
+    Build the "row comes after this key" filter for keyset pagination.
+
+    `fields` is an ordering such as ('date', 'time', 'id') where a leading '-'
+    means descending, and `values` is the key of the last row already shown.
+    The result is the usual expanded tuple comparison:
+    (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+    which the database can answer from an index on the same columns.
+    """
+    q = Q()
+    for i, field in enumerate(fields):
+        name = field.lstrip('-')
+        op = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{f'{name}__{op}': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            clause &= Q(**{prev_field.lstrip('-'): prev_value})
+        q |= clause
+    return q
+
+
+def keyset_page(queryset, ordering, after, size):
+    """
+    One page of `queryset` in `ordering`, starting after the key `after`
+    (None for the first page). Returns (rows, has_more); one extra row is
+    fetched instead of running a COUNT(*).
+    """
+    if after is not None:
+        queryset = queryset.filter(keyset_q(ordering, after))
+    rows = list(queryset.order_by(*ordering)[:size + 1])
+    return rows[:size], len(rows) > size
+
+
+def appointment_key(apt):
+    """Keyset position of an appointment in (date, time, id) order, as text."""
+    return f"{apt.date.isoformat()}|{apt.time.isoformat()}|{apt.id}"
+
+
+def parse_appointment_key(raw):
+    """Inverse of appointment_key(). Raises ValueError on malformed input."""
+    date_str, time_str, pk = raw.split('|')
+    return (
+        datetime.date.fromisoformat(date_str),
+        datetime.time.fromisoformat(time_str),
+        int(pk),
+    )
+
+
+def joined_key(user, pk=None):
+    """Keyset position in (date_joined, id) order; `pk` overrides the id for profiles keyed by their user."""
+    return f"{user.date_joined.isoformat()}|{pk if pk is not None else user.id}"
+
+
+def parse_joined_key(raw):
+    """Inverse of joined_key(). Raises ValueError on malformed input."""
+    joined, pk = raw.split('|')
+    return (datetime.datetime.fromisoformat(joined), int(pk))
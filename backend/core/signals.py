@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from hospitals.models import City, Doctor, Hospital
+
+from . import directory
+from .models import PlatformCounter
+
+ROLE_COUNTERS = {
+    User.Role.DOCTOR: PlatformCounter.DOCTORS,
+    User.Role.PATIENT: PlatformCounter.PATIENTS,
+}
+
+
+def _has_hospital(user_id):
+    return Hospital.objects.filter(admin_id=user_id).exists()
+
+
+def _count_role(user, role, delta):
+    if role in ROLE_COUNTERS:
+        PlatformCounter.bump(ROLE_COUNTERS[role], delta)
+    elif role == User.Role.HOSPITAL and not _has_hospital(user.pk):
+        PlatformCounter.bump(PlatformCounter.ORPHANED_HOSPITAL_USERS, delta)
+
+
+# Remember the loaded values so post_save can tell what changed.
+# Read from __dict__ so a deferred field is not fetched just for this.
+
+@receiver(post_init, sender=User)
+def remember_user_role(sender, instance, **kwargs):
+    instance._counted_role = instance.__dict__.get('role')
+    instance._directory_name = _directory_name(instance)
+
+
+@receiver(post_init, sender=Hospital)
+def remember_hospital_verified(sender, instance, **kwargs):
+    instance._counted_verified = instance.__dict__.get('is_verified')
+
+
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, **kwargs):
+    if created:
+        _count_role(instance, instance.role, 1)
+    elif instance._counted_role is not None and instance.role != instance._counted_role:
+        _count_role(instance, instance._counted_role, -1)
+        _count_role(instance, instance.role, 1)
+    instance._counted_role = instance.role
+
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    # A managed hospital is deleted before its admin, so HOSPITAL users always
+    # leave through the orphaned counter here (hospital post_delete added them)
+    _count_role(instance, instance.role, -1)
+
+
+@receiver(post_save, sender=Hospital)
+def count_hospital(sender, instance, created, **kwargs):
+    if created:
+        PlatformCounter.bump(PlatformCounter.HOSPITALS)
+        if not instance.is_verified:
+            PlatformCounter.bump(PlatformCounter.UNVERIFIED_HOSPITALS)
+        if instance.admin.role == User.Role.HOSPITAL:
+            PlatformCounter.bump(PlatformCounter.ORPHANED_HOSPITAL_USERS, -1)
+    elif instance._counted_verified is not None and instance.is_verified != instance._counted_verified:
+        PlatformCounter.bump(PlatformCounter.UNVERIFIED_HOSPITALS, -1 if instance.is_verified else 1)
+    instance._counted_verified = instance.is_verified
+
+
+@receiver(post_delete, sender=Hospital)
+def uncount_hospital(sender, instance, **kwargs):
+    PlatformCounter.bump(PlatformCounter.HOSPITALS, -1)
+    if not instance.is_verified:
+        PlatformCounter.bump(PlatformCounter.UNVERIFIED_HOSPITALS, -1)
+    if User.objects.filter(pk=instance.admin_id, role=User.Role.HOSPITAL).exists():
+        PlatformCounter.bump(PlatformCounter.ORPHANED_HOSPITAL_USERS)
+
+
+# Booking directory: any change to the cascade orphans every cached list.
+# Bump after commit so a reader cannot re-cache the old rows under the new version.
+
+DIRECTORY_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def _directory_name(user):
+    return tuple(user.__dict__.get(field) for field in DIRECTORY_NAME_FIELDS)
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=Hospital)
+@receiver(post_delete, sender=Hospital)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def invalidate_directory(sender, **kwargs):
+    transaction.on_commit(directory.bump_version)
+
+
+@receiver(post_save, sender=User)
+def invalidate_directory_names(sender, instance, created, **kwargs):
+    # Logins save last_login on every user; only a doctor's renamed user shows in the lists
+    name = _directory_name(instance)
+    if not created and name != instance._directory_name and instance.role == User.Role.DOCTOR:
+        transaction.on_commit(directory.bump_version)
+    instance._directory_name = name
@@ -1,3 +1,256 @@
+import datetime
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from hospitals.models import City, Hospital, Doctor, Staff, Bed
+from appointments.models import Appointment, Consultation
+from .models import PlatformCounter
+from .views import ADMIN_PAGE_SIZE, DASHBOARD_WINDOW
+
+User = get_user_model()
+
+
+class HospitalDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(name='Pune')
+        cls.admin = User.objects.create_user(username='hospital', password='pass', role=User.Role.HOSPITAL)
+        cls.hospital = Hospital.objects.create(name='City Care', city=city, address='Main Road', admin=cls.admin, is_verified=True)
+        doctor_user = User.objects.create_user(username='doctor', password='pass', first_name='Asha', last_name='Rao', role=User.Role.DOCTOR)
+        cls.doctor = Doctor.objects.create(user=doctor_user, hospital=cls.hospital)
+        Staff.objects.create(hospital=cls.hospital, name='Nurse Joy', role=Staff.Role.NURSE, phone='123')
+        Bed.objects.create(hospital=cls.hospital, ward='ICU', number='1')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_appointments(self, count):
+        offset = User.objects.count()
+        patients = User.objects.bulk_create([
+            User(username=f'patient-{offset + i}', first_name='Pat', last_name=str(i), role=User.Role.PATIENT) for i in range(count)
+        ])
+        # Continue after earlier batches so no doctor slot is booked twice
+        start = datetime.date(2030, 1, 1) + datetime.timedelta(days=Appointment.objects.count())
+        statuses = Appointment.Status.values
+        Appointment.objects.bulk_create([
+            Appointment(patient=patient, doctor=self.doctor, date=start + datetime.timedelta(days=i), time=datetime.time(9, 0), status=statuses[i % len(statuses)])
+            for i, patient in enumerate(patients)
+        ])
+
+    def dashboard_queries(self):
+        # Run once to warm the session/content-type caches, then measure
+        self.client.get(reverse('hospital_dashboard'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('hospital_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_does_not_grow_with_appointments(self):
+        self.add_appointments(4)
+        small, _ = self.dashboard_queries()
+        self.add_appointments(200)
+        large, _ = self.dashboard_queries()
+        self.assertEqual(small, large)
+        # session, user with hospital, status counts, recent rows, doctors, staff, beds
+        self.assertEqual(large, 7)
+
+    def test_tabs_are_windowed_and_counted(self):
+        self.add_appointments(DASHBOARD_WINDOW * 4 + 8)
+        _, response = self.dashboard_queries()
+        tabs = response.context['tabs']
+        self.assertEqual(response.context['appointment_count'], DASHBOARD_WINDOW * 4 + 8)
+        self.assertEqual(tabs['PENDING']['count'], DASHBOARD_WINDOW + 2)
+        self.assertEqual(len(tabs['PENDING']['rows']), DASHBOARD_WINDOW)
+        self.assertIn('cursor', tabs['PENDING'])
+        rows = tabs['PENDING']['rows']
+        self.assertEqual([a.date for a in rows], sorted(a.date for a in rows))
+        rows = tabs['COMPLETED']['rows']
+        self.assertEqual([a.date for a in rows], sorted((a.date for a in rows), reverse=True))
+
+    def test_upcoming_tabs_start_from_today(self):
+        today = timezone.localdate()
+        patient = User.objects.create_user(username='early', password='pass', role=User.Role.PATIENT)
+        past = Appointment.objects.create(patient=patient, doctor=self.doctor, date=today - datetime.timedelta(days=3), time=datetime.time(9, 0))
+        soon = Appointment.objects.create(patient=patient, doctor=self.doctor, date=today, time=datetime.time(9, 0))
+        self.add_appointments(DASHBOARD_WINDOW * 8)
+        _, response = self.dashboard_queries()
+        tabs = response.context['tabs']
+        self.assertEqual(tabs['PENDING']['rows'][0], soon)
+        self.assertNotIn(past, tabs['PENDING']['rows'])
+        self.assertEqual(tabs['PENDING']['count'], DASHBOARD_WINDOW * 2 + 1)
+        self.assertEqual(response.context['recent_appointments'][0], soon)
+        # Later pages continue forward and never reach back before today
+        seen, cursor = list(tabs['PENDING']['rows']), tabs['PENDING']['cursor']
+        while cursor:
+            more = self.client.get(reverse('hospital_appointments_more', args=['PENDING']), {'after': cursor})
+            seen += more.context['appointments']
+            cursor = more.get('X-Next-Cursor')
+        self.assertEqual(len(seen), DASHBOARD_WINDOW * 2 + 1)
+        self.assertEqual([a.date for a in seen], sorted(a.date for a in seen))
+        self.assertNotIn(past, seen)
+
+    def test_load_more_returns_the_rest_of_a_tab(self):
+        self.add_appointments(DASHBOARD_WINDOW * 4 + 8)
+        _, response = self.dashboard_queries()
+        cursor = response.context['tabs']['PENDING']['cursor']
+        more = self.client.get(reverse('hospital_appointments_more', args=['PENDING']), {'after': cursor})
+        self.assertEqual(more.status_code, 200)
+        self.assertEqual(len(more.context['appointments']), 2)
+        self.assertNotIn('X-Next-Cursor', more)
+
+    def test_opening_a_consultation_does_not_create_it(self):
+        patient = User.objects.create_user(username='visitor', password='pass', role=User.Role.PATIENT)
+        apt = Appointment.objects.create(patient=patient, doctor=self.doctor, date=datetime.date(2030, 1, 1), time=datetime.time(9, 0))
+        url = reverse('consultation_view', args=[apt.id])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertFalse(Consultation.objects.filter(appointment=apt).exists())
+        form = dict.fromkeys(('nurse_name', 'bp', 'pulse', 'temperature', 'weight', 'diagnosis', 'advice'), '')
+        response = self.client.post(url, {**form, 'symptoms': 'Cough', 'med_name[]': ['Syrup'], 'dosage[]': ['5ml']})
+        self.assertEqual(response.context['consultation'].symptoms, 'Cough')
+        self.assertEqual(Consultation.objects.get(appointment=apt).prescriptions.get().medicine_name, 'Syrup')
+
+    def test_load_more_rejects_bad_input(self):
+        url = reverse('hospital_appointments_more', args=['PENDING'])
+        self.assertEqual(self.client.get(url, {'after': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('hospital_appointments_more', args=['UNKNOWN'])).status_code, 404)
+
+
+class PlatformCounterTests(TestCase):
+    def assertCountersAccurate(self):
+        self.assertEqual(PlatformCounter.snapshot(), PlatformCounter.actual_counts())
+
+    def test_signals_track_users_and_hospitals(self):
+        city = City.objects.create(name='Pune')
+        User.objects.create_user(username='p1', password='pass', role=User.Role.PATIENT)
+        doctor = User.objects.create_user(username='d1', password='pass', role=User.Role.DOCTOR)
+        admin = User.objects.create_user(username='h1', password='pass', role=User.Role.HOSPITAL)
+        self.assertEqual(PlatformCounter.snapshot()[PlatformCounter.ORPHANED_HOSPITAL_USERS], 1)
+        self.assertCountersAccurate()
+
+        hospital = Hospital.objects.create(name='City Care', city=city, address='Main Road', admin=admin)
+        self.assertCountersAccurate()
+        hospital.is_verified = True
+        hospital.save()
+        self.assertCountersAccurate()
+
+        doctor.role = User.Role.PATIENT
+        doctor.save()
+        self.assertCountersAccurate()
+
+        hospital.delete()
+        self.assertEqual(PlatformCounter.snapshot()[PlatformCounter.ORPHANED_HOSPITAL_USERS], 1)
+        self.assertCountersAccurate()
+
+        Hospital.objects.create(name='Sunrise', city=city, address='Hill Road', admin=admin)
+        admin.delete()
+        self.assertCountersAccurate()
+
+    def test_reconcile_command_fixes_drift(self):
+        User.objects.bulk_create([User(username=f'p{i}', role=User.Role.PATIENT) for i in range(3)])
+        self.assertEqual(PlatformCounter.snapshot()[PlatformCounter.PATIENTS], 0)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('patients: 0 -> 3', out.getvalue())
+        self.assertCountersAccurate()
+
+    def test_admin_dashboard_reads_counters(self):
+        staff = User.objects.create_user(username='root', password='pass', is_staff=True)
+        PlatformCounter.objects.filter(name=PlatformCounter.PATIENTS).update(value=1234)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['total_patients'], 1234)
+
+
+class AdminListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='root', password='pass', is_staff=True, role=User.Role.ADMIN)
+        User.objects.bulk_create([
+            User(username=f'patient-{i:03}', email=f'p{i}@example.com', role=User.Role.PATIENT) for i in range(ADMIN_PAGE_SIZE * 2 + 5)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_patients_are_paged_by_cursor_without_gaps(self):
+        seen, params = [], {}
+        while True:
+            response = self.client.get(reverse('admin_patients'), params)
+            seen += [p.id for p in response.context['patients']]
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+            params = {'after': cursor}
+        self.assertEqual(len(seen), ADMIN_PAGE_SIZE * 2 + 5)
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_search_is_a_prefix_match(self):
+        response = self.client.get(reverse('admin_patients'), {'q': 'PATIENT-10'})
+        self.assertEqual([p.username for p in response.context['patients']], [f'patient-{i}' for i in range(ADMIN_PAGE_SIZE * 2 + 4, 99, -1)])
+        response = self.client.get(reverse('admin_patients'), {'q': '10'})
+        self.assertEqual(list(response.context['patients']), [])
+
+    def search_plan(self, url_name):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse(url_name), {'q': 'Pat'})
+        sql = next(q['sql'] for q in ctx.captured_queries if 'LIKE' in q['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    def test_search_is_served_from_the_nocase_indexes(self):
+        plan = self.search_plan('admin_doctors')
+        for index in ('user_username_nocase_idx', 'user_first_name_nocase_idx', 'user_last_name_nocase_idx',
+                      'user_email_nocase_idx', 'user_phone_nocase_idx', 'hospital_name_nocase_idx'):
+            self.assertIn(index, plan)
+        self.assertIn('user_username_nocase_idx', self.search_plan('admin_hospitals'))
+
+
+class BookingDirectoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.city = City.objects.create(name='Pune', state='Maharashtra')
+        admin = User.objects.create_user(username='hospital', password='pass', role=User.Role.HOSPITAL)
+        cls.hospital = Hospital.objects.create(name='City Care', city=cls.city, address='Main Road', admin=admin, is_verified=True)
+        cls.doctor_user = User.objects.create_user(username='doctor', password='pass', first_name='Asha', last_name='Rao', role=User.Role.DOCTOR)
+        cls.doctor = Doctor.objects.create(user=cls.doctor_user, hospital=cls.hospital, specialization='Dentist')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lists_are_served_from_cache_with_etags(self):
+        url = reverse('ajax_doctors')
+        response = self.client.get(url, {'hospital': self.hospital.id})
+        self.assertEqual(response.json(), [{'id': self.doctor.id, 'name': 'Dr. Asha Rao', 'specialization': 'Dentist'}])
+        self.assertIn('max-age', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            again = self.client.get(url, {'hospital': self.hospital.id}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_changes_invalidate_the_directory(self):
+        url = reverse('ajax_hospitals')
+        self.assertEqual(len(self.client.get(url, {'city': self.city.id}).json()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hospital.is_verified = False
+            self.hospital.save()
+        self.assertEqual(self.client.get(url, {'city': self.city.id}).json(), [])
+
+        url = reverse('ajax_doctors')
+        etag = self.client.get(url, {'hospital': self.hospital.id})['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor_user.first_name = 'Anita'
+            self.doctor_user.save()
+        response = self.client.get(url, {'hospital': self.hospital.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['name'], 'Dr. Anita Rao')
 
-# Create your tests here.
+    def test_non_numeric_ids_return_an_empty_list(self):
+        self.assertEqual(self.client.get(reverse('ajax_hospitals'), {'city': 'abc'}).json(), [])
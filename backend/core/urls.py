@@ -26,9 +26,11 @@ urlpatterns = [
     path('dashboard/hospital/apt/<int:apt_id>/status/', views.update_apt_status, name='update_apt_status'),
     path('dashboard/hospital/consultation/<int:apt_id>/', views.consultation_view, name='consultation_view'),
     path('dashboard/hospital/appointment/<int:apt_id>/details/', views.appointment_detail_view, name='appointment_detail'),
+    path('dashboard/hospital/appointments/<str:status>/', views.hospital_appointments_more, name='hospital_appointments_more'),
     
     # AJAX
     path('ajax/cities/', views.get_cities, name='ajax_cities'),
     path('ajax/hospitals/', views.get_hospitals, name='ajax_hospitals'),
     path('ajax/doctors/', views.get_doctors, name='ajax_doctors'),
+    path('ajax/slots/', views.get_slots, name='ajax_slots'),
 ]
@@ -2,6 +2,10 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse, JsonResponse
 from django.contrib.auth import get_user_model
+from django.db.models import Case, Count, F, Q, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from .pagination import appointment_key, joined_key, keyset_page, parse_appointment_key, parse_joined_key
 
 User = get_user_model()
 
@@ -31,6 +35,19 @@ def patient_dashboard(request):
     appointments = Appointment.objects.filter(patient=request.user).select_related('doctor', 'doctor__hospital', 'doctor__hospital__city').order_by('date', 'time')
     return render(request, 'dashboard/patient_dashboard.html', {'appointments': appointments})
 
+# Rows shown per appointment tab before "Load more"
+DASHBOARD_WINDOW = 20
+# Upcoming tabs read forward from today; history tabs read back from the latest
+UPCOMING_STATUSES = (Appointment.Status.PENDING, Appointment.Status.CONFIRMED)
+UPCOMING_ORDER = ('date', 'time', 'id')
+HISTORY_ORDER = ('-date', '-time', '-id')
+
+def dashboard_tab(appointments, status):
+    # (queryset, ordering) behind one appointment tab
+    if status in UPCOMING_STATUSES:
+        return appointments.filter(status=status, date__gte=timezone.localdate()), UPCOMING_ORDER
+    return appointments.filter(status=status), HISTORY_ORDER
+
 @login_required
 def hospital_dashboard(request):
     # Check if user is hospital admin
@@ -42,61 +59,112 @@ def hospital_dashboard(request):
     if not hospital.is_verified:
         return render(request, 'dashboard/hospital_verification_pending.html', {'hospital': hospital})
         
-    doctors = Doctor.objects.filter(hospital=hospital)
-    # appointments = Appointment.objects.filter(doctor__hospital=hospital).order_by('date', 'time')
-    
-    # Group Appointments
-    all_appointments = Appointment.objects.filter(doctor__hospital=hospital).order_by('date', 'time')
-    pending_appointments = all_appointments.filter(status=Appointment.Status.PENDING)
-    confirmed_appointments = all_appointments.filter(status=Appointment.Status.CONFIRMED)
-    completed_appointments = all_appointments.filter(status=Appointment.Status.COMPLETED)
-    cancelled_appointments = all_appointments.filter(status=Appointment.Status.CANCELLED)
+    doctors = list(Doctor.objects.filter(hospital=hospital).select_related('user'))
+    appointments = Appointment.objects.filter(doctor__hospital=hospital)
+    
+    # Only today's and later bookings are listed under the upcoming tabs
+    shown = Q(date__gte=timezone.localdate()) | ~Q(status__in=UPCOMING_STATUSES)
+    
+    # Per-status totals in one pass over the hospital's appointments
+    counts = appointments.aggregate(
+        total=Count('id'),
+        **{status: Count('id', filter=Q(status=status) & shown) for status in Appointment.Status.values}
+    )
+    
+    # The first rows of every tab in one query, split up in Python. Each
+    # partition is ranked by its own tab's order; the key that does not apply
+    # to a status is NULL there and so does not affect its ranking.
+    upcoming = Q(status__in=UPCOMING_STATUSES)
+    rank_order = []
+    for field in UPCOMING_ORDER:
+        rank_order.append(Case(When(upcoming, then=F(field))).asc())
+        rank_order.append(Case(When(~upcoming, then=F(field))).desc())
+    recent = list(
+        appointments.filter(shown).annotate(
+            status_rank=Window(RowNumber(), partition_by=[F('status')], order_by=rank_order)
+        ).filter(status_rank__lte=DASHBOARD_WINDOW).select_related('patient', 'doctor__user').order_by('status', 'status_rank')
+    )
+    tabs = {status: {'rows': [], 'count': counts[status]} for status in Appointment.Status.values}
+    for apt in recent:
+        tabs[apt.status]['rows'].append(apt)
+    for tab in tabs.values():
+        if tab['count'] > len(tab['rows']):
+            tab['cursor'] = appointment_key(tab['rows'][-1])
+    
+    # The overview lists the next bookings still to be seen
+    next_up = sorted(
+        (apt for status in UPCOMING_STATUSES for apt in tabs[status]['rows']),
+        key=lambda apt: (apt.date, apt.time, apt.id)
+    )
     
     from hospitals.models import Staff, Bed
-    staff = Staff.objects.filter(hospital=hospital)
-    beds = Bed.objects.filter(hospital=hospital)
+    staff = list(Staff.objects.filter(hospital=hospital))
+    beds = list(Bed.objects.filter(hospital=hospital))
     
     return render(request, 'dashboard/hospital_dashboard.html', {
         'hospital': hospital,
         'doctors': doctors,
-        'appointments': all_appointments, # Keep for overview stats
-        'pending_appointments': pending_appointments,
-        'confirmed_appointments': confirmed_appointments,
-        'completed_appointments': completed_appointments,
-        'cancelled_appointments': cancelled_appointments,
+        'appointment_count': counts['total'],
+        'recent_appointments': next_up[:DASHBOARD_WINDOW], # Keep for overview stats
+        'tabs': tabs,
         'staff': staff,
         'beds': beds
     })
 
-from .models import Vitals
+@login_required
+def hospital_appointments_more(request, status):
+    # "Load more" for one appointment tab of the hospital dashboard; returns table rows
+    if not hasattr(request.user, 'hospital_managed'): return HttpResponse(status=403)
+    if status not in Appointment.Status.values: return HttpResponse(status=404)
+    
+    try:
+        after = parse_appointment_key(request.GET.get('after', ''))
+    except ValueError:
+        return HttpResponse(status=400)
+    
+    queryset, ordering = dashboard_tab(Appointment.objects.filter(doctor__hospital=request.user.hospital_managed), status)
+    rows, has_more = keyset_page(queryset.select_related('patient', 'doctor__user'), ordering, after, DASHBOARD_WINDOW)
+    response = render(request, 'dashboard/_appointment_rows.html', {'appointments': rows, 'status': status})
+    if has_more:
+        response['X-Next-Cursor'] = appointment_key(rows[-1])
+    return response
+
+from .models import Vitals, PlatformCounter
 from .forms import VitalsForm
 from hospitals.forms import HospitalForm
 from hospitals.models import Hospital
 from accounts.models import User
 from django.contrib import messages
 
+# Rows listed in each admin dashboard panel; the totals come from PlatformCounter
+ADMIN_PANEL_LIMIT = 10
+
 @login_required
 def admin_dashboard(request):
     if not request.user.is_staff:
         return redirect('index')
     
-    total_hospitals = Hospital.objects.count()
-    total_doctors = User.objects.filter(role=User.Role.DOCTOR).count()
-    total_patients = User.objects.filter(role=User.Role.PATIENT).count()
+    counters = PlatformCounter.snapshot()
     
     recent_users = User.objects.order_by('-date_joined')[:5]
-    unverified_hospitals = Hospital.objects.filter(is_verified=False)
+    unverified_hospitals = []
+    if counters[PlatformCounter.UNVERIFIED_HOSPITALS]:
+        unverified_hospitals = Hospital.objects.filter(is_verified=False).select_related('city').order_by('-id')[:ADMIN_PANEL_LIMIT]
     
     # Users who are HOSPITAL role but have no Hospital profile linkage
-    orphaned_users = User.objects.filter(role=User.Role.HOSPITAL, hospital_managed__isnull=True)
+    orphaned_users = []
+    if counters[PlatformCounter.ORPHANED_HOSPITAL_USERS]:
+        orphaned_users = User.objects.filter(role=User.Role.HOSPITAL, hospital_managed__isnull=True).order_by('-date_joined')[:ADMIN_PANEL_LIMIT]
     
     return render(request, 'dashboard/admin_dashboard.html', {
-        'total_hospitals': total_hospitals,
-        'total_doctors': total_doctors,
-        'total_patients': total_patients,
+        'total_hospitals': counters[PlatformCounter.HOSPITALS],
+        'total_doctors': counters[PlatformCounter.DOCTORS],
+        'total_patients': counters[PlatformCounter.PATIENTS],
         'recent_users': recent_users,
         'unverified_hospitals': unverified_hospitals,
-        'orphaned_users': orphaned_users
+        'unverified_count': counters[PlatformCounter.UNVERIFIED_HOSPITALS],
+        'orphaned_users': orphaned_users,
+        'orphaned_count': counters[PlatformCounter.ORPHANED_HOSPITAL_USERS],
     })
 
 @login_required
@@ -275,30 +343,53 @@ def create_hospital_profile(request, user_id):
 
     return render(request, 'dashboard/create_hospital_profile.html', {'form': form, 'target_user': target_user})
 
+# Browsers and proxies may reuse a dropdown list this long before revalidating
+DIRECTORY_MAX_AGE = 60
+
+def _directory_response(request, kind, param):
+    from django.http import HttpResponseNotModified
+    from django.utils.cache import patch_cache_control
+    from django.utils.http import parse_etags
+    from . import directory
+
+    if kind != 'cities' and not param.isdigit():
+        etag, body = '"empty"', b'[]'
+    else:
+        etag, body = directory.lookup(kind, param)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=DIRECTORY_MAX_AGE)
+    return response
+
 def get_cities(request):
-    state = request.GET.get('state')
-    cities = City.objects.filter(state=state).values('id', 'name')
-    return JsonResponse(list(cities), safe=False)
+    return _directory_response(request, 'cities', request.GET.get('state', ''))
 
 def get_hospitals(request):
-    city_id = request.GET.get('city')
-    hospitals = Hospital.objects.filter(city_id=city_id, is_verified=True).values('id', 'name')
-    return JsonResponse(list(hospitals), safe=False)
+    return _directory_response(request, 'hospitals', request.GET.get('city', ''))
 
 def get_doctors(request):
-    hospital_id = request.GET.get('hospital')
-    doctors = Doctor.objects.filter(hospital_id=hospital_id).select_related('user').values('id', 'user__username', 'specialization', 'user__first_name', 'user__last_name')
-    
-    # Format name better
-    data = []
-    for doc in doctors:
-        name = f"Dr. {doc['user__first_name']} {doc['user__last_name']}" if doc['user__first_name'] else f"Dr. {doc['user__username']}"
-        data.append({
-            'id': doc['id'],
-            'name': name,
-            'specialization': doc['specialization']
-        })
-    return JsonResponse(data, safe=False)
+    return _directory_response(request, 'doctors', request.GET.get('hospital', ''))
+
+def get_slots(request):
+    # Availability changes with every booking, so this one is never cached
+    from django.utils.dateparse import parse_date
+    from appointments import slots
+
+    doctor_id = request.GET.get('doctor', '')
+    try:
+        date = parse_date(request.GET.get('date', ''))
+    except ValueError:
+        date = None
+    if not doctor_id.isdigit() or date is None:
+        return JsonResponse([], safe=False)
+    free = slots.free_slots(int(doctor_id), date, date)[date]
+    if free is None:
+        # No schedule: the page falls back to a free time input
+        return JsonResponse(None, safe=False)
+    return JsonResponse([time.strftime('%H:%M') for time in free], safe=False)
 
 @login_required
 def update_apt_status(request, apt_id):
@@ -310,9 +401,16 @@ def update_apt_status(request, apt_id):
             apt = Appointment.objects.get(id=apt_id, doctor__hospital=request.user.hospital_managed)
             new_status = request.POST.get('status')
             if new_status in Appointment.Status.values:
+                from django.db import IntegrityError, transaction
                 apt.status = new_status
-                apt.save()
-                messages.success(request, f"Appointment status updated to {new_status}")
+                try:
+                    with transaction.atomic():
+                        apt.save()
+                except IntegrityError:
+                    # Re-opening a cancelled booking whose slot was taken since
+                    messages.error(request, "That time slot has been booked by another patient.")
+                else:
+                    messages.success(request, f"Appointment status updated to {new_status}")
         except Appointment.DoesNotExist:
             pass
             
@@ -322,114 +420,46 @@ def update_apt_status(request, apt_id):
 def consultation_view(request, apt_id):
     if not hasattr(request.user, 'hospital_managed'): return redirect('index')
     
-    from appointments.models import Appointment, Consultation, Prescription
+    from appointments.models import Appointment, Consultation
     try:
         apt = Appointment.objects.get(id=apt_id, doctor__hospital=request.user.hospital_managed)
     except Appointment.DoesNotExist:
         return redirect('hospital_dashboard')
         
-    # Get or Create Consultation
-    consultation, created = Consultation.objects.get_or_create(appointment=apt)
+    # Only read here; the first save creates it inside save_consultation's transaction
+    consultation = Consultation.objects.filter(appointment=apt).first()
     
     if request.method == 'POST':
-        # Update Consultation Details
-        consultation.nurse_name = request.POST.get('nurse_name')
-        consultation.bp = request.POST.get('bp')
-        consultation.pulse = request.POST.get('pulse')
-        consultation.temperature = request.POST.get('temperature')
-        consultation.weight = request.POST.get('weight')
-        consultation.symptoms = request.POST.get('symptoms')
-        consultation.diagnosis = request.POST.get('diagnosis')
-        consultation.advice = request.POST.get('advice')
-        consultation.save()
+        from appointments.services import save_consultation
         
-        # Also save to Patient's Vital History
-        # We need to parse BP (120/80) to systolic/diastolic
-        bp_val = request.POST.get('bp', '')
-        pulse_val = request.POST.get('pulse')
-        temp_val = request.POST.get('temperature')
-        weight_val = request.POST.get('weight')
-        
-        if bp_val or pulse_val or temp_val or weight_val:
-            from core.models import Vitals as VitalsHistory
-            
-            sys = 0
-            dia = 0
-            if '/' in bp_val:
-                try:
-                    parts = bp_val.split('/')
-                    sys = int(parts[0])
-                    dia = int(parts[1])
-                except ValueError:
-                    pass
-            
-            # Simple sanitization
-            try: hr = int(pulse_val) if pulse_val else 0
-            except: hr = 0
-            
-            try: temp = float(temp_val) if temp_val else 0.0
-            except: temp = 0.0
-            
-            try: wt = float(weight_val) if weight_val else 0.0
-            except: wt = 0.0
-            
-            # Create History Record (Always create new for history tracking, or update if we want 'latest'? History is better)
-            # To avoid spamming history on every 'Save Draft', maybe only do it on 'Complete'? 
-            # Or check if one exists for today?
-            # User requirement: "like we have entered vitals then have to add it into vital table"
-            # Let's save it.
-            
-            VitalsHistory.objects.create(
-                patient=apt.patient,
-                height=0, # Not captured in consultation currently
-                weight=wt,
-                bp_systolic=sys,
-                bp_diastolic=dia,
-                heart_rate=hr,
-                temperature=temp,
-                hospital=request.user.hospital_managed
-            )
-        
-        # Handle Prescription (Simplified: assume one item add or bulk text for now? 
-        # Requirement said: "medicine name , doses, duration, instructions, prescribed date"
-        # To handle multiple meds in one go without a complex JS formset, let's assume specific fields or just one med for MVP?
-        # Better: Javascript to add rows, and backend reads arrays.
+        data = {field: request.POST.get(field) for field in ('nurse_name', 'bp', 'pulse', 'temperature', 'weight', 'symptoms', 'diagnosis', 'advice')}
         
+        # Medicine rows come in as parallel arrays from the JS table
         med_names = request.POST.getlist('med_name[]')
         dosages = request.POST.getlist('dosage[]')
         durations = request.POST.getlist('duration[]')
         instructions = request.POST.getlist('instruction[]')
+        prescriptions = [
+            {
+                'medicine_name': name,
+                'dosage': dosages[i] if i < len(dosages) else '',
+                'duration': durations[i] if i < len(durations) else '',
+                'instructions': instructions[i] if i < len(instructions) else '',
+            }
+            for i, name in enumerate(med_names)
+        ]
         
-        # Clear old prescriptions to avoid duplication on edit? Or append? 
-        # For simplicity in this session, we wipe and recreate if safe, or just add new.
-        # Let's wipe to ensure the form reflects current state.
-        consultation.prescriptions.all().delete()
-        
-        for i in range(len(med_names)):
-            if med_names[i]:
-                Prescription.objects.create(
-                    consultation=consultation,
-                    medicine_name=med_names[i],
-                    dosage=dosages[i] if i < len(dosages) else '',
-                    duration=durations[i] if i < len(durations) else '',
-                    instructions=instructions[i] if i < len(instructions) else ''
-                )
+        # Vitals history, prescription diff and completion all commit together
+        complete = 'complete_consultation' in request.POST
+        consultation = save_consultation(apt, data, prescriptions, hospital=request.user.hospital_managed, complete=complete)
         
-        # Mark as Completed if requested
-        if 'complete_consultation' in request.POST:
-            from django.utils import timezone
-            consultation.completed_at = timezone.now()
-            consultation.save()
-            
-            apt.status = Appointment.Status.COMPLETED
-            apt.save()
+        if complete:
             messages.success(request, "Consultation Completed Successfully")
             return redirect('hospital_dashboard')
             
         messages.success(request, "Consultation Saved")
         
     return render(request, 'dashboard/consultation_form.html', {'apt': apt, 'consultation': consultation})
-    return render(request, 'dashboard/consultation_form.html', {'apt': apt, 'consultation': consultation})
 
 @login_required
 def appointment_detail_view(request, apt_id):
@@ -541,20 +571,63 @@ def patient_profile(request):
     
     return render(request, 'dashboard/patient_profile.html', {'form': form})
 
+# Rows per page on the admin list pages
+ADMIN_PAGE_SIZE = 50
+
+def _search_filter(term, fields):
+    # Prefix match so the lookups can use the NOCASE indexes on these columns.
+    # Keep every field on one table: SQLite only serves an OR from indexes when
+    # each branch is indexed on that table, so joined fields go in a subquery.
+    query = Q()
+    for field in fields:
+        query |= Q(**{f'{field}__istartswith': term})
+    return query
+
+def _parse_cursor(raw, parse):
+    if not raw:
+        return None
+    try:
+        return parse(raw)
+    except ValueError:
+        return None
+
 @login_required
 def admin_hospitals(request):
     if not request.user.is_staff: return redirect('index')
-    hospitals = Hospital.objects.all().order_by('-id')
-    return render(request, 'dashboard/admin_list_hospitals.html', {'hospitals': hospitals})
+    q = request.GET.get('q', '').strip()
+    hospitals = Hospital.objects.select_related('city')
+    if q:
+        hospitals = hospitals.filter(
+            _search_filter(q, ['name', 'email', 'phone']) | Q(admin__in=User.objects.filter(_search_filter(q, ['username'])))
+        )
+    after = _parse_cursor(request.GET.get('after'), lambda raw: (int(raw),))
+    hospitals, has_more = keyset_page(hospitals, ('-id',), after, ADMIN_PAGE_SIZE)
+    next_cursor = hospitals[-1].id if has_more else None
+    return render(request, 'dashboard/admin_list_hospitals.html', {'hospitals': hospitals, 'q': q, 'next_cursor': next_cursor, 'paged': after is not None})
 
 @login_required
 def admin_doctors(request):
     if not request.user.is_staff: return redirect('index')
-    doctors = Doctor.objects.select_related('user', 'hospital').all().order_by('-user__date_joined')
-    return render(request, 'dashboard/admin_list_doctors.html', {'doctors': doctors})
+    q = request.GET.get('q', '').strip()
+    doctors = Doctor.objects.select_related('user', 'hospital')
+    if q:
+        doctors = doctors.filter(
+            Q(user__in=User.objects.filter(_search_filter(q, ['username', 'first_name', 'last_name', 'email', 'phone'])))
+            | Q(hospital__in=Hospital.objects.filter(_search_filter(q, ['name'])))
+        )
+    after = _parse_cursor(request.GET.get('after'), parse_joined_key)
+    doctors, has_more = keyset_page(doctors, ('-user__date_joined', '-id'), after, ADMIN_PAGE_SIZE)
+    next_cursor = joined_key(doctors[-1].user, pk=doctors[-1].id) if has_more else None
+    return render(request, 'dashboard/admin_list_doctors.html', {'doctors': doctors, 'q': q, 'next_cursor': next_cursor, 'paged': after is not None})
 
 @login_required
 def admin_patients(request):
     if not request.user.is_staff: return redirect('index')
-    patients = User.objects.filter(role=User.Role.PATIENT).order_by('-date_joined')
-    return render(request, 'dashboard/admin_list_patients.html', {'patients': patients})
+    q = request.GET.get('q', '').strip()
+    patients = User.objects.filter(role=User.Role.PATIENT)
+    if q:
+        patients = patients.filter(_search_filter(q, ['username', 'first_name', 'last_name', 'email', 'phone']))
+    after = _parse_cursor(request.GET.get('after'), parse_joined_key)
+    patients, has_more = keyset_page(patients, ('-date_joined', '-id'), after, ADMIN_PAGE_SIZE)
+    next_cursor = joined_key(patients[-1]) if has_more else None
+    return render(request, 'dashboard/admin_list_patients.html', {'patients': patients, 'q': q, 'next_cursor': next_cursor, 'paged': after is not None})
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:44
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0009_doctorschedule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='hospital',
+            name='hospital_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'nocase'), name='hospital_name_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(django.db.models.functions.comparison.Collate('email', 'nocase'), name='hospital_email_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(django.db.models.functions.comparison.Collate('phone', 'nocase'), name='hospital_phone_nocase_idx'),
+        ),
+    ]
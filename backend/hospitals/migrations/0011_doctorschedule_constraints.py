@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0010_search_nocase_indexes'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='doctorschedule',
+            constraint=models.CheckConstraint(condition=models.Q(('end_time__gt', models.F('start_time'))), name='schedule_ends_after_start', violation_error_message='Working hours must end after they start.'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorschedule',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('break_end__isnull', True), ('break_start__isnull', True)), models.Q(('break_end__gt', models.F('break_start')), ('break_end__isnull', False), ('break_end__lte', models.F('end_time')), ('break_start__gte', models.F('start_time')), ('break_start__isnull', False)), _connector='OR'), name='schedule_break_within_hours', violation_error_message='The break must start and end within working hours.'),
+        ),
+    ]
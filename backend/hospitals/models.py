@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Collate
 from django.conf import settings
 
 class City(models.Model):
@@ -18,6 +19,15 @@ class Hospital(models.Model):
     website = models.URLField(blank=True)
     admin = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='hospital_managed')
     is_verified = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Prefix search on the admin hospital list; NOCASE so that
+            # istartswith can use them on SQLite
+            models.Index(Collate('name', 'nocase'), name='hospital_name_nocase_idx'),
+            models.Index(Collate('email', 'nocase'), name='hospital_email_nocase_idx'),
+            models.Index(Collate('phone', 'nocase'), name='hospital_phone_nocase_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.city.name if self.city else 'No City'})"
@@ -50,10 +60,59 @@ class Doctor(models.Model):
     department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, related_name='doctors')
     specialization = models.CharField(max_length=100, choices=SPECIALIZATION_CHOICES, default='General Physician')
     available = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Dr. {self.user.get_full_name()} ({self.specialization})"
 
+class DoctorSchedule(models.Model):
+    """
+    Weekly working hours for a doctor. A doctor may have several rules on the
+    same weekday (e.g. a morning and an evening session); each is cut into
+    slots of `slot_minutes`, skipping the optional break.
+    """
+    class Weekday(models.IntegerChoices):
+        MONDAY = 0, 'Monday'
+        TUESDAY = 1, 'Tuesday'
+        WEDNESDAY = 2, 'Wednesday'
+        THURSDAY = 3, 'Thursday'
+        FRIDAY = 4, 'Friday'
+        SATURDAY = 5, 'Saturday'
+        SUNDAY = 6, 'Sunday'
+
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='schedules')
+    weekday = models.PositiveSmallIntegerField(choices=Weekday.choices)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=15)
+    break_start = models.TimeField(blank=True, null=True)
+    break_end = models.TimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['weekday', 'start_time']
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end_time__gt=models.F('start_time')),
+                name='schedule_ends_after_start',
+                violation_error_message='Working hours must end after they start.',
+            ),
+            # Either no break, or one that starts and ends inside working hours
+            models.CheckConstraint(
+                condition=models.Q(break_start__isnull=True, break_end__isnull=True) | models.Q(
+                    break_start__isnull=False,
+                    break_end__isnull=False,
+                    break_start__gte=models.F('start_time'),
+                    break_end__gt=models.F('break_start'),
+                    break_end__lte=models.F('end_time'),
+                ),
+                name='schedule_break_within_hours',
+                violation_error_message='The break must start and end within working hours.',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
 class Staff(models.Model):
     class Role(models.TextChoices):
         DOCTOR = 'Doctor', 'Doctor'
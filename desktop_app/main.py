@@ -1,11 +1,32 @@
+import logging
 import tkinter as tk
 from tkinter import messagebox, ttk
-import requests
-from datetime import datetime
+import time
+from urllib.parse import urlencode
+
+from net import Client
+from scheduler import RefreshScheduler
+from store import Outbox, Store, path_for
+from widgets import BedBoard, KeyedTree
+
+log = logging.getLogger(__name__)
 
 API_URL = "http://127.0.0.1:8000/api/"
+API_PATH = "/api/"
 AUTH_URL = "http://127.0.0.1:8000/api/api-token-auth/"
 
+# Fetched together, with an appointment sync, in one /api/batch/ round trip when the dashboard opens
+COLD_LOAD_PATHS = ['hospital-details/', 'staff-roles/', 'staff/', 'beds/']
+# Shown from the local store at once, then again only if the server's copy differs
+OFFLINE_PATHS = set(COLD_LOAD_PATHS)
+# A tab opened later than this after the cold load fetches fresh data instead
+PREFETCH_MAX_AGE = 60
+# Seconds between appointment syncs while the dashboard is on screen
+APPOINTMENT_REFRESH = 30
+# Bed board filter choices; occupancy maps to the is_occupied value shown (None for any)
+ALL_WARDS = "All Wards"
+BED_OCCUPANCY = {"All Beds": None, "Available": False, "Occupied": True}
+
 class PlaceholderEntry(ttk.Entry):
     def __init__(self, container, placeholder, *args, **kwargs):
         super().__init__(container, *args, **kwargs)
@@ -49,7 +70,22 @@ class HealthCOApp(tk.Tk):
         self.configure(bg=self.colors['bg_main'])
         
         self.token = None
+        # Username signed in; names the account's local store
+        self.account = None
         self.user_role = None
+        # The signed-in account's local copy and its queue of unsent writes
+        self.store = None
+        self.outbox = None
+        # All HTTP goes through here, off the Tk thread. `session_scope` holds
+        # calls for the signed-in session, `screen` those of the current view.
+        self.net = Client(self, API_URL)
+        self.session_scope = self.net.scope()
+        self.screen = self.net.scope()
+        # Owns every refresh timer; views switch their jobs on and off
+        self.scheduler = RefreshScheduler(self)
+        self.scheduler.add('appointments', self.refresh_all_tables, APPOINTMENT_REFRESH)
+        self.bind("<Map>", lambda e: e.widget is self and self.scheduler.set_visible(True))
+        self.bind("<Unmap>", lambda e: e.widget is self and self.scheduler.set_visible(False))
         
         self.container = ttk.Frame(self)
         self.container.pack(fill="both", expand=True)
@@ -59,10 +95,9 @@ class HealthCOApp(tk.Tk):
         if os.path.exists("token.txt"):
             try:
                 with open("token.txt", "r") as f:
-                    saved_token = f.read().strip()
-                self.token = saved_token
+                    saved_token, self.account = f.read().split()
+                self.token = self.net.token = saved_token
                 self.show_dashboard_layout()
-                self.start_auto_refresh()
             except:
                 self.show_login_page()
         else:
@@ -141,25 +176,25 @@ class HealthCOApp(tk.Tk):
     def login(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
-        try:
-            response = requests.post(AUTH_URL, data={'username': username, 'password': password})
-            if response.status_code == 200:
-                self.token = response.json()['token']
-                
-                # Remember Me Logic
-                if self.remember_var.get():
-                    with open("token.txt", "w") as f:
-                        f.write(self.token)
-                
-                self.show_dashboard_layout()
-                self.start_auto_refresh()
-            else:
-                messagebox.showerror("Login Failed", f"Invalid credentials (Status: {response.status_code})")
-        except Exception as e:
-            messagebox.showerror("Error", f"Server Connection Failed: {str(e)}")
+        self.net.post(AUTH_URL, self.on_login, data={'username': username, 'password': password}, scope=self.screen,
+                      on_error=lambda e: messagebox.showerror("Error", f"Server Connection Failed: {str(e)}"))
+
+    def on_login(self, response):
+        if response.status_code == 200:
+            self.token = self.net.token = response.json()['token']
+            self.account = self.username_entry.get()
+            
+            # Remember Me Logic
+            if self.remember_var.get():
+                with open("token.txt", "w") as f:
+                    f.write(f"{self.token}\n{self.account}\n")
+            
+            self.show_dashboard_layout()
+        else:
+            messagebox.showerror("Login Failed", f"Invalid credentials (Status: {response.status_code})")
 
     def logout(self):
-        self.token = None
+        self.token = self.net.token = None
         import os
         if os.path.exists("token.txt"):
              os.remove("token.txt")
@@ -176,6 +211,17 @@ class HealthCOApp(tk.Tk):
     def show_dashboard_layout(self):
         self.clear_frame()
         
+        # Local copy of appointments kept current by delta sync, with the
+        # patient and doctor profiles they refer to cached by id. It starts
+        # from what the store kept, so the first sync only asks for changes.
+        self.store = Store(path_for(self.account))
+        self.appointments, self.patients, self.doctors, self.sync_watermark = self.store.load_appointments()
+        self.outbox = Outbox(self, self.store, self.net, self.session_scope,
+                             self.write_applied, self.write_conflict, self.show_sync_state, self.session_expired)
+        self.prefetched = {}
+        self.prefetch_waiters = {}
+        self.prefetch(COLD_LOAD_PATHS + [self.sync_path()])
+        
         # Sidebar
         sidebar = ttk.Frame(self.container, style="Sidebar.TFrame", width=260)
         sidebar.pack(side="left", fill="y")
@@ -195,6 +241,9 @@ class HealthCOApp(tk.Tk):
             btn.pack(fill="x", pady=2)
             
         ttk.Button(sidebar, text="Logout", style="Sidebar.TButton", command=self.logout).pack(side="bottom", fill="x", pady=20)
+        self.sync_label = ttk.Label(sidebar, background=self.colors['bg_dark'], foreground=self.colors['text_light'], wraplength=220)
+        self.sync_label.pack(side="bottom", padx=20, anchor="w")
+        self.show_sync_state()
 
         # Main Content Area
         self.main_area = ttk.Frame(self.container, style="TFrame", padding=30)
@@ -202,6 +251,76 @@ class HealthCOApp(tk.Tk):
         
         # Load default view
         self.load_data()
+        # Anything left queued by an earlier run goes out now
+        self.outbox.kick()
+
+    def prefetch(self, paths):
+        # One request for the lot; each result is then used once by api_get().
+        # Views opened while it is in flight wait for it instead of asking again.
+        for path in paths:
+            self.prefetch_waiters[path] = []
+
+        def finish(results):
+            fetched_at = time.monotonic()
+            for path, result in zip(paths, results):
+                if result['status'] == 200:
+                    self.prefetched[path] = (fetched_at, result['body'])
+                    if path in OFFLINE_PATHS:
+                        self.store.save_snapshot(path, result['body'])
+            # Anything the batch could not serve is fetched on its own
+            for path in paths:
+                for callback, scope in self.prefetch_waiters.pop(path, []):
+                    if not scope.cancelled:
+                        self.fetch(path, callback, scope)
+
+        def done(response):
+            finish(response.json()['responses'] if response.status_code == 200 else [])
+
+        def failed(error):
+            log.warning("Cold-load batch failed: %s", error)
+            finish([])
+
+        self.net.post("batch/", done, json={'requests': [{'path': API_PATH + p} for p in paths]},
+                      scope=self.session_scope, on_error=failed)
+
+    def api_get(self, path, callback, scope=None):
+        """
+        Call callback(body) on the Tk thread with the body of GET path, or
+        None on failure. Paths in OFFLINE_PATHS are answered from the store
+        first and called back again only if the server sends something new;
+        a failed refresh then leaves the stored copy on screen.
+        """
+        scope = scope or self.screen
+        if path in OFFLINE_PATHS:
+            cached = self.store.snapshot(path)
+            if cached is not None:
+                callback(cached)
+
+            def fresh(body, show=callback):
+                if body is None and cached is not None:
+                    return
+                if body != cached:
+                    if body is not None:
+                        self.store.save_snapshot(path, body)
+                    show(body)
+            callback = fresh
+        self.fetch(path, callback, scope)
+
+    def fetch(self, path, callback, scope):
+        # Uses the cold-load batch's copy while it is fresh
+        if path in self.prefetch_waiters:
+            self.prefetch_waiters[path].append((callback, scope))
+            return
+        if path in self.prefetched:
+            fetched_at, body = self.prefetched.pop(path)
+            if time.monotonic() - fetched_at < PREFETCH_MAX_AGE:
+                callback(body)
+                return
+        def failed(error):
+            log.warning("GET %s failed: %s", path, error)
+            callback(None)
+
+        self.net.get(path, lambda r: callback(r.json() if r.status_code == 200 else None), scope=scope, on_error=failed)
 
     def show_hospital_info(self):
         self.clear_main_area()
@@ -225,23 +344,22 @@ class HealthCOApp(tk.Tk):
         self.load_hospital_details()
 
     def load_hospital_details(self):
-        headers = {'Authorization': f'Token {self.token}'}
-        try:
-            # Assuming first hospital linked to user
-            response = requests.get(API_URL + "hospital-details/", headers=headers)
-            if response.status_code == 200 and len(response.json()) > 0:
-                data = response.json()[0]
-                self.hospital_id = data['id']
-                for field in self.entries:
-                    self.entries[field].insert(0, data.get(field, ''))
-        except: pass
+        self.api_get("hospital-details/", self.show_hospital_details)
+
+    def show_hospital_details(self, hospitals):
+        # Assuming first hospital linked to user
+        if hospitals:
+            data = hospitals[0]
+            self.hospital_id = data['id']
+            for field in self.entries:
+                self.entries[field].delete(0, 'end')
+                self.entries[field].insert(0, data.get(field, ''))
 
     def update_hospital_details(self):
         if not hasattr(self, 'hospital_id'): return
         data = {k: v.get() for k, v in self.entries.items()}
-        headers = {'Authorization': f'Token {self.token}'}
-        requests.patch(API_URL + f"hospital-details/{self.hospital_id}/", json=data, headers=headers)
-        messagebox.showinfo("Success", "Hospital Details Updated")
+        self.net.patch(f"hospital-details/{self.hospital_id}/", lambda r: messagebox.showinfo("Success", "Hospital Details Updated"),
+                       json=data, scope=self.screen)
 
 
     def show_staff_management(self):
@@ -276,19 +394,20 @@ class HealthCOApp(tk.Tk):
         self.staff_tree.heading('phone', text='Phone')
         self.staff_tree.column('id', width=0, stretch=False)
         self.staff_tree.pack(fill="both", expand=True)
+        self.staff_table = KeyedTree(self.staff_tree)
         
         self.load_staff()
 
     def fetch_staff_roles(self):
-        try:
-            headers = {'Authorization': f'Token {self.token}'}
-            response = requests.get(API_URL + "staff-roles/", headers=headers)
-            if response.status_code == 200:
-                self.staff_role['values'] = response.json()
-                if self.staff_role['values']:
-                    self.staff_role.current(0)
-        except:
-             self.staff_role['values'] = ['Other']
+        self.api_get("staff-roles/", self.show_staff_roles)
+
+    def show_staff_roles(self, roles):
+        if roles is None:
+            self.staff_role['values'] = ['Other']
+            return
+        self.staff_role['values'] = roles
+        if self.staff_role['values']:
+            self.staff_role.current(0)
 
     def add_staff(self):
         name = self.staff_name.get_value()
@@ -304,20 +423,17 @@ class HealthCOApp(tk.Tk):
             'role': role,
             'phone': phone
         }
-        headers = {'Authorization': f'Token {self.token}'}
-        requests.post(API_URL + "staff/", json=data, headers=headers)
-        self.load_staff()
+        self.net.post("staff/", lambda r: self.load_staff(), json=data, scope=self.screen)
         # Reset
         self.staff_name.delete(0, 'end'); self.staff_name._add_placeholder(None)
         self.staff_phone.delete(0, 'end'); self.staff_phone._add_placeholder(None)
 
     def load_staff(self):
-        headers = {'Authorization': f'Token {self.token}'}
-        response = requests.get(API_URL + "staff/", headers=headers)
-        if response.status_code == 200:
-            self.staff_tree.delete(*self.staff_tree.get_children())
-            for s in response.json():
-                self.staff_tree.insert('', 'end', values=(s['id'], s['name'], s['role'], s['phone']))
+        self.api_get("staff/", self.show_staff)
+
+    def show_staff(self, staff):
+        if staff is not None:
+            self.staff_table.update((s['id'], (s['id'], s['name'], s['role'], s['phone'])) for s in staff)
 
     def show_bed_management(self):
         self.clear_main_area()
@@ -330,9 +446,21 @@ class HealthCOApp(tk.Tk):
         self.bed_num = PlaceholderEntry(form, "Bed Number", width=10); self.bed_num.pack(side="left", padx=5)
         ttk.Button(form, text="Add Bed", style="Primary.TButton", command=self.add_bed).pack(side="left")
 
-        # Bed Grid
-        self.bed_frame = ttk.Frame(self.main_area, style="TFrame")
-        self.bed_frame.pack(fill="both", expand=True)
+        # Filters
+        filters = ttk.Frame(self.main_area, style="TFrame")
+        filters.pack(fill="x", pady=(0,10))
+        self.bed_ward_filter = ttk.Combobox(filters, width=15, state="readonly", values=[ALL_WARDS])
+        self.bed_ward_filter.current(0)
+        self.bed_ward_filter.pack(side="left", padx=5)
+        self.bed_occupancy_filter = ttk.Combobox(filters, width=12, state="readonly", values=list(BED_OCCUPANCY))
+        self.bed_occupancy_filter.current(0)
+        self.bed_occupancy_filter.pack(side="left", padx=5)
+        for box in (self.bed_ward_filter, self.bed_occupancy_filter):
+            box.bind("<<ComboboxSelected>>", self.filter_beds)
+
+        # Bed Grid: only the cards scrolled into view are drawn
+        self.bed_board = BedBoard(self.main_area, self.colors, self.toggle_bed, style="TFrame")
+        self.bed_board.pack(fill="both", expand=True)
         self.load_beds()
 
     def add_bed(self):
@@ -341,40 +469,53 @@ class HealthCOApp(tk.Tk):
         if not ward or not num: return
 
         data = {'ward': ward, 'number': num}
-        headers = {'Authorization': f'Token {self.token}'}
-        requests.post(API_URL + "beds/", json=data, headers=headers)
-        self.load_beds()
+        self.net.post("beds/", self.bed_saved, json=data, scope=self.screen)
         # Reset
         self.bed_ward.delete(0, 'end'); self.bed_ward._add_placeholder(None)
         self.bed_num.delete(0, 'end'); self.bed_num._add_placeholder(None)
 
     def load_beds(self):
-        for w in self.bed_frame.winfo_children(): w.destroy()
-        headers = {'Authorization': f'Token {self.token}'}
-        response = requests.get(API_URL + "beds/", headers=headers)
-        
-        if response.status_code == 200:
-            row, col = 0, 0
-            for bed in response.json():
-                color = self.colors['danger'] if bed['is_occupied'] else self.colors['success']
-                card = tk.Frame(self.bed_frame, bg="white", padx=10, pady=10)
-                card.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
-                
-                tk.Label(card, text=f"{bed['ward']} - {bed['number']}", font=("Segoe UI", 12, "bold"), bg="white").pack()
-                tk.Label(card, text="Occupied" if bed['is_occupied'] else "Available", fg=color, bg="white").pack()
-                
-                btn_text = "Free" if bed['is_occupied'] else "Occupy"
-                tk.Button(card, text=btn_text, bg=self.colors['primary'], fg="white", 
-                          command=lambda b=bed: self.toggle_bed(b)).pack(pady=5)
-                
-                col += 1
-                if col > 3: col=0; row+=1
+        self.api_get("beds/", self.show_beds)
+
+    def show_beds(self, beds):
+        # Keep the old board up until the new list has arrived
+        if beds is not None:
+            # Toggles still in the outbox win over the server's older copy,
+            # and their cards stay busy until the server has answered
+            queued = {entry.target: entry.body['is_occupied'] for entry in self.store.pending() if entry.kind == 'bed'}
+            beds = [dict(b, is_occupied=queued[b['id']]) if b['id'] in queued else b for b in beds]
+            self.bed_board.set_beds(beds, busy=queued)
+            self.bed_ward_filter['values'] = [ALL_WARDS] + self.bed_board.wards()
+
+    def filter_beds(self, event=None):
+        ward = self.bed_ward_filter.get()
+        self.bed_board.set_filter(None if ward == ALL_WARDS else ward, BED_OCCUPANCY[self.bed_occupancy_filter.get()])
+
+    def bed_saved(self, response):
+        # The POST/PATCH response is the bed as saved: patch just its card
+        if response.status_code in (200, 201):
+            self.remember_bed(response.json())
+        else:
+            self.load_beds()
+
+    def remember_bed(self, bed):
+        beds = [b for b in self.store.snapshot("beds/") or [] if b['id'] != bed['id']]
+        self.store.save_snapshot("beds/", beds + [bed])
+        if self.showing('bed_board'):
+            self.bed_board.update_bed(bed)
+            self.bed_ward_filter['values'] = [ALL_WARDS] + self.bed_board.wards()
 
     def toggle_bed(self, bed):
-        headers = {'Authorization': f'Token {self.token}'}
+        # Shown at once and queued; the card stays busy until write_applied
+        # shows the PATCH response or write_conflict reloads the board
         new_status = not bed['is_occupied']
-        requests.patch(API_URL + f"beds/{bed['id']}/", json={'is_occupied': new_status}, headers=headers)
-        self.load_beds()
+        self.bed_board.update_bed(dict(bed, is_occupied=new_status), busy=True)
+        self.outbox.send('bed', 'PATCH', f"beds/{bed['id']}/", {'is_occupied': new_status}, target=bed['id'])
+
+    def showing(self, name):
+        # Whether the widget kept in attribute `name` is on screen now
+        widget = getattr(self, name, None)
+        return widget is not None and widget.winfo_exists()
 
     def load_data(self):
         self.clear_main_area()
@@ -396,11 +537,14 @@ class HealthCOApp(tk.Tk):
         
         # Setup tables for each tab
         self.trees = {}
+        self.tables = {}
         for status, tab in [('PENDING', self.tab_pending), ('CONFIRMED', self.tab_confirmed), 
                             ('COMPLETED', self.tab_completed), ('CANCELLED', self.tab_cancelled)]:
             self.create_tree(tab, status)
-            
-        self.start_auto_refresh()
+
+        # Draw what the store has now; the sync then only brings changes
+        self.render_tables()
+        self.scheduler.activate('appointments')
 
     def create_tree(self, parent, status):
         # Actions Frame
@@ -418,43 +562,138 @@ class HealthCOApp(tk.Tk):
             
         # Tree
         cols = ('id', 'patient', 'doctor', 'date', 'time')
-        tree = ttk.Treeview(parent, columns=cols, show='headings', style="Treeview")
+        # Shift/Ctrl-click selects several rows for Confirm/Cancel
+        tree = ttk.Treeview(parent, columns=cols, show='headings', style="Treeview", selectmode='extended')
         for c in cols: tree.heading(c, text=c.capitalize())
         tree.column('id', width=50); tree.column('time', width=100)
         tree.pack(fill='both', expand=True)
         self.trees[status] = tree
+        self.tables[status] = KeyedTree(tree)
         
-    def refresh_all_tables(self):
-        headers = {'Authorization': f'Token {self.token}'}
+    def sync_path(self):
+        params = {'resources': 'appointments', 'compact': 1}
+        if self.sync_watermark:
+            params['since'] = self.sync_watermark
+        return "sync/?" + urlencode(params)
+
+    def refresh_all_tables(self, done):
+        # Run by the scheduler; done(ok) tells it how the sync went
+        def synced(data):
+            ok = self.apply_sync(data)
+            if ok:
+                # The server is reachable again: don't wait for the outbox's retry timer
+                self.outbox.kick()
+            done(ok)
+
+        # Only rows changed since the last poll come back; the rest are kept in self.appointments
+        self.api_get(self.sync_path(), synced)
+
+    def apply_sync(self, data):
+        # True once the sync is on screen; a failed one backs the scheduler off
+        if data is None:
+            return False
         try:
-            response = requests.get(API_URL + "appointments/", headers=headers)
-            if response.status_code == 200:
-                # Store selection to restore later? For now just clear/reload
-                for t in self.trees.values(): t.delete(*t.get_children())
-                
-                for apt in response.json():
-                    status = apt['status']
-                    if(status in self.trees):
-                        self.trees[status].insert('', 'end', values=(
-                            apt['id'], apt['patient_name'], apt['doctor_name'], apt['date'], apt['time']
-                        ))
-        except Exception as e:
-            print(e)
-            
-    def start_auto_refresh(self):
-        self.refresh_all_tables()
-        self.after(30000, self.start_auto_refresh) # 30 seconds
+            if data['full']:
+                self.appointments = {}
+            for apt in data['appointments']:
+                self.appointments[apt['id']] = apt
+            # Profiles arrive once per sync, not once per row
+            included = data.get('included', {})
+            for patient in included.get('patients', []):
+                self.patients[patient['id']] = patient
+            for doctor in included.get('doctors', []):
+                self.doctors[doctor['id']] = doctor
+            for apt_id in data['deleted'].get('appointments', []):
+                self.appointments.pop(apt_id, None)
+            self.sync_watermark = data['watermark']
+            self.store.apply_sync(data)
+            self.render_tables()
+        except Exception:
+            log.exception("Could not apply sync")
+            if self.showing('sync_label'):
+                self.sync_label.config(text="Sync failed · showing the last data received")
+            return False
+        return True
+
+    def render_tables(self):
+        # Only rows that changed are touched, so selection and scroll survive a poll
+        if not self.showing('notebook'): return
+        rows = {status: [] for status in self.tables}
+        queued = self.queued_statuses()
+        for apt in sorted(self.appointments.values(), key=lambda a: (a['date'], a['time'], a['id'])):
+            status = queued.get(apt['id'], {}).get(apt['status'], apt['status'])
+            if(status in rows):
+                rows[status].append((apt['id'], (
+                    apt['id'], self.patient_name(apt['patient']), self.doctors.get(apt['doctor'], {}).get('name', ''), apt['date'], apt['time']
+                )))
+        for status, table in self.tables.items():
+            table.update(rows[status])
 
+    def queued_statuses(self):
+        # {appointment id: {status it must have now: status it is changing to}}
+        # for the changes still in the outbox, applied in the order they were made
+        queued = {}
+        for entry in self.store.pending():
+            if entry.kind == 'status':
+                moves = [(apt_id, entry.body['current_status'], entry.body['status']) for apt_id in entry.body['ids']]
+            elif entry.kind == 'consultation':
+                moves = [(entry.target, 'CONFIRMED', 'COMPLETED')]
+            else:
+                continue
+            for apt_id, current, new in moves:
+                changes = queued.setdefault(apt_id, {})
+                for before, after in list(changes.items()):
+                    if after == current:
+                        changes[before] = new
+                changes.setdefault(current, new)
+        return queued
+
+    def patient_name(self, patient_id):
+        p = self.patients.get(patient_id, {})
+        return f"{p.get('first_name', '')} {p.get('last_name', '')}".strip()
+            
     def update_status(self, current_status, new_status):
         tree = self.trees[current_status]
-        sel = tree.selection()
-        if not sel: return
-        apt_id = tree.item(sel[0])['values'][0]
-        
-        try:
-            requests.patch(API_URL + f"appointments/{apt_id}/", json={'status': new_status}, headers={'Authorization': f'Token {self.token}'})
-            self.refresh_all_tables()
-        except: pass
+        # Item ids are the appointment ids (see render_tables)
+        apt_ids = [int(item) for item in tree.selection()]
+        if not apt_ids: return
+
+        data = {'ids': apt_ids, 'current_status': current_status, 'status': new_status}
+        # The whole selection in one queued request; rows changed elsewhere meanwhile are skipped
+        self.outbox.send('status', 'POST', "appointments/bulk-status/", data)
+        self.render_tables()
+
+    def write_applied(self, entry, response):
+        if entry.kind == 'status':
+            result = response.json()
+            skipped = len(result['conflicts']) + len(result['missing'])
+            if skipped:
+                messagebox.showwarning("Some Appointments Skipped", f"{skipped} of {len(entry.body['ids'])} appointment(s) had already been changed and were left as they are.")
+        elif entry.kind == 'bed':
+            self.remember_bed(response.json())
+        if entry.kind in ('status', 'consultation'):
+            self.scheduler.refresh('appointments')
+
+    def write_conflict(self, entry, response):
+        # Refused by the server, e.g. the appointment was cancelled elsewhere
+        # meanwhile: the local change is dropped and the server's state shown
+        what = {'status': "status change", 'consultation': f"consultation for appointment #{entry.target}",
+                'bed': f"bed #{entry.target} update"}.get(entry.kind, entry.kind)
+        messagebox.showwarning("Change Not Applied", f"The {what} was refused by the server ({response.status_code}):\n{response.text[:300]}")
+        if entry.kind == 'bed':
+            if self.showing('bed_board'): self.load_beds()
+        else:
+            self.render_tables()
+            self.scheduler.refresh('appointments')
+
+    def show_sync_state(self):
+        if not self.showing('sync_label'): return
+        waiting = self.outbox.count()
+        if not self.outbox.online:
+            text = f"Offline · {waiting} change(s) waiting" if waiting else "Offline"
+        else:
+            text = f"Sending {waiting} change(s)…" if waiting else "All changes saved"
+        self.sync_label.config(text=text)
 
     def open_consultation(self):
         tree = self.trees['CONFIRMED']
@@ -480,15 +719,55 @@ class HealthCOApp(tk.Tk):
         ttk.Label(card, text=value, font=("Segoe UI", 24, "bold"), foreground=color, background="white").pack(anchor="w")
 
     def logout(self):
-        self.token = None
+        # Nothing left to send: the account's local copy goes with the session
+        if self.outbox is not None:
+            waiting = self.outbox.count()
+            if waiting and not messagebox.askyesno(
+                    "Unsent Changes", f"{waiting} change(s) have not reached the server yet. They will be sent "
+                    "the next time this account logs in on this computer.\n\nLog out anyway?"):
+                return
+            if not waiting:
+                self.outbox.stop()
+                self.store.delete()
+                self.store = self.outbox = None
+        self.token = self.net.token = None
+        self.show_login_page()
+
+    def session_expired(self):
+        # The outbox has stopped with its writes kept; they go out after the next login
+        import os
+        if os.path.exists("token.txt"):
+            os.remove("token.txt")
+        self.token = self.net.token = None
         self.show_login_page()
+        messagebox.showwarning("Session Expired", "Your session has expired. Please log in again; changes not yet sent are kept.")
 
     def clear_frame(self):
+        # Whatever the old session or screen still has in flight is dropped;
+        # queued writes stay in the store for the account's next session
+        self.scheduler.deactivate_all()
+        self.close_store()
+        for scope in (self.session_scope, self.screen): scope.cancel()
+        self.session_scope, self.screen = self.net.scope(), self.net.scope()
         for widget in self.container.winfo_children(): widget.destroy()
 
     def clear_main_area(self):
+        self.scheduler.deactivate_all()
+        self.screen.cancel()
+        self.screen = self.net.scope()
         for widget in self.main_area.winfo_children(): widget.destroy()
 
+    def close_store(self):
+        if self.outbox is not None:
+            self.outbox.stop()
+            self.store.close()
+            self.store = self.outbox = None
+
+    def destroy(self):
+        self.close_store()
+        self.net.close()
+        super().destroy()
+
 class ConsultationWindow(tk.Toplevel):
     def __init__(self, parent, apt_id, token):
         super().__init__(parent)
@@ -497,6 +776,12 @@ class ConsultationWindow(tk.Toplevel):
         self.apt_id = apt_id
         self.token = token
         self.parent_app = parent
+        self.store = parent.store
+        self.net = parent.net
+        self.scope = self.net.scope()
+        self.bind("<Destroy>", lambda e: e.widget is self and self.scope.cancel())
+        # Closing keeps what was typed as a draft for next time
+        self.protocol("WM_DELETE_WINDOW", self.close)
         
         self.setup_ui()
         
@@ -598,51 +883,59 @@ class ConsultationWindow(tk.Toplevel):
         self.load_existing()
 
     def fetch_patient_data(self):
-        headers = {'Authorization': f'Token {self.token}'}
-        try:
-            r = requests.get(API_URL + f"appointments/{self.apt_id}/", headers=headers)
+        # Use the profile cached by the dashboard sync before asking the server
+        apt = self.parent_app.appointments.get(self.apt_id)
+        p = self.parent_app.patients.get(apt['patient']) if apt else None
+        if p is not None:
+            self.show_patient(p)
+            return
+
+        def done(r):
             if r.status_code == 200:
-                apt = r.json()
-                p = apt.get('patient_details', {})
-                name = f"{p.get('first_name','')} {p.get('last_name','')}".strip() or p.get('username','Unknown')
-                info = f"Name: {name}   |   Age: {p.get('age', 'N/A')}   |   Gender: {p.get('gender', '-')}   |   Blood Group: {p.get('blood_group', '-')}   |   Phone: {p.get('phone', '-')}"
-                self.pat_info_label.config(text=info)
-        except Exception as e:
-            self.pat_info_label.config(text=f"Error fetching details: {e}")
+                self.show_patient(r.json().get('patient_details', {}))
+
+        self.net.get(f"appointments/{self.apt_id}/", done, scope=self.scope,
+                     on_error=lambda e: self.pat_info_label.config(text=f"Error fetching details: {e}"))
+
+    def show_patient(self, p):
+        name = f"{p.get('first_name','')} {p.get('last_name','')}".strip() or p.get('username','Unknown')
+        info = f"Name: {name}   |   Age: {p.get('age', 'N/A')}   |   Gender: {p.get('gender', '-')}   |   Blood Group: {p.get('blood_group', '-')}   |   Phone: {p.get('phone', '-')}"
+        self.pat_info_label.config(text=info)
 
     def load_existing(self):
-        self.existing_id = None
-        headers = {'Authorization': f'Token {self.token}'}
+        # A local draft is newer than anything the server has
+        draft = self.store.draft(self.apt_id)
+        if draft:
+            self.fill(draft)
+            return
+        # 404 just means no draft has been saved for this appointment yet
+        self.net.get(f"appointments/{self.apt_id}/consultation/", self.show_existing, scope=self.scope)
+
+    def show_existing(self, r):
+        if r.status_code == 200:
+            self.fill(r.json())
+
+    def fill(self, found):
         try:
-            # Filter API by appointment ID manually or check list
-            # Ideally API should support ?appointment=ID
-            r = requests.get(API_URL + "consultations/", headers=headers)
-            if r.status_code == 200:
-                data = r.json()
-                found = next((c for c in data if c['appointment'] == self.apt_id), None)
-                if found:
-                    self.existing_id = found['id']
-                    self.nurse_name.insert(0, found.get('nurse_name', ''))
-                    
-                    self.bp.insert(0, found.get('bp', ''))
-                    self.pulse.insert(0, found.get('pulse', ''))
-                    self.temp.insert(0, found.get('temperature', ''))
-                    self.weight.insert(0, found.get('weight', ''))
-                    self.height.insert(0, found.get('height', ''))
-                    
-                    self.symptoms.insert("1.0", found.get('symptoms', ''))
-                    self.diagnosis.insert("1.0", found.get('diagnosis', ''))
-                    self.advice.insert("1.0", found.get('advice', ''))
-                    
-                    # Clear placeholders if data exists
-                    for w in [self.nurse_name, self.bp, self.pulse, self.temp, self.weight, self.height]:
-                        w._clear_placeholder(None)
-
-                    # Load Meds
-                    for p in found.get('prescriptions', []):
-                         self.med_tree.insert('', 'end', values=(p['medicine_name'], p['dosage'], p['duration'], p.get('instructions', '')))
-                         
-        except Exception as e: print(e)
+            if found:
+                entries = {self.nurse_name: 'nurse_name', self.bp: 'bp', self.pulse: 'pulse',
+                           self.temp: 'temperature', self.weight: 'weight', self.height: 'height'}
+                for w, field in entries.items():
+                    # Replace the placeholder rather than typing in front of it
+                    w.delete(0, 'end')
+                    w.insert(0, found.get(field) or '')
+                    w._add_placeholder(None)
+
+                self.symptoms.insert("1.0", found.get('symptoms', ''))
+                self.diagnosis.insert("1.0", found.get('diagnosis', ''))
+                self.advice.insert("1.0", found.get('advice', ''))
+
+                # Load Meds (a local draft keeps them as they are submitted)
+                for p in found.get('prescriptions', found.get('prescriptions_data', [])):
+                     self.med_tree.insert('', 'end', values=(p['medicine_name'], p['dosage'], p['duration'], p.get('instructions', '')))
+
+        except Exception:
+            log.exception("Could not load consultation for appointment #%s", self.apt_id)
 
     def add_med(self):
         n = self.med_name.get_value()
@@ -652,9 +945,8 @@ class ConsultationWindow(tk.Toplevel):
         if n and d:
             self.med_tree.insert('', 'end', values=(n, d, dur, instr))
             
-    def submit(self):
+    def collect(self):
         data = {
-            'appointment': self.apt_id,
             'nurse_name': self.nurse_name.get_value(), # Added Nurse
             'bp': self.bp.get_value(),
             'pulse': self.pulse.get_value(),
@@ -664,7 +956,6 @@ class ConsultationWindow(tk.Toplevel):
             'symptoms': self.symptoms.get("1.0", "end-1c"),
             'diagnosis': self.diagnosis.get("1.0", "end-1c"),
             'advice': self.advice.get("1.0", "end-1c"),
-            'completed_at': datetime.now().isoformat(),
             'prescriptions_data': []
         }
         
@@ -676,25 +967,30 @@ class ConsultationWindow(tk.Toplevel):
                 'duration': v[2],
                 'instructions': v[3]
             })
-            
-        headers = {'Authorization': f'Token {self.token}'}
-        try:
-            if self.existing_id:
-                r = requests.patch(API_URL + f"consultations/{self.existing_id}/", json=data, headers=headers)
-                success_code = 200
-            else:
-                r = requests.post(API_URL + "consultations/", json=data, headers=headers)
-                success_code = 201
-                
-            if r.status_code == success_code:
-                requests.patch(API_URL + f"appointments/{self.apt_id}/", json={'status': 'COMPLETED'}, headers=headers)
-                messagebox.showinfo("Success", "Consultation Completed")
-                self.parent_app.refresh_all_tables()
-                self.destroy()
+        return data
+
+    def close(self):
+        # Nothing to keep if the app has since switched account
+        if self.parent_app.store is self.store:
+            data = self.collect()
+            if any(data.values()):
+                self.store.save_draft(self.apt_id, data)
             else:
-                 messagebox.showerror("Error", f"Failed: {r.text}")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+                self.store.delete_draft(self.apt_id)
+        self.destroy()
+
+    def submit(self):
+        if self.parent_app.store is not self.store: return
+        # Saves the consultation, prescriptions and vitals and completes the
+        # appointment in one call, queued so it survives the server being down
+        self.parent_app.outbox.send('consultation', 'POST', f"appointments/{self.apt_id}/consultation/", self.collect(), target=self.apt_id)
+        self.store.delete_draft(self.apt_id)
+        self.parent_app.render_tables()
+        if self.parent_app.outbox.online:
+            messagebox.showinfo("Success", "Consultation Completed")
+        else:
+            messagebox.showinfo("Saved Offline", "The consultation is saved and will be sent when the server can be reached.")
+        self.destroy()
 
 class DetailsWindow(tk.Toplevel):
     def __init__(self, parent, apt_id, token):
@@ -703,6 +999,9 @@ class DetailsWindow(tk.Toplevel):
         self.geometry("850x700")
         self.apt_id = apt_id
         self.token = token
+        self.net = parent.net
+        self.scope = self.net.scope()
+        self.bind("<Destroy>", lambda e: e.widget is self and self.scope.cancel())
         
         self.setup_ui()
         self.load_data()
@@ -749,18 +1048,14 @@ class DetailsWindow(tk.Toplevel):
         tk.Label(f, text=value, font=("Segoe UI", 10), bg="white", wraplength=500, justify="left").pack(side="left", fill="x")
 
     def load_data(self):
-        headers = {'Authorization': f'Token {self.token}'}
-        try:
-            r = requests.get(API_URL + "consultations/", headers=headers)
+        def done(r):
             if r.status_code == 200:
-                data = r.json()
-                found = next((c for c in data if c['appointment'] == self.apt_id), None)
-                if found:
-                    self.display_data(found)
-                else:
-                    tk.Label(self.scroll_frame, text="No Record Found", fg="red", bg="white").pack()
-        except Exception as e:
-            tk.Label(self.scroll_frame, text=f"Error: {e}", fg="red", bg="white").pack()
+                self.display_data(r.json())
+            elif r.status_code == 404:
+                tk.Label(self.scroll_frame, text="No Record Found", fg="red", bg="white").pack()
+
+        self.net.get(f"appointments/{self.apt_id}/consultation/", done, scope=self.scope,
+                     on_error=lambda e: tk.Label(self.scroll_frame, text=f"Error: {e}", fg="red", bg="white").pack())
 
     def display_data(self, data):
         # Session
@@ -797,5 +1092,6 @@ class DetailsWindow(tk.Toplevel):
              tk.Label(self.pres_frame, text="No medicines prescribed", bg="white").pack()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     app = HealthCOApp()
     app.mainloop()
@@ -0,0 +1,124 @@
+"""
+Background HTTP for the Tk app.
+
+Requests run on a small thread pool that shares one keep-alive
+requests.Session, so a slow server never freezes the window. Tk widgets may
+only be touched from the main thread: finished calls are queued and handed to
+their callbacks by an after() loop that runs only while calls are pending.
+
+Every call can belong to a Scope, e.g. the screen that started it. Cancelling
+the scope when the user navigates away drops calls that have not started yet
+and discards the results of those already in flight, so a late response can
+never draw into widgets that no longer exist.
+"""
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+WORKERS = 4
+# (connect, read) seconds; a dead server fails fast instead of hanging a worker
+TIMEOUT = (3.05, 20)
+POLL_MS = 30
+
+
+class Scope:
+    """Calls that are cancelled together."""
+    def __init__(self):
+        self.cancelled = False
+        self.futures = set()
+
+    def cancel(self):
+        self.cancelled = True
+        for future in self.futures:
+            future.cancel()
+        self.futures.clear()
+
+
+class Client:
+    def __init__(self, root, base_url, workers=WORKERS, timeout=TIMEOUT):
+        self.root = root
+        self.base_url = base_url
+        self.timeout = timeout
+        self.token = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='net')
+
+        self.finished = queue.SimpleQueue()
+        self.pending = 0
+        self.polling = False
+
+    def scope(self):
+        return Scope()
+
+    def request(self, method, path, on_done=None, on_error=None, scope=None, headers=None, **kwargs):
+        """
+        Send in the background. on_done(response) gets any HTTP response,
+        on_error(exception) a network failure; both run on the Tk thread.
+        `path` is relative to base_url unless it is a full URL.
+        """
+        url = path if '://' in path else self.base_url + path
+        headers = dict(headers or {})
+        if self.token:
+            headers.setdefault('Authorization', f'Token {self.token}')
+        kwargs.setdefault('timeout', self.timeout)
+
+        future = self.executor.submit(self.session.request, method, url, headers=headers, **kwargs)
+        if scope is not None:
+            scope.futures.add(future)
+        self.pending += 1
+        # Runs on the worker thread (or here if already cancelled): only queue it
+        future.add_done_callback(lambda f: self.finished.put((f, scope, on_done, on_error)))
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_MS, self.deliver)
+        return future
+
+    def get(self, path, on_done=None, **kwargs):
+        return self.request('GET', path, on_done, **kwargs)
+
+    def post(self, path, on_done=None, **kwargs):
+        return self.request('POST', path, on_done, **kwargs)
+
+    def patch(self, path, on_done=None, **kwargs):
+        return self.request('PATCH', path, on_done, **kwargs)
+
+    def deliver(self):
+        while True:
+            try:
+                future, scope, on_done, on_error = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            if future.cancelled() or (scope is not None and scope.cancelled):
+                continue
+            if scope is not None:
+                scope.futures.discard(future)
+            error = future.exception()
+            try:
+                if error is None:
+                    if on_done is not None:
+                        on_done(future.result())
+                elif on_error is not None:
+                    on_error(error)
+                else:
+                    log.warning("Request failed: %s", error)
+            except Exception:
+                # One broken callback must not stop the others being delivered
+                log.exception("Callback failed")
+        if self.pending:
+            self.root.after(POLL_MS, self.deliver)
+        else:
+            self.polling = False
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
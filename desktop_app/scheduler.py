@@ -0,0 +1,129 @@
+"""
+The desktop app's one owner of refresh timers.
+
+Each named job refreshes one view's data on its own interval, but only while
+that view is active and the window is not minimised. Asking for a refresh
+while one is already running queues at most a single follow-up run, so
+clicks, saves and timers cannot pile up downloads. A run that fails or is
+slow doubles the job's interval, up to MAX_INTERVAL, until one succeeds
+quickly again.
+
+A job's `run(done)` starts the refresh and must call done(ok) when it is
+over, however it ended.
+"""
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+MAX_INTERVAL = 300
+# A run that takes longer than this (seconds) counts as the server struggling
+SLOW_AFTER = 5
+
+
+class Job:
+    def __init__(self, run, interval):
+        self.run = run
+        self.interval = interval
+        self.delay = interval
+        self.active = False
+        self.timer = None
+        self.running = False
+        self.again = False
+        # Identifies the current run so a late done() from a cancelled one is ignored
+        self.generation = 0
+        self.started = 0
+
+
+class RefreshScheduler:
+    def __init__(self, root, max_interval=MAX_INTERVAL, slow_after=SLOW_AFTER):
+        self.root = root
+        self.max_interval = max_interval
+        self.slow_after = slow_after
+        self.jobs = {}
+        self.visible = True
+
+    def add(self, name, run, interval):
+        self.jobs[name] = Job(run, interval)
+
+    def activate(self, name):
+        """The job's view is on screen: refresh it now and then on its interval."""
+        job = self.jobs[name]
+        if not job.active:
+            job.active = True
+            job.delay = job.interval
+        self.refresh(name)
+
+    def deactivate(self, name):
+        job = self.jobs[name]
+        job.active = job.running = job.again = False
+        job.generation += 1
+        self._cancel_timer(job)
+
+    def deactivate_all(self):
+        for name in self.jobs:
+            self.deactivate(name)
+
+    def refresh(self, name):
+        """Refresh soon: now if idle, else once more right after the run in flight."""
+        job = self.jobs[name]
+        if not job.active:
+            return
+        if job.running or not self.visible:
+            job.again = True
+            return
+        self._cancel_timer(job)
+        self._start(job)
+
+    def set_visible(self, visible):
+        # A minimised window keeps no timers; showing it again catches up at once
+        if visible == self.visible:
+            return
+        self.visible = visible
+        for name, job in self.jobs.items():
+            if not job.active:
+                continue
+            if visible:
+                if not job.running:
+                    self.refresh(name)
+            else:
+                self._cancel_timer(job)
+
+    def _start(self, job):
+        job.running = True
+        job.again = False
+        job.generation += 1
+        job.started = time.monotonic()
+        generation = job.generation
+        try:
+            job.run(lambda ok: self._finished(job, generation, ok))
+        except Exception:
+            log.exception("Refresh job failed to start")
+            self._finished(job, generation, False)
+
+    def _finished(self, job, generation, ok):
+        if generation != job.generation or not job.running:
+            return
+        job.running = False
+        if ok and time.monotonic() - job.started < self.slow_after:
+            job.delay = job.interval
+        else:
+            job.delay = min(job.delay * 2, self.max_interval)
+        if job.again and self.visible:
+            self._start(job)
+        else:
+            self._schedule(job)
+
+    def _schedule(self, job):
+        if job.active and self.visible:
+            job.timer = self.root.after(int(job.delay * 1000), lambda: self._tick(job))
+
+    def _tick(self, job):
+        job.timer = None
+        if job.active and self.visible and not job.running:
+            self._start(job)
+
+    def _cancel_timer(self, job):
+        if job.timer is not None:
+            self.root.after_cancel(job.timer)
+            job.timer = None
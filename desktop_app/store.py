@@ -0,0 +1,273 @@
+"""
+Local SQLite copy of what the desktop app shows, and a durable outbox of
+writes still to be sent.
+
+The dashboard draws from the Store first and only then asks the server, so
+starting up and switching screens do not wait on the network, and a clinic
+whose connection is down still sees its last known appointments, staff and
+beds. Each signed-in account gets its own database file in the user's
+app-data directory, readable by that OS user only, since it holds patient
+records.
+
+Writes that must not be lost (status changes, consultations, bed toggles)
+are appended to the outbox before anything is sent. Outbox replays them one
+at a time in the order they were made. A network failure or a server error
+leaves the write queued and retries it with backoff. A 401 also leaves it
+queued but stops the outbox until the user signs in again. Any other answer
+takes it off the queue, and a 4xx is reported as a conflict. Every write keeps the
+Idempotency-Key it was queued with, so a write that reached the server but
+whose response was lost is not applied twice.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from collections import namedtuple
+
+# Seconds between retries while the server cannot be reached
+RETRY_MIN = 5
+RETRY_MAX = 120
+# Answers that mean "try again later" rather than "this write was refused"
+RETRY_STATUSES = {408, 429}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (path TEXT PRIMARY KEY, body TEXT NOT NULL, saved_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS appointments (id INTEGER PRIMARY KEY, body TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS profiles (kind TEXT NOT NULL, id INTEGER NOT NULL, body TEXT NOT NULL, PRIMARY KEY (kind, id));
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS drafts (appointment_id INTEGER PRIMARY KEY, body TEXT NOT NULL, saved_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    target INTEGER,
+    method TEXT NOT NULL,
+    path TEXT NOT NULL,
+    body TEXT,
+    idempotency_key TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+"""
+
+Entry = namedtuple('Entry', 'seq kind target method path body key attempts last_error')
+
+
+def data_dir():
+    """The per-user directory the stores live in, created private to this OS user."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+        directory = os.path.join(base, 'HealthCO')
+    elif sys.platform == 'darwin':
+        directory = os.path.expanduser('~/Library/Application Support/HealthCO')
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+        directory = os.path.join(base, 'healthco')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    os.chmod(directory, 0o700)
+    return directory
+
+
+def path_for(account, directory=None):
+    """
+    The database file for `account`, the username signed in. Not keyed by
+    the token: signing in again after a 401 issues a new one, and the writes
+    queued under the old session must still be found and sent.
+    """
+    digest = hashlib.sha256(account.encode()).hexdigest()[:16]
+    return os.path.join(directory or data_dir(), f"healthco-{digest}.sqlite3")
+
+
+class Store:
+    """Used from the Tk thread only."""
+    def __init__(self, path):
+        # Owner-only from the start; SQLite gives its journal the same mode
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(path, 0o600)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def delete(self):
+        """Close the store and remove its file; for signing out with nothing left to send."""
+        self.close()
+        for suffix in ('', '-journal', '-wal', '-shm'):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+    # GET bodies kept whole, by API path
+
+    def snapshot(self, path):
+        row = self.db.execute("SELECT body FROM snapshots WHERE path = ?", (path,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_snapshot(self, path, body):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO snapshots (path, body, saved_at) VALUES (?, ?, ?)",
+                            (path, json.dumps(body), time.time()))
+
+    # Appointments, kept current by /api/sync/ deltas
+
+    def load_appointments(self):
+        """(appointments, patients, doctors, watermark) as the last sync left them."""
+        appointments = {row[0]: json.loads(row[1]) for row in self.db.execute("SELECT id, body FROM appointments")}
+        profiles = {'patient': {}, 'doctor': {}}
+        for kind, profile_id, body in self.db.execute("SELECT kind, id, body FROM profiles"):
+            profiles[kind][profile_id] = json.loads(body)
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+        return appointments, profiles['patient'], profiles['doctor'], row[0] if row else None
+
+    def apply_sync(self, data):
+        """Persist one /api/sync/ response; all of it or none of it."""
+        included = data.get('included', {})
+        with self.db:
+            if data['full']:
+                self.db.execute("DELETE FROM appointments")
+            self.db.executemany("INSERT OR REPLACE INTO appointments (id, body) VALUES (?, ?)",
+                                [(apt['id'], json.dumps(apt)) for apt in data['appointments']])
+            for kind, key in (('patient', 'patients'), ('doctor', 'doctors')):
+                self.db.executemany("INSERT OR REPLACE INTO profiles (kind, id, body) VALUES (?, ?, ?)",
+                                    [(kind, p['id'], json.dumps(p)) for p in included.get(key, [])])
+            self.db.executemany("DELETE FROM appointments WHERE id = ?",
+                                [(apt_id,) for apt_id in data['deleted'].get('appointments', [])])
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('watermark', ?)", (data['watermark'],))
+
+    # Consultation forms not yet submitted
+
+    def draft(self, appointment_id):
+        row = self.db.execute("SELECT body FROM drafts WHERE appointment_id = ?", (appointment_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_draft(self, appointment_id, body):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO drafts (appointment_id, body, saved_at) VALUES (?, ?, ?)",
+                            (appointment_id, json.dumps(body), time.time()))
+
+    def delete_draft(self, appointment_id):
+        with self.db:
+            self.db.execute("DELETE FROM drafts WHERE appointment_id = ?", (appointment_id,))
+
+    # Outbox
+
+    def enqueue(self, kind, method, path, body=None, target=None):
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO outbox (kind, target, method, path, body, idempotency_key, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, target, method, path, json.dumps(body), str(uuid.uuid4()), time.time()))
+        return cursor.lastrowid
+
+    def pending(self):
+        """Queued writes, oldest first."""
+        return self._entries("ORDER BY seq")
+
+    def next_entry(self):
+        entries = self._entries("ORDER BY seq LIMIT 1")
+        return entries[0] if entries else None
+
+    def _entries(self, clause):
+        rows = self.db.execute(
+            "SELECT seq, kind, target, method, path, body, idempotency_key, attempts, last_error FROM outbox " + clause)
+        return [Entry(*row[:5], json.loads(row[5]), *row[6:]) for row in rows]
+
+    def remove(self, seq):
+        with self.db:
+            self.db.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+
+    def note_failure(self, seq, error):
+        with self.db:
+            self.db.execute("UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE seq = ?", (str(error), seq))
+
+
+class Outbox:
+    """
+    Replays the store's queued writes through `net`, oldest first and one at
+    a time. on_applied(entry, response) and on_conflict(entry, response) get
+    each write's outcome; on_state() is told whenever the queue or the
+    connection state changes. on_unauthorized() is called once the server
+    rejects the session, after the outbox has stopped with the write still
+    queued. All of them run on the Tk thread.
+    """
+    def __init__(self, root, store, net, scope, on_applied, on_conflict, on_state, on_unauthorized):
+        self.root = root
+        self.store = store
+        self.net = net
+        self.scope = scope
+        self.on_applied = on_applied
+        self.on_conflict = on_conflict
+        self.on_state = on_state
+        self.on_unauthorized = on_unauthorized
+        self.online = True
+        self.sending = False
+        self.stopped = False
+        self.delay = RETRY_MIN
+        self.timer = None
+
+    def send(self, kind, method, path, body=None, target=None):
+        """Queue a write durably, then try to send it."""
+        self.store.enqueue(kind, method, path, body, target)
+        self.on_state()
+        self.kick()
+
+    def count(self):
+        return len(self.store.pending())
+
+    def kick(self):
+        """Send the oldest queued write now unless one is already on its way."""
+        if self.sending or self.stopped:
+            return
+        if self.timer is not None:
+            self.root.after_cancel(self.timer)
+            self.timer = None
+        entry = self.store.next_entry()
+        if entry is None:
+            return
+        self.sending = True
+        self.net.request(entry.method, entry.path, lambda r: self._answered(entry, r),
+                         on_error=lambda e: self._failed(entry, e), scope=self.scope,
+                         json=entry.body, headers={'Idempotency-Key': entry.key})
+
+    def stop(self):
+        self.stopped = True
+        if self.timer is not None:
+            self.root.after_cancel(self.timer)
+            self.timer = None
+
+    def _answered(self, entry, response):
+        self.sending = False
+        if response.status_code == 401:
+            # Retrying cannot help until the user signs in again
+            self.stop()
+            self.on_unauthorized()
+            return
+        if response.status_code >= 500 or response.status_code in RETRY_STATUSES:
+            self._failed(entry, f"HTTP {response.status_code}")
+            return
+        self.online = True
+        self.delay = RETRY_MIN
+        self.store.remove(entry.seq)
+        try:
+            if response.ok:
+                self.on_applied(entry, response)
+            else:
+                self.on_conflict(entry, response)
+        finally:
+            self.on_state()
+            self.kick()
+
+    def _failed(self, entry, error):
+        # Later writes may depend on this one, so the whole queue waits
+        self.sending = False
+        self.online = False
+        self.store.note_failure(entry.seq, error)
+        self.on_state()
+        if not self.stopped:
+            self.timer = self.root.after(int(self.delay * 1000), self.kick)
+            self.delay = min(self.delay * 2, RETRY_MAX)
@@ -0,0 +1,7 @@
+"""
+Tests for the desktop app's display-free logic. They use fakes for Tk's
+after() and for net.Client, so no window or server is needed. Run from
+desktop_app/ with:
+
+    python -m unittest discover tests
+"""
@@ -0,0 +1,56 @@
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+        self.text = '' if body is None else str(body)
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return self.body
+
+
+class FakeRoot:
+    """Stands in for Tk: after() callbacks run only when fire() is called."""
+    def __init__(self):
+        self.timers = {}
+        self.next_id = 0
+
+    def after(self, ms, callback):
+        self.next_id += 1
+        self.timers[self.next_id] = (ms, callback)
+        return self.next_id
+
+    def after_cancel(self, timer):
+        self.timers.pop(timer, None)
+
+    def delays(self):
+        return sorted(ms for ms, _ in self.timers.values())
+
+    def fire(self):
+        """Run every pending timer once."""
+        timers, self.timers = self.timers, {}
+        for _, callback in timers.values():
+            callback()
+
+
+class FakeNet:
+    """
+    Records requests; each is answered later by answer(response) or
+    fail(error), like net.Client delivering on the Tk thread.
+    """
+    def __init__(self):
+        self.sent = []
+
+    def request(self, method, path, on_done=None, on_error=None, scope=None, headers=None, **kwargs):
+        self.sent.append((method, path, on_done, on_error, headers, kwargs))
+
+    def answer(self, response):
+        _, _, on_done, _, _, _ = self.sent.pop(0)
+        on_done(response)
+
+    def fail(self, error):
+        _, _, _, on_error, _, _ = self.sent.pop(0)
+        on_error(error)
@@ -0,0 +1,124 @@
+import unittest
+from unittest import mock
+
+from scheduler import RefreshScheduler
+from tests.fakes import FakeRoot
+
+
+class Runs:
+    """A job's run(done): records each start and finishes it when told."""
+    def __init__(self):
+        self.pending = []
+        self.count = 0
+
+    def __call__(self, done):
+        self.count += 1
+        self.pending.append(done)
+
+    def finish(self, ok=True):
+        self.pending.pop(0)(ok)
+
+
+class SchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = 0
+        patcher = mock.patch('scheduler.time.monotonic', lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.root = FakeRoot()
+        self.scheduler = RefreshScheduler(self.root, max_interval=40, slow_after=5)
+        self.runs = Runs()
+        self.scheduler.add('appointments', self.runs, 10)
+
+
+class RefreshTests(SchedulerTestCase):
+    def test_activating_runs_now_and_then_on_the_interval(self):
+        self.scheduler.activate('appointments')
+        self.assertEqual(self.runs.count, 1)
+        self.assertEqual(self.root.delays(), [])
+        self.runs.finish()
+        self.assertEqual(self.root.delays(), [10000])
+        self.root.fire()
+        self.assertEqual(self.runs.count, 2)
+
+    def test_refreshes_during_a_run_coalesce_into_one_follow_up(self):
+        self.scheduler.activate('appointments')
+        for _ in range(3):
+            self.scheduler.refresh('appointments')
+        self.assertEqual(self.runs.count, 1)
+        self.runs.finish()
+        self.assertEqual(self.runs.count, 2)
+        self.assertEqual(self.root.delays(), [])
+        self.runs.finish()
+        self.assertEqual((self.runs.count, self.root.delays()), (2, [10000]))
+
+    def test_refreshing_while_idle_replaces_the_timer(self):
+        self.scheduler.activate('appointments')
+        self.runs.finish()
+        self.scheduler.refresh('appointments')
+        self.assertEqual((self.runs.count, self.root.delays()), (2, []))
+
+    def test_inactive_jobs_do_not_run(self):
+        self.scheduler.refresh('appointments')
+        self.assertEqual(self.runs.count, 0)
+
+    def test_deactivating_cancels_the_timer_and_ignores_a_late_done(self):
+        self.scheduler.activate('appointments')
+        self.scheduler.deactivate('appointments')
+        self.runs.finish()
+        self.assertEqual(self.root.delays(), [])
+
+        self.scheduler.activate('appointments')
+        self.runs.finish()
+        self.scheduler.deactivate('appointments')
+        self.assertEqual(self.root.delays(), [])
+
+    def test_hidden_window_keeps_no_timers_and_catches_up_when_shown(self):
+        self.scheduler.activate('appointments')
+        self.runs.finish()
+        self.scheduler.set_visible(False)
+        self.assertEqual(self.root.delays(), [])
+        self.scheduler.refresh('appointments')
+        self.assertEqual(self.runs.count, 1)
+        self.scheduler.set_visible(True)
+        self.assertEqual(self.runs.count, 2)
+
+
+class BackoffTests(SchedulerTestCase):
+    def test_failures_double_the_delay_up_to_the_maximum(self):
+        self.scheduler.activate('appointments')
+        delays = []
+        for _ in range(4):
+            self.runs.finish(ok=False)
+            delays += self.root.delays()
+            self.root.fire()
+        self.assertEqual(delays, [20000, 40000, 40000, 40000])
+
+        self.runs.finish()
+        self.assertEqual(self.root.delays(), [10000])
+
+    def test_a_slow_success_counts_as_struggling(self):
+        self.scheduler.activate('appointments')
+        self.clock += 6
+        self.runs.finish()
+        self.assertEqual(self.root.delays(), [20000])
+        self.root.fire()
+        self.clock += 1
+        self.runs.finish()
+        self.assertEqual(self.root.delays(), [10000])
+
+    def test_a_run_that_raises_counts_as_a_failure(self):
+        def broken(done):
+            raise RuntimeError('no connection')
+        self.scheduler.add('beds', broken, 10)
+        with self.assertLogs('scheduler', 'ERROR'):
+            self.scheduler.activate('beds')
+        self.assertEqual(self.root.delays(), [20000])
+
+    def test_reactivating_starts_over_at_the_interval(self):
+        self.scheduler.activate('appointments')
+        self.runs.finish(ok=False)
+        self.scheduler.deactivate('appointments')
+        self.scheduler.activate('appointments')
+        self.runs.finish(ok=False)
+        self.assertEqual(self.root.delays(), [20000])
@@ -0,0 +1,173 @@
+import os
+import tempfile
+import unittest
+
+from store import Outbox, Store, path_for
+from tests.fakes import FakeNet, FakeResponse, FakeRoot
+
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def open_store(self, account='alice'):
+        store = Store(path_for(account, self.directory))
+        self.addCleanup(store.db.close)
+        return store
+
+    def outbox(self, store, net=None, root=None):
+        self.events = []
+        return Outbox(
+            root or FakeRoot(), store, net or FakeNet(), None,
+            on_applied=lambda entry, response: self.events.append(('applied', entry.seq)),
+            on_conflict=lambda entry, response: self.events.append(('conflict', entry.seq)),
+            on_state=lambda: None,
+            on_unauthorized=lambda: self.events.append(('unauthorized',)),
+        )
+
+
+class SessionExpiryTests(StoreTestCase):
+    def test_writes_queued_before_a_401_are_sent_after_signing_in_again(self):
+        net = FakeNet()
+        store = self.open_store()
+        outbox = self.outbox(store, net)
+        outbox.send('bed', 'PATCH', 'beds/7/', {'is_occupied': True}, target=7)
+        key = net.sent[0][4]['Idempotency-Key']
+        net.answer(FakeResponse(401))
+        self.assertEqual(self.events, [('unauthorized',)])
+        self.assertTrue(outbox.stopped)
+        outbox.kick()
+        self.assertEqual(net.sent, [])
+        store.close()
+
+        # Signing in again gets a new token but the same account, so the same file
+        net = FakeNet()
+        store = self.open_store()
+        outbox = self.outbox(store, net)
+        self.assertEqual(outbox.count(), 1)
+        outbox.kick()
+        method, path, _, _, headers, kwargs = net.sent[0]
+        self.assertEqual((method, path, kwargs['json']), ('PATCH', 'beds/7/', {'is_occupied': True}))
+        self.assertEqual(headers['Idempotency-Key'], key)
+        net.answer(FakeResponse(200, {'id': 7, 'is_occupied': True}))
+        self.assertEqual(outbox.count(), 0)
+        self.assertEqual(self.events, [('applied', 1)])
+
+    def test_each_account_has_its_own_private_file(self):
+        self.assertNotEqual(path_for('alice', self.directory), path_for('bob', self.directory))
+        path = path_for('alice', self.directory)
+        store = self.open_store()
+        if os.name == 'posix':
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        store.delete()
+        self.assertFalse(os.path.exists(path))
+
+
+class ApplySyncTests(StoreTestCase):
+    def sync(self, full, appointments, deleted=(), patients=(), watermark='w'):
+        return {
+            'full': full, 'watermark': watermark,
+            'appointments': [{'id': apt_id, 'status': status} for apt_id, status in appointments],
+            'included': {'patients': [{'id': p, 'first_name': name} for p, name in patients], 'doctors': []},
+            'deleted': {'appointments': list(deleted)},
+        }
+
+    def test_full_sync_then_deltas(self):
+        store = self.open_store()
+        store.apply_sync(self.sync(True, [(1, 'PENDING'), (2, 'PENDING')], patients=[(9, 'Ravi')], watermark='w1'))
+        store.apply_sync(self.sync(False, [(2, 'CONFIRMED'), (3, 'PENDING')], deleted=[1], watermark='w2'))
+        appointments, patients, doctors, watermark = store.load_appointments()
+        self.assertEqual(appointments, {2: {'id': 2, 'status': 'CONFIRMED'}, 3: {'id': 3, 'status': 'PENDING'}})
+        self.assertEqual((patients, doctors, watermark), ({9: {'id': 9, 'first_name': 'Ravi'}}, {}, 'w2'))
+
+        store.apply_sync(self.sync(True, [(4, 'PENDING')], watermark='w3'))
+        self.assertEqual(list(store.load_appointments()[0]), [4])
+
+    def test_a_broken_response_changes_nothing(self):
+        store = self.open_store()
+        store.apply_sync(self.sync(True, [(1, 'PENDING')], watermark='w1'))
+        before = store.load_appointments()
+
+        # Fails after the full sync's DELETE and the upserts have run
+        broken = self.sync(True, [(2, 'PENDING')], watermark='w2')
+        del broken['deleted']
+        with self.assertRaises(KeyError):
+            store.apply_sync(broken)
+        broken = self.sync(False, [(1, 'CONFIRMED')], watermark='w2')
+        broken['appointments'].append({'status': 'PENDING'})
+        with self.assertRaises(KeyError):
+            store.apply_sync(broken)
+        self.assertEqual(store.load_appointments(), before)
+
+
+class OutboxTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.net = FakeNet()
+        self.root = FakeRoot()
+        self.store = self.open_store()
+        self.box = self.outbox(self.store, self.net, self.root)
+
+    def queue(self, *beds):
+        for bed in beds:
+            self.box.send('bed', 'PATCH', f'beds/{bed}/', {'is_occupied': True}, target=bed)
+
+    def sent_paths(self):
+        return [path for _, path, *_ in self.net.sent]
+
+    def test_writes_go_one_at_a_time_in_order(self):
+        self.queue(1, 2, 3)
+        self.assertEqual(self.sent_paths(), ['beds/1/'])
+        self.net.answer(FakeResponse(200))
+        self.assertEqual(self.sent_paths(), ['beds/2/'])
+        self.net.answer(FakeResponse(200))
+        self.net.answer(FakeResponse(200))
+        self.assertEqual((self.box.count(), self.events), (0, [('applied', 1), ('applied', 2), ('applied', 3)]))
+
+    def test_failures_keep_the_write_and_back_off(self):
+        self.queue(1, 2)
+        delays = []
+        for error in ('timeout', FakeResponse(503), FakeResponse(429)) + ('timeout',) * 5:
+            if isinstance(error, FakeResponse):
+                self.net.answer(error)
+            else:
+                self.net.fail(error)
+            delays += self.root.delays()
+            self.assertFalse(self.box.online)
+            self.root.fire()
+        self.assertEqual(delays, [5000, 10000, 20000, 40000, 80000, 120000, 120000, 120000])
+        entry = self.store.next_entry()
+        self.assertEqual((entry.seq, entry.attempts, entry.last_error), (1, 8, 'timeout'))
+        self.assertEqual(self.events, [])
+
+        # Delivered at last: the delay starts over and the next write follows
+        self.net.answer(FakeResponse(200))
+        self.assertTrue(self.box.online)
+        self.assertEqual((self.box.delay, self.sent_paths()), (5, ['beds/2/']))
+
+    def test_refused_writes_are_dropped_as_conflicts(self):
+        self.queue(1, 2)
+        self.net.answer(FakeResponse(409, {'detail': 'cancelled'}))
+        self.net.answer(FakeResponse(200))
+        self.assertEqual((self.box.count(), self.events), (0, [('conflict', 1), ('applied', 2)]))
+
+    def test_kick_skips_the_retry_wait(self):
+        self.queue(1)
+        self.net.fail('timeout')
+        self.assertEqual(self.root.delays(), [5000])
+        self.box.kick()
+        self.assertEqual((self.root.delays(), self.sent_paths()), ([], ['beds/1/']))
+        # Already on its way: a second kick sends nothing more
+        self.box.kick()
+        self.assertEqual(len(self.net.sent), 1)
+
+    def test_stopped_outbox_sends_and_retries_nothing(self):
+        self.queue(1)
+        self.net.fail('timeout')
+        self.box.stop()
+        self.assertEqual(self.root.delays(), [])
+        self.queue(2)
+        self.box.kick()
+        self.assertEqual((self.net.sent, self.box.count()), ([], 2))
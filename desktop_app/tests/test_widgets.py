@@ -0,0 +1,144 @@
+import itertools
+import random
+import unittest
+
+from widgets import KeyedTree, _longest_increasing
+
+
+class FakeTree:
+    """
+    The flat-Treeview calls KeyedTree makes, with Tk's semantics for the
+    children order and the selection; every call is recorded.
+    """
+    def __init__(self):
+        self.children = []
+        self.values = {}
+        self.selected = []
+        self.top = 0.0
+        self.calls = []
+
+    def get_children(self):
+        return tuple(self.children)
+
+    def selection(self):
+        return tuple(self.selected)
+
+    def selection_set(self, items):
+        self.calls.append(('selection_set', tuple(items)))
+        self.selected = list(items)
+
+    def yview(self):
+        return (self.top, 1.0)
+
+    def yview_moveto(self, fraction):
+        self.calls.append(('yview_moveto', fraction))
+        self.top = fraction
+
+    def delete(self, *items):
+        self.calls.append(('delete',) + items)
+        self.detach(*items, record=False)
+        for iid in items:
+            del self.values[iid]
+
+    def detach(self, *items, record=True):
+        if record:
+            self.calls.append(('detach',) + items)
+        self.children = [iid for iid in self.children if iid not in items]
+        self.selected = [iid for iid in self.selected if iid not in items]
+
+    def insert(self, parent, index, iid, values):
+        self.calls.append(('insert', iid))
+        assert iid not in self.values, f"duplicate item {iid}"
+        self.children.insert(index, iid)
+        self.values[iid] = values
+
+    def move(self, iid, parent, index):
+        self.calls.append(('move', iid))
+        if iid in self.children:
+            self.children.remove(iid)
+        self.children.insert(index, iid)
+
+    def item(self, iid, values):
+        self.calls.append(('item', iid))
+        self.values[iid] = values
+
+
+def rows(*keys, label=''):
+    return [(key, (f"row {key}{label}",)) for key in keys]
+
+
+class LongestIncreasingTests(unittest.TestCase):
+    def longest(self, sequence):
+        # Brute force over subsets, longest first
+        for size in range(len(sequence), 0, -1):
+            for picked in itertools.combinations(range(len(sequence)), size):
+                values = [sequence[i] for i in picked]
+                if all(a < b for a, b in zip(values, values[1:])):
+                    return size
+        return 0
+
+    def test_small_cases(self):
+        self.assertEqual(_longest_increasing([]), [])
+        self.assertEqual(_longest_increasing([5]), [0])
+        self.assertEqual(_longest_increasing([0, 1, 2, 3]), [0, 1, 2, 3])
+        self.assertEqual(len(_longest_increasing([3, 2, 1, 0])), 1)
+        self.assertEqual(_longest_increasing([2, 0, 1, 4, 3]), [1, 2, 4])
+
+    def test_matches_brute_force(self):
+        generator = random.Random(7)
+        for _ in range(200):
+            sequence = generator.sample(range(20), generator.randint(0, 9))
+            found = _longest_increasing(sequence)
+            self.assertEqual(found, sorted(found))
+            values = [sequence[i] for i in found]
+            self.assertTrue(all(a < b for a, b in zip(values, values[1:])), sequence)
+            self.assertEqual(len(found), self.longest(sequence), sequence)
+
+
+class KeyedTreeTests(unittest.TestCase):
+    def setUp(self):
+        self.tree = FakeTree()
+        self.keyed = KeyedTree(self.tree)
+
+    def show(self, wanted):
+        self.tree.calls = []
+        self.keyed.update(wanted)
+        self.assertEqual(self.tree.get_children(), tuple(str(key) for key, _ in wanted))
+        self.assertEqual([self.tree.values[str(key)] for key, _ in wanted], [values for _, values in wanted])
+        return self.tree.calls
+
+    def test_first_update_inserts_every_row(self):
+        calls = self.show(rows(1, 2, 3))
+        self.assertEqual(calls, [('insert', '1'), ('insert', '2'), ('insert', '3')])
+
+    def test_unchanged_rows_cost_no_calls(self):
+        self.show(rows(1, 2, 3))
+        self.assertEqual(self.show(rows(1, 2, 3)), [])
+
+    def test_changed_values_are_updated_in_place(self):
+        self.show(rows(1, 2, 3))
+        self.assertEqual(self.show(rows(1) + rows(2, label=' (confirmed)') + rows(3)), [('item', '2')])
+
+    def test_removed_rows_are_deleted_in_one_call(self):
+        self.show(rows(1, 2, 3, 4))
+        self.assertEqual(self.show(rows(1, 4)), [('delete', '2', '3'), ('yview_moveto', 0.0)])
+
+    def test_only_rows_out_of_order_are_moved(self):
+        self.show(rows(1, 2, 3, 4, 5))
+        self.tree.selected = ['5', '2']
+        calls = self.show(rows(5, 1, 2, 3, 4))
+        self.assertEqual(calls[:2], [('detach', '5'), ('move', '5')])
+        # Detaching drops the selection in Tk; it is put back
+        self.assertEqual(self.tree.selection(), ('5', '2'))
+
+    def test_view_stays_on_the_same_row_when_rows_are_added_above(self):
+        self.show(rows(*range(10, 20)))
+        self.tree.top = 0.5
+        calls = self.show(rows(*range(0, 20)))
+        self.assertEqual(calls[-1], ('yview_moveto', 15 / 20))
+
+    def test_random_refreshes_always_show_the_wanted_rows(self):
+        generator = random.Random(11)
+        for _ in range(100):
+            keys = generator.sample(range(30), generator.randint(0, 15))
+            self.show([(key, (f"row {key}", generator.choice('ab'))) for key in keys])
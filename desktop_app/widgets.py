@@ -0,0 +1,282 @@
+"""
+Widgets that stay fast on big hospitals.
+
+KeyedTree keeps a Python-side copy of what a flat Treeview shows, so a
+refresh only costs Tk calls for the rows that actually changed: stale rows
+are deleted in one call, changed values are updated in place, and new or
+reordered rows are inserted or moved into position. Rows keep their item
+ids, so the user's selection and scroll position survive a poll.
+
+BedBoard draws beds as cards on a single Canvas and only creates canvas items
+for the rows scrolled into view.
+"""
+import re
+import tkinter as tk
+from bisect import bisect_left, bisect_right
+from tkinter import ttk
+
+
+def _longest_increasing(sequence):
+    """Indexes into `sequence` of one longest strictly increasing subsequence."""
+    tails, tail_index, previous = [], [], [None] * len(sequence)
+    for i, value in enumerate(sequence):
+        slot = bisect_left(tails, value)
+        if slot == len(tails):
+            tails.append(value)
+            tail_index.append(i)
+        else:
+            tails[slot] = value
+            tail_index[slot] = i
+        previous[i] = tail_index[slot - 1] if slot else None
+    result = []
+    i = tail_index[-1] if tail_index else None
+    while i is not None:
+        result.append(i)
+        i = previous[i]
+    return result[::-1]
+
+
+class KeyedTree:
+    """Owns the top-level rows of `tree`; only update() may change them."""
+    def __init__(self, tree):
+        self.tree = tree
+        self.order = []
+        self.values = {}
+
+    def update(self, rows):
+        """
+        Show `rows`, an ordered iterable of (key, values). Keys identify rows
+        across refreshes and become the item ids (as strings).
+        """
+        tree = self.tree
+        wanted = [(str(key), tuple(values)) for key, values in rows]
+        wanted_ids = [iid for iid, _ in wanted]
+        wanted_set = set(wanted_ids)
+
+        # Remember what the user was looking at
+        selection = tree.selection()
+        top = None
+        if self.order:
+            first = int(round(tree.yview()[0] * len(self.order)))
+            top = self.order[min(first, len(self.order) - 1)]
+
+        stale = [iid for iid in self.order if iid not in wanted_set]
+        if stale:
+            tree.delete(*stale)
+        kept = [iid for iid in self.order if iid in wanted_set]
+
+        # Rows already in the right relative order stay put; the rest are
+        # detached and re-attached at their new index, new rows inserted
+        position = {iid: i for i, iid in enumerate(kept)}
+        in_wanted_order = [iid for iid in wanted_ids if iid in position]
+        increasing = _longest_increasing([position[iid] for iid in in_wanted_order])
+        stable = {in_wanted_order[i] for i in increasing}
+        moving = [iid for iid in kept if iid not in stable]
+        if moving:
+            tree.detach(*moving)
+
+        added = False
+        for index, (iid, values) in enumerate(wanted):
+            if iid not in self.values:
+                tree.insert('', index, iid=iid, values=values)
+                added = True
+            else:
+                if iid not in stable:
+                    tree.move(iid, '', index)
+                if self.values[iid] != values:
+                    tree.item(iid, values=values)
+
+        self.order = wanted_ids
+        self.values = dict(wanted)
+
+        if moving and selection:
+            tree.selection_set([iid for iid in selection if iid in wanted_set])
+        # Rows added or removed above the view would otherwise scroll it
+        if (stale or moving or added) and top in wanted_set and len(wanted_ids) > 1:
+            tree.yview_moveto(wanted_ids.index(top) / len(wanted_ids))
+
+
+def _natural(text):
+    """Sort key that puts bed "2" before bed "10"."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', str(text))]
+
+
+class BedBoard(ttk.Frame):
+    """
+    Beds as cards grouped under a header per ward. The layout is plain
+    Python; canvas items exist only for the rows on screen, so a board of
+    hundreds of beds costs what a screenful does. Scrolling draws the rows
+    that appear and deletes the ones that leave.
+
+    on_toggle(bed) is called when a card's button is clicked. The card then
+    shows as busy, and ignores clicks, until update_bed() or set_beds() says
+    otherwise; callers keep it busy while the toggle is waiting to be saved.
+    """
+    CARD_W, CARD_H, GAP, HEADER_H = 170, 96, 12, 34
+    SCROLL_UNITS = 3
+
+    def __init__(self, parent, colors, on_toggle, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.colors = colors
+        self.on_toggle = on_toggle
+
+        self.canvas = tk.Canvas(self, bg=colors['bg_main'], highlightthickness=0, yscrollincrement=20)
+        scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.canvas.pack(side='left', fill='both', expand=True)
+
+        self.canvas.bind('<Configure>', self._resized)
+        self.canvas.bind('<MouseWheel>', lambda e: self._scroll(-1 if e.delta > 0 else 1))
+        self.canvas.bind('<Button-4>', lambda e: self._scroll(-1))
+        self.canvas.bind('<Button-5>', lambda e: self._scroll(1))
+        self.canvas.tag_bind('toggle', '<Button-1>', self._clicked)
+        self.canvas.tag_bind('toggle', '<Enter>', lambda e: self.canvas.configure(cursor='hand2'))
+        self.canvas.tag_bind('toggle', '<Leave>', lambda e: self.canvas.configure(cursor=''))
+
+        self.beds = {}
+        self.busy = set()
+        self.ward = None
+        self.occupied = None
+        self.columns = 0
+        # (top, bed ids or None for a ward header, ward) per row, top to bottom
+        self.lines = []
+        self.tops = []
+        self.ward_tags = {}
+        self.drawn = set()
+
+    def set_beds(self, beds, busy=()):
+        """Show `beds`; the ids in `busy` have a toggle still being saved."""
+        self.beds = {bed['id']: bed for bed in beds}
+        self.busy = set(busy) & set(self.beds)
+        self.layout()
+
+    def update_bed(self, bed, busy=False):
+        """Show one changed or new bed, redrawing only its card where possible."""
+        old = self.beds.get(bed['id'])
+        self.beds[bed['id']] = bed
+        if busy:
+            self.busy.add(bed['id'])
+        else:
+            self.busy.discard(bed['id'])
+        if (old is None or (old['ward'], old['number']) != (bed['ward'], bed['number'])
+                or self._matches(old) != self._matches(bed)):
+            self.layout()
+            return
+        self._paint(bed)
+        if bed['ward'] in self.ward_tags:
+            self.canvas.itemconfigure(self.ward_tags[bed['ward']], text=self._ward_label(bed['ward']))
+
+    def wards(self):
+        return sorted({bed['ward'] for bed in self.beds.values()}, key=_natural)
+
+    def set_filter(self, ward=None, occupied=None):
+        """Show only `ward` (None for all) and beds whose is_occupied is `occupied` (None for all)."""
+        self.ward, self.occupied = ward, occupied
+        self.canvas.yview_moveto(0)
+        self.layout()
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.draw()
+
+    def layout(self):
+        width = self.canvas.winfo_width()
+        self.columns = max(1, (width - self.GAP) // (self.CARD_W + self.GAP))
+        groups = {}
+        for bed in sorted(self.beds.values(), key=lambda b: (_natural(b['ward']), _natural(b['number']))):
+            if self._matches(bed):
+                groups.setdefault(bed['ward'], []).append(bed['id'])
+
+        self.lines, self.ward_tags, y = [], {}, self.GAP
+        for n, (ward, ids) in enumerate(groups.items()):
+            self.ward_tags[ward] = f'ward{n}'
+            self.lines.append((y, None, ward))
+            y += self.HEADER_H
+            for start in range(0, len(ids), self.columns):
+                self.lines.append((y, ids[start:start + self.columns], ward))
+                y += self.CARD_H + self.GAP
+        self.tops = [line[0] for line in self.lines]
+
+        self.canvas.delete('all')
+        self.drawn = set()
+        self.canvas.configure(scrollregion=(0, 0, width, y))
+        if not self.lines:
+            self.canvas.create_text(width / 2, 40, text="No beds", fill=self.colors['text_dark'])
+        self.draw()
+
+    def draw(self):
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        visible = set()
+        for i in range(max(bisect_right(self.tops, top) - 1, 0), len(self.lines)):
+            if self.tops[i] >= bottom:
+                break
+            visible.add(i)
+        for i in self.drawn - visible:
+            self.canvas.delete(f'line{i}')
+        for i in visible - self.drawn:
+            self._draw_line(i)
+        self.drawn = visible
+
+    def _matches(self, bed):
+        return ((self.ward is None or bed['ward'] == self.ward)
+                and (self.occupied is None or bed['is_occupied'] == self.occupied))
+
+    def _ward_label(self, ward):
+        beds = [bed for bed in self.beds.values() if bed['ward'] == ward]
+        free = sum(not bed['is_occupied'] for bed in beds)
+        return f"{ward}  ·  {free} of {len(beds)} free"
+
+    def _draw_line(self, i):
+        y, ids, ward = self.lines[i]
+        line = f'line{i}'
+        if ids is None:
+            self.canvas.create_text(self.GAP, y + self.HEADER_H / 2, anchor='w', text=self._ward_label(ward),
+                                    font=("Segoe UI", 12, "bold"), fill=self.colors['text_dark'],
+                                    tags=(line, self.ward_tags[ward]))
+            return
+        for col, bed_id in enumerate(ids):
+            bed = self.beds[bed_id]
+            x = self.GAP + col * (self.CARD_W + self.GAP)
+            mid = x + self.CARD_W / 2
+            tags = (line, f'bed{bed_id}')
+            self.canvas.create_rectangle(x, y, x + self.CARD_W, y + self.CARD_H, fill='white', width=2, tags=tags + ('frame',))
+            self.canvas.create_text(mid, y + 20, text=f"{bed['ward']} - {bed['number']}", font=("Segoe UI", 12, "bold"), tags=tags)
+            self.canvas.create_text(mid, y + 44, tags=tags + ('status',))
+            self.canvas.create_rectangle(mid - 40, y + 62, mid + 40, y + 86, fill=self.colors['primary'], outline='', tags=tags + ('toggle',))
+            self.canvas.create_text(mid, y + 74, fill='white', tags=tags + ('label', 'toggle'))
+            self._paint(bed)
+
+    def _paint(self, bed):
+        # The parts of a card that change with its state; a no-op when it is off screen
+        tag = f"bed{bed['id']}"
+        color = self.colors['danger'] if bed['is_occupied'] else self.colors['success']
+        if bed['id'] in self.busy:
+            label = "…"
+        else:
+            label = "Free" if bed['is_occupied'] else "Occupy"
+        self.canvas.itemconfigure(f'{tag}&&frame', outline=color)
+        self.canvas.itemconfigure(f'{tag}&&status', text="Occupied" if bed['is_occupied'] else "Available", fill=color)
+        self.canvas.itemconfigure(f'{tag}&&label', text=label)
+
+    def _clicked(self, event):
+        for tag in self.canvas.gettags('current'):
+            if tag.startswith('bed'):
+                bed_id = int(tag[3:])
+                if bed_id in self.busy:
+                    return
+                self.busy.add(bed_id)
+                self._paint(self.beds[bed_id])
+                self.on_toggle(self.beds[bed_id])
+                return
+
+    def _resized(self, event):
+        if max(1, (event.width - self.GAP) // (self.CARD_W + self.GAP)) != self.columns:
+            self.layout()
+        else:
+            self.draw()
+
+    def _scroll(self, direction):
+        self.canvas.yview_scroll(direction * self.SCROLL_UNITS, 'units')
+        self.draw()